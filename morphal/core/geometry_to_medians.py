@@ -37,6 +37,7 @@ from qgis.PyQt.QtCore import QVariant
 from morphal.ptm4qgis_algorithm import PTM4QgisAlgorithm
 
 from . import morphal_geometry_utils as geometry_utils
+from .morphal_feature_io import BufferedFeatureSink, prefetch_features
 from .utils import LayerRenamer, round_float_to_3_decimals
 
 
@@ -44,6 +45,7 @@ class MorphALGeometryToMedians(PTM4QgisAlgorithm):
     INPUT_LAYER = "INPUT_LAYER"
     METHOD = "CALC_METHOD"
     ORIENTATION_ORIGIN = "ORIENTATION_ORIGIN"
+    ORIENTATION_METHOD = "ORIENTATION_METHOD"
     OUTPUT_LAYER = "OUTPUT_LAYER"
 
     def help(self):
@@ -54,7 +56,13 @@ class MorphALGeometryToMedians(PTM4QgisAlgorithm):
             as possible, or otherwise as far south as possible.\
             \nIt creates a new vector layer with the same content as the input one, but with\
             additional computed attributes: median orientation, computed from East or from North,\
-            median length and median associated elongation.")
+            median length and median associated elongation.\
+            \nMedians are based on the minimum bounding rectangle of the geometries by default.\
+            Alternatively, they can be based on the second moments of the geometries (the major axis\
+            of the rectangle having the same moments), which is much cheaper to compute. Both can\
+            also be computed side by side: medians are then based on the minimum bounding rectangle,\
+            the orientation and the elongation based on the second moments being added, as well\
+            as the difference (in degrees) between the two orientations.")
 
     def __init__(self):
         super().__init__()
@@ -66,6 +74,11 @@ class MorphALGeometryToMedians(PTM4QgisAlgorithm):
             self.tr("East"),
             self.tr("North")
         ]
+        self.orientation_methods = [
+            self.tr("Minimum bounding rectangle"),
+            self.tr("Second moments"),
+            self.tr("Both (minimum bounding rectangle and second moments)")
+        ]
 
     def initAlgorithm(self, config):
         self.addParameter(
@@ -94,6 +107,17 @@ class MorphALGeometryToMedians(PTM4QgisAlgorithm):
             )
         )
 
+        self.addParameter(
+            QgsProcessingParameterEnum(
+                self.ORIENTATION_METHOD,
+                self.tr("Medians based on"),
+                options=self.orientation_methods,
+                defaultValue=0
+            )
+        )
+
+        self.addSlimOutputParameters(self.INPUT_LAYER)
+
         self.addParameter(
             QgsProcessingParameterFeatureSink(
                 self.OUTPUT_LAYER,
@@ -149,8 +173,16 @@ class MorphALGeometryToMedians(PTM4QgisAlgorithm):
         if orientation_origin == 1:
             from_north = True
 
+        # Orientation method:
+        # 0 - minimum bounding rectangle
+        # 1 - second moments
+        # 2 - both
+        orientation_method = self.parameterAsEnum(parameters, self.ORIENTATION_METHOD, context)
+
+        source_attributes = self.parameterAsSourceAttributes(parameters, source, context)
+
         # output
-        fields = source.fields()
+        fields = source_attributes.fields()
 
         new_fields = QgsFields()
         if from_north:
@@ -161,6 +193,14 @@ class MorphALGeometryToMedians(PTM4QgisAlgorithm):
         new_fields.append(QgsField("LENGTH", QVariant.Double))
         new_fields.append(QgsField("ELONGATION", QVariant.Double))
 
+        if orientation_method == 2:
+            if from_north:
+                new_fields.append(QgsField("N_MOM_ORIENT", QVariant.Double))
+            else:
+                new_fields.append(QgsField("E_MOM_ORIENT", QVariant.Double))
+            new_fields.append(QgsField("MOM_ELONG", QVariant.Double))
+            new_fields.append(QgsField("ORIENT_DIFF", QVariant.Double))
+
         fields = QgsProcessingUtils.combineFields(fields, new_fields)
 
         if method == 1:
@@ -203,41 +243,56 @@ class MorphALGeometryToMedians(PTM4QgisAlgorithm):
                 source.sourceCrs(), context.project().crs(), context.project()
             )
 
-        features = source.getFeatures()
+        features = prefetch_features(source.getFeatures(source_attributes.request()), feedback)
         total = 100.0 / source.featureCount() if source.featureCount() else 0
-        for current, f in enumerate(features):
-            if feedback.isCanceled():
-                return {}
-
-            out_feature = f
-            attrs = f.attributes()
-            geom = f.geometry()
-
-            if not f.hasGeometry():
-                continue
-
-            # else
-            if coord_transform is not None:
-                geom.transform(coord_transform)
-
-            median_geom, median_orientation, median_length, mbr_elongation = geometry_utils.median_segment(
-                geom,
-                from_north,
-                self.distance_area
-            )
-            attrs.extend([median_orientation, median_length, mbr_elongation])
-            out_feature.setGeometry(median_geom)
-
-            # ensure consistent count of attributes - otherwise null
-            # geometry features will have incorrect attribute length
-            # and provider may reject them
-            if len(attrs) < len(fields):
-                attrs += [NULL] * (len(fields) - len(attrs))
-
-            out_feature.setAttributes(attrs)
-            sink.addFeature(out_feature, QgsFeatureSink.FastInsert)
-
-            feedback.setProgress(int(current * total))
+        with BufferedFeatureSink(sink, background=True) as writer:
+            for current, f in enumerate(features):
+                if feedback.isCanceled():
+                    return {}
+
+                out_feature = f
+                attrs = source_attributes.attributes(f)
+                geom = f.geometry()
+
+                if not f.hasGeometry():
+                    continue
+
+                # else
+                if coord_transform is not None:
+                    geom.transform(coord_transform)
+
+                if orientation_method == 1:
+                    median_geom, median_orientation, median_length, mbr_elongation = \
+                        geometry_utils.moments_median_segment(
+                            geom,
+                            from_north,
+                            self.distance_area
+                        )
+                else:
+                    median_geom, median_orientation, median_length, mbr_elongation = geometry_utils.median_segment(
+                        geom,
+                        from_north,
+                        self.distance_area
+                    )
+                attrs.extend([median_orientation, median_length, mbr_elongation])
+
+                if orientation_method == 2:
+                    # no MBR orientation to compare with if the MBR can not be computed
+                    mbr_orientation = median_orientation if median_geom is not None else None
+                    attrs.extend(self.moments_attributes(geom, from_north, mbr_orientation))
+
+                out_feature.setGeometry(median_geom)
+
+                # ensure consistent count of attributes - otherwise null
+                # geometry features will have incorrect attribute length
+                # and provider may reject them
+                if len(attrs) < len(fields):
+                    attrs += [NULL] * (len(fields) - len(attrs))
+
+                out_feature.setAttributes(attrs)
+                writer.addFeature(out_feature, QgsFeatureSink.FastInsert)
+
+                feedback.setProgress(int(current * total))
 
         # rename output layer
         global medians_renamer
@@ -254,3 +309,21 @@ class MorphALGeometryToMedians(PTM4QgisAlgorithm):
             dest_id).setPostProcessor(medians_renamer)
 
         return {self.OUTPUT_LAYER: dest_id}
+
+    def moments_attributes(self, geom, from_north, mbr_orientation):
+        # orientation and elongation based on the second moments, compared to the MBR ones
+        # (mbr_orientation is None if not defined, and may be negative from the North)
+        moments = geometry_utils.second_moments(geom)
+        if moments is None:
+            return [NULL, NULL, NULL]
+
+        moments_orientation = geometry_utils.convert_angle(moments[2], 0, 0, True, from_north)
+        moments_elongation = geometry_utils.moments_elongation(moments[3], moments[4])
+
+        orientation_diff = NULL
+        if mbr_orientation is not None:
+            orientation_diff = round_float_to_3_decimals(
+                geometry_utils.orientation_difference(moments_orientation, mbr_orientation)
+            )
+
+        return [moments_orientation, moments_elongation, orientation_diff]
@@ -0,0 +1,283 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+    MorphAL: PTM plugin for QGIS
+    --------------
+    Start date           : January 2021
+    Copyright            : (C) 2021, Eric Grosso, PTM
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+from qgis.core import (
+    NULL,
+    QgsFeatureRequest,
+    QgsFeatureSink,
+    QgsField,
+    QgsFields,
+    QgsGeometry,
+    QgsProcessing,
+    QgsProcessingException,
+    QgsProcessingParameterDistance,
+    QgsProcessingParameterFeatureSink,
+    QgsProcessingParameterFeatureSource,
+    QgsProcessingUtils,
+    QgsSpatialIndex,
+    QgsWkbTypes,
+)
+from qgis.PyQt.QtCore import QVariant
+
+from morphal.ptm4qgis_algorithm import PTM4QgisAlgorithm
+
+from .morphal_feature_io import BufferedFeatureSink, prefetch_features
+from .utils import LayerRenamer, round_float_to_3_decimals
+
+DETACHED = "detached"
+SEMI_DETACHED = "semi-detached"
+TERRACED = "terraced"
+
+
+class MorphALPolygonAdjacency(PTM4QgisAlgorithm):
+    INPUT_LAYER = "INPUT_LAYER"
+    TOLERANCE = "TOLERANCE"
+    OUTPUT_LAYER = "OUTPUT_LAYER"
+
+    def help(self):
+        return self.tr("\
+            This algorithm computes adjacency (party wall) indicators of the polygons of a layer\
+            (e.g. buildings): the number of neighbours sharing a part of their boundary with each\
+            polygon (NB_NEIGHB), the length of its shared boundary (SHARED_LEN) and the ratio of\
+            this length to its perimeter (SHARED_RATIO).\
+            \nEach polygon is also classified (ADJ_CLASS) as detached (no neighbour), semi-detached\
+            (one neighbour) or terraced (two neighbours or more).\
+            \nCandidate neighbours are found with a spatial index on the bounding boxes of the\
+            polygons, each candidate pair being tested only once. Polygons touching at a single\
+            point are not neighbours. A tolerance can be given for boundaries which do not match\
+            exactly: the parts of the boundary of a polygon lying within this distance of the boundary\
+            of the other one are then shared.\
+            \nLengths are computed in the units of the layer CRS.")
+
+    def __init__(self):
+        super().__init__()
+
+    def initAlgorithm(self, config):
+        self.addParameter(
+            QgsProcessingParameterFeatureSource(
+                self.INPUT_LAYER,
+                self.tr("Input layer"),
+                types=[QgsProcessing.TypeVectorPolygon],
+            )
+        )
+
+        self.addParameter(
+            QgsProcessingParameterDistance(
+                self.TOLERANCE,
+                self.tr("Tolerance of the shared boundaries"),
+                parentParameterName=self.INPUT_LAYER,
+                minValue=0.0,
+                defaultValue=0.0,
+            )
+        )
+
+        self.addSlimOutputParameters(self.INPUT_LAYER)
+
+        self.addParameter(
+            QgsProcessingParameterFeatureSink(
+                self.OUTPUT_LAYER,
+                self.tr("Adjacency"),
+                type=QgsProcessing.TypeVectorPolygon
+            )
+        )
+
+    def name(self):
+        return "polygon_adjacency"
+
+    def displayName(self):
+        return self.tr("Polygon adjacency (party walls)")
+
+    def processAlgorithm(self, parameters, context, feedback):
+        # input / source
+        source = self.parameterAsSource(parameters, self.INPUT_LAYER, context)
+        if source is None:
+            raise QgsProcessingException(
+                self.invalidSourceError(parameters, self.INPUT_LAYER)
+            )
+
+        wkb_type = source.wkbType()
+
+        if QgsWkbTypes.geometryType(wkb_type) != QgsWkbTypes.PolygonGeometry:
+            feedback.reportError("The layer geometry type is different from a polygon")
+            return {}
+
+        if source.featureCount() == 0:
+            feedback.reportError(
+                self.tr("The layer doesn't contain any feature: no output provided")
+            )
+            return {}
+
+        # other parameters
+        tolerance = self.parameterAsDouble(parameters, self.TOLERANCE, context)
+
+        source_attributes = self.parameterAsSourceAttributes(parameters, source, context)
+
+        # output
+        fields = source_attributes.fields()
+
+        new_fields = QgsFields()
+        new_fields.append(QgsField("NB_NEIGHB", QVariant.Int))
+        new_fields.append(QgsField("SHARED_LEN", QVariant.Double))
+        new_fields.append(QgsField("SHARED_RATIO", QVariant.Double))
+        new_fields.append(QgsField("ADJ_CLASS", QVariant.String))
+
+        fields = QgsProcessingUtils.combineFields(fields, new_fields)
+
+        (sink, dest_id) = self.parameterAsSink(
+            parameters,
+            self.OUTPUT_LAYER,
+            context,
+            fields,
+            wkb_type,
+            source.sourceCrs(),
+        )
+        if sink is None:
+            raise QgsProcessingException(
+                self.invalidSinkError(parameters, self.OUTPUT_LAYER))
+
+        # process: the geometries are indexed in a first pass, then the
+        # candidate pairs given by the index are tested, and the indicators
+        # are written in a last pass
+        request = QgsFeatureRequest()
+        request.setSubsetOfAttributes([])
+
+        index = QgsSpatialIndex()
+        geometries = {}
+
+        features = prefetch_features(source.getFeatures(request), feedback)
+        total = 20.0 / source.featureCount() if source.featureCount() else 0
+        for current, f in enumerate(features):
+            if feedback.isCanceled():
+                return {}
+
+            if f.hasGeometry() and not f.geometry().isEmpty():
+                geometries[f.id()] = f.geometry()
+                index.addFeature(f)
+
+            feedback.setProgress(int(current * total))
+
+        neighbour_counts = {}
+        shared_lengths = {}
+
+        total = 60.0 / len(geometries) if geometries else 0
+        for current, (fid, geometry) in enumerate(geometries.items()):
+            if feedback.isCanceled():
+                return {}
+
+            rectangle = geometry.boundingBox()
+            if tolerance > 0:
+                rectangle.grow(tolerance)
+
+            candidates = [candidate for candidate in index.intersects(rectangle) if candidate > fid]
+            if candidates:
+                engine = QgsGeometry.createGeometryEngine(geometry.constGet())
+                engine.prepareGeometry()
+                boundary = QgsGeometry(geometry.constGet().boundary())
+
+                for candidate in candidates:
+                    length = self.shared_length(
+                        geometry, engine, boundary, geometries[candidate], tolerance
+                    )
+                    if length <= 0:
+                        continue
+
+                    for neighbour_fid in (fid, candidate):
+                        neighbour_counts[neighbour_fid] = neighbour_counts.get(neighbour_fid, 0) + 1
+                        shared_lengths[neighbour_fid] = shared_lengths.get(neighbour_fid, 0.0) + length
+
+            feedback.setProgress(20 + int(current * total))
+
+        # geometries are only needed by the candidate tests
+        geometries = None
+        index = None
+
+        features = prefetch_features(source.getFeatures(source_attributes.request()), feedback)
+        total = 20.0 / source.featureCount() if source.featureCount() else 0
+        with BufferedFeatureSink(sink, background=True) as writer:
+            for current, f in enumerate(features):
+                if feedback.isCanceled():
+                    return {}
+
+                out_feat = f
+                attrs = source_attributes.attributes(f)
+                in_geom = f.geometry()
+                if in_geom and not in_geom.isEmpty():
+                    attrs.extend(self.adjacency_indicators(
+                        in_geom,
+                        neighbour_counts.get(f.id(), 0),
+                        shared_lengths.get(f.id(), 0.0))
+                    )
+
+                # ensure consistent count of attributes - otherwise null
+                # geometry features will have incorrect attribute length
+                # and provider may reject them
+                if len(attrs) < len(fields):
+                    attrs += [NULL] * (len(fields) - len(attrs))
+
+                out_feat.setAttributes(attrs)
+                writer.addFeature(out_feat, QgsFeatureSink.FastInsert)
+
+                feedback.setProgress(80 + int(current * total))
+
+        # rename output layer
+        global adjacency_renamer
+
+        adjacency_renamer = LayerRenamer(f'{source.sourceName()}-{self.tr("Adjacency")}')
+        context.layerToLoadOnCompletionDetails(
+            dest_id).setPostProcessor(adjacency_renamer)
+
+        return {self.OUTPUT_LAYER: dest_id}
+
+    def shared_length(self, geometry, engine, boundary, other, tolerance):
+        """
+        Length of the boundary shared by two polygons, 0 if they do not touch
+        or only touch at points. With a tolerance, the mean of the lengths of
+        the parts of each boundary lying near the other boundary is returned.
+        """
+        if tolerance <= 0:
+            if not engine.intersects(other.constGet()):
+                return 0.0
+            other_boundary = QgsGeometry(other.constGet().boundary())
+            return boundary.intersection(other_boundary).length()
+
+        if geometry.distance(other) > tolerance:
+            return 0.0
+
+        other_boundary = QgsGeometry(other.constGet().boundary())
+        length = boundary.intersection(other_boundary.buffer(tolerance, 8)).length()
+        other_length = other_boundary.intersection(boundary.buffer(tolerance, 8)).length()
+        return (length + other_length) / 2.0
+
+    def adjacency_indicators(self, geometry, neighbour_count, shared_length):
+        perimeter = geometry.constGet().perimeter()
+        shared_ratio = shared_length / perimeter if perimeter > 0 else 0.0
+
+        if neighbour_count == 0:
+            adjacency_class = DETACHED
+        elif neighbour_count == 1:
+            adjacency_class = SEMI_DETACHED
+        else:
+            adjacency_class = TERRACED
+
+        return [
+            neighbour_count,
+            round_float_to_3_decimals(shared_length),
+            round_float_to_3_decimals(min(1.0, shared_ratio)),
+            adjacency_class,
+        ]
@@ -0,0 +1,252 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+    MorphAL: PTM plugin for QGIS
+    --------------
+    Start date           : January 2021
+    Copyright            : (C) 2021, Eric Grosso, PTM
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+import math
+import random
+from array import array
+
+# quadrants of the Moran scatterplot (value / spatial lag)
+HIGH_HIGH = 1
+LOW_HIGH = 2
+LOW_LOW = 3
+HIGH_LOW = 4
+
+
+class SpatialWeights:
+    """
+    Sparse row-standardised spatial weights of n observations, stored in
+    compressed sparse row (CSR) arrays: the neighbours of observation i are
+    indices[indptr[i]:indptr[i + 1]], with the weights at the same positions
+    in weights.
+    """
+
+    def __init__(self, indptr, indices):
+        """
+        :param indptr: offsets of the rows (n + 1 values)
+        :param indices: neighbours of all the rows, row after row
+        """
+        self.indptr = array("q", indptr)
+        self.indices = array("q", indices)
+        self.count = len(self.indptr) - 1
+
+        self.weights = array("d")
+        for i in range(self.count):
+            cardinality = self.indptr[i + 1] - self.indptr[i]
+            if cardinality:
+                self.weights.extend([1.0 / cardinality] * cardinality)
+
+    @classmethod
+    def from_pairs(cls, count: int, firsts, seconds):
+        """
+        Build symmetric weights (e.g. contiguity) from pairs of neighbours,
+        each pair being given once.
+
+        :param int count: number of observations
+        :param firsts: first observations of the pairs
+        :param seconds: second observations of the pairs
+        """
+        cardinalities = array("q", [0] * count)
+        for i, j in zip(firsts, seconds):
+            cardinalities[i] += 1
+            cardinalities[j] += 1
+
+        indptr = array("q", [0] * (count + 1))
+        for i in range(count):
+            indptr[i + 1] = indptr[i] + cardinalities[i]
+
+        indices = array("q", [0] * indptr[count])
+        filled = array("q", indptr[:count])
+        for i, j in zip(firsts, seconds):
+            indices[filled[i]] = j
+            filled[i] += 1
+            indices[filled[j]] = i
+            filled[j] += 1
+
+        return cls(indptr, indices)
+
+    @classmethod
+    def from_rows(cls, rows):
+        """
+        Build (possibly asymmetric) weights, e.g. k nearest neighbours, from
+        the neighbours of each observation, in the order of the observations.
+        """
+        indptr = array("q", [0])
+        indices = array("q")
+        for row in rows:
+            indices.extend(row)
+            indptr.append(len(indices))
+        return cls(indptr, indices)
+
+    def cardinality(self, i: int):
+        return self.indptr[i + 1] - self.indptr[i]
+
+    def islands(self):
+        """
+        Return the number of observations without neighbour.
+        """
+        return sum(1 for i in range(self.count) if self.indptr[i + 1] == self.indptr[i])
+
+    def lag(self, values):
+        """
+        Return the spatial lag of values: the weighted mean of the values of
+        the neighbours of each observation (0 for observations without
+        neighbour).
+        """
+        indptr = self.indptr
+        indices = self.indices
+        weights = self.weights
+        lag = array("d", [0.0] * self.count)
+        for i in range(self.count):
+            total = 0.0
+            for position in range(indptr[i], indptr[i + 1]):
+                total += weights[position] * values[indices[position]]
+            lag[i] = total
+        return lag
+
+
+def _deviations(values):
+    # deviations from the mean, and their second moment
+    mean = math.fsum(values) / len(values)
+    z = array("d", (value - mean for value in values))
+    m2 = math.fsum(v * v for v in z) / len(z)
+    return z, m2
+
+
+def moran(values, weights: SpatialWeights, permutations: int = 0, seed: int = 0):
+    """
+    Compute the global Moran's I of values, with a pseudo p-value based on
+    random permutations of the values (folded, i.e. the probability of a
+    value at least as extreme in the direction of the observed value).
+
+    :param values: values of the observations
+    :param SpatialWeights weights: spatial weights of the observations
+    :param int permutations: number of permutations, 0 for no p-value
+    :param int seed: seed of the permutations
+    :return: None if the values are constant, otherwise a tuple (Moran's I,
+      expected I under the null hypothesis, pseudo p-value or None)
+    """
+
+    count = len(values)
+    if count < 2:
+        return None
+
+    z, m2 = _deviations(values)
+    s0 = math.fsum(weights.weights)
+    if m2 <= 0 or s0 <= 0:
+        return None
+
+    def statistic(deviations):
+        lag = weights.lag(deviations)
+        return math.fsum(v * lag_v for v, lag_v in zip(deviations, lag)) / (m2 * s0)
+
+    observed = statistic(z)
+    expected = -1.0 / (count - 1)
+
+    if permutations <= 0:
+        return observed, expected, None
+
+    rng = random.Random(seed)
+    shuffled = array("d", z)
+    larger = 0
+    for _ in range(permutations):
+        rng.shuffle(shuffled)
+        if statistic(shuffled) >= observed:
+            larger += 1
+
+    if permutations - larger < larger:
+        larger = permutations - larger
+
+    return observed, expected, (larger + 1.0) / (permutations + 1.0)
+
+
+def local_moran(values, weights: SpatialWeights, permutations: int = 0, seed: int = 0):
+    """
+    Compute the local Moran's I (LISA) of each observation, its quadrant in
+    the Moran scatterplot, and a pseudo p-value based on conditional random
+    permutations: the value of each observation being fixed, its neighbours
+    are drawn randomly among the other observations.
+
+    The random draws are shared by all the observations (a single table of
+    permutations x maximum cardinality indices, as in PySAL), so that the
+    memory used by the permutations does not depend on the number of
+    observations, each observation only shifting the drawn indices to
+    exclude itself.
+
+    :param values: values of the observations
+    :param SpatialWeights weights: spatial weights of the observations
+    :param int permutations: number of permutations, 0 for no p-value
+    :param int seed: seed of the permutations
+    :return: None if the values are constant, otherwise a tuple of arrays
+      (local Moran's I, pseudo p-values - NaN for observations without
+      neighbour or without permutation -, quadrants - 0 for observations
+      without neighbour)
+    """
+
+    count = len(values)
+    if count < 2:
+        return None
+
+    z, m2 = _deviations(values)
+    if m2 <= 0:
+        return None
+
+    lag = weights.lag(z)
+    lisa = array("d", (v * lag_v / m2 for v, lag_v in zip(z, lag)))
+
+    quadrants = array("b", [0] * count)
+    for i in range(count):
+        if weights.cardinality(i) == 0:
+            continue
+        if z[i] > 0:
+            quadrants[i] = HIGH_HIGH if lag[i] > 0 else HIGH_LOW
+        else:
+            quadrants[i] = LOW_HIGH if lag[i] > 0 else LOW_LOW
+
+    p_values = array("d", [math.nan] * count)
+    max_cardinality = max((weights.cardinality(i) for i in range(count)), default=0)
+    if permutations <= 0 or max_cardinality == 0:
+        return lisa, p_values, quadrants
+
+    # indices among the n - 1 other observations, shifted for each observation
+    rng = random.Random(seed)
+    draws = [rng.sample(range(count - 1), min(max_cardinality, count - 1)) for _ in range(permutations)]
+
+    indptr = weights.indptr
+    row_weights = weights.weights
+    for i in range(count):
+        start = indptr[i]
+        end = indptr[i + 1]
+        if start == end:
+            continue
+
+        w = row_weights[start:end]
+        observed = z[i] * lag[i]
+        larger = 0
+        for draw in draws:
+            permuted_lag = 0.0
+            for w_j, r in zip(w, draw):
+                permuted_lag += w_j * z[r + (r >= i)]
+            if z[i] * permuted_lag >= observed:
+                larger += 1
+
+        if permutations - larger < larger:
+            larger = permutations - larger
+        p_values[i] = (larger + 1.0) / (permutations + 1.0)
+
+    return lisa, p_values, quadrants
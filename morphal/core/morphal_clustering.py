@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+    MorphAL: PTM plugin for QGIS
+    --------------
+    Start date           : January 2021
+    Copyright            : (C) 2021, Eric Grosso, PTM
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+import math
+import random
+
+
+class RunningStatistics:
+    """
+    Mean and standard deviation of vectors computed in a single streaming
+    pass (Welford's algorithm), without keeping the vectors in memory.
+    """
+
+    def __init__(self, dimension: int):
+        self.count = 0
+        self.mean = [0.0] * dimension
+        self._m2 = [0.0] * dimension
+
+    def add(self, vector):
+        self.count += 1
+        for d, value in enumerate(vector):
+            delta = value - self.mean[d]
+            self.mean[d] += delta / self.count
+            self._m2[d] += delta * (value - self.mean[d])
+
+    def std(self):
+        """
+        Return the (population) standard deviations, 1.0 for constant
+        dimensions so that they can be used to standardise vectors.
+        """
+        if self.count == 0:
+            return [1.0] * len(self.mean)
+        return [math.sqrt(m2 / self.count) if m2 > 0 else 1.0 for m2 in self._m2]
+
+    def standardize(self, vector, std=None):
+        if std is None:
+            std = self.std()
+        return [(value - mean) / s for value, mean, s in zip(vector, self.mean, std)]
+
+
+class MiniBatchKMeans:
+    """
+    Mini-batch k-means (Sculley, 2010): centres are initialised with k-means++
+    on a first batch of vectors, then each batch moves the centres towards
+    the vectors assigned to them, with a per-centre learning rate decreasing
+    with the number of vectors the centre has been assigned so far.
+
+    Only the centres and their counts are kept in memory, so that any number
+    of vectors can be clustered by streaming batches of bounded size. Results
+    are reproducible for a given seed and a given order of the vectors.
+    """
+
+    def __init__(self, cluster_count: int, seed: int = 0):
+        self.cluster_count = cluster_count
+        self.random = random.Random(seed)
+        self.centres = []
+        self.counts = []
+
+    def initialize(self, batch):
+        """
+        Initialise the centres with k-means++ on a batch of vectors. Less
+        centres than requested are created if the batch is too small.
+        """
+        if not batch:
+            return
+
+        self.centres = [list(self.random.choice(batch))]
+        distances = [_squared_distance(vector, self.centres[0]) for vector in batch]
+
+        while len(self.centres) < min(self.cluster_count, len(batch)):
+            total = sum(distances)
+            if total <= 0:
+                # all remaining vectors are identical to a centre
+                break
+
+            threshold = self.random.random() * total
+            cumulated = 0.0
+            chosen = len(batch) - 1
+            for i, distance in enumerate(distances):
+                cumulated += distance
+                if cumulated >= threshold:
+                    chosen = i
+                    break
+
+            centre = list(batch[chosen])
+            self.centres.append(centre)
+            distances = [min(distance, _squared_distance(vector, centre)) for vector, distance in zip(batch, distances)]
+
+        self.counts = [0] * len(self.centres)
+
+    def partial_fit(self, batch):
+        """
+        Update the centres with a batch of vectors, the centres being
+        initialised with the first batch.
+        """
+        if not self.centres:
+            self.initialize(batch)
+            if not self.centres:
+                return
+
+        # assignments are computed before the update, as in the original algorithm
+        assignments = [self.predict(vector)[0] for vector in batch]
+        for vector, index in zip(batch, assignments):
+            self.counts[index] += 1
+            rate = 1.0 / self.counts[index]
+            centre = self.centres[index]
+            for d, value in enumerate(vector):
+                centre[d] += rate * (value - centre[d])
+
+    def predict(self, vector):
+        """
+        Return the index of the nearest centre and the distance to it.
+        """
+        best_index = -1
+        best_distance = math.inf
+        for index, centre in enumerate(self.centres):
+            distance = _squared_distance(vector, centre)
+            if distance < best_distance:
+                best_index = index
+                best_distance = distance
+        return best_index, math.sqrt(best_distance)
+
+
+def _squared_distance(vector_1, vector_2):
+    distance = 0.0
+    for value_1, value_2 in zip(vector_1, vector_2):
+        delta = value_1 - value_2
+        distance += delta * delta
+    return distance
@@ -0,0 +1,263 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+    MorphAL: PTM plugin for QGIS
+    --------------
+    Start date           : January 2021
+    Copyright            : (C) 2021, Eric Grosso, PTM
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+from array import array
+
+from qgis.core import (
+    NULL,
+    QgsFeature,
+    QgsFeatureRequest,
+    QgsFeatureSink,
+    QgsField,
+    QgsFields,
+    QgsProcessing,
+    QgsProcessingException,
+    QgsProcessingParameterFeatureSink,
+    QgsProcessingParameterFeatureSource,
+    QgsWkbTypes,
+)
+from qgis.PyQt.QtCore import QVariant
+
+from morphal.ptm4qgis_algorithm import PTM4QgisAlgorithm
+
+from . import morphal_geometry_utils as geometry_utils
+from .morphal_feature_io import BufferedFeatureSink, prefetch_features
+from .morphal_segment_network import SegmentNetwork
+from .utils import LayerRenamer
+
+# no polygon on this side of the edge
+NO_FID = -(2 ** 63)
+
+
+class MorphALPolygonEdgeTopology(PTM4QgisAlgorithm):
+    INPUT_LAYER = "INPUT_LAYER"
+    OUTPUT_LAYER = "OUTPUT_LAYER"
+    SHARED_BOUNDARIES = "SHARED_BOUNDARIES"
+
+    def help(self):
+        return self.tr("\
+            This algorithm generates the edges of a polygon layer, each edge shared by two adjacent\
+            polygons being generated only once.\
+            \nThese edges are normalised, i.e. their point of origin is always located as far west \
+            as possible, or otherwise as far south as possible. Each edge holds the ids of the polygons\
+            located on its left (LEFT_FID) and on its right (RIGHT_FID), one of them being null for\
+            edges located on the outer boundary, and its length.\
+            \nOptionally, the length of the shared boundary of each pair of adjacent polygons\
+            is computed in a separate table.\
+            \nEdges are matched on exact coordinates.")
+
+    def __init__(self):
+        super().__init__()
+
+    def initAlgorithm(self, config):
+        self.addParameter(
+            QgsProcessingParameterFeatureSource(
+                self.INPUT_LAYER,
+                self.tr("Input layer"),
+                types=[QgsProcessing.TypeVectorPolygon],
+            )
+        )
+
+        self.addParameter(
+            QgsProcessingParameterFeatureSink(
+                self.OUTPUT_LAYER,
+                self.tr("Edges"),
+                type=QgsProcessing.TypeVectorLine
+            )
+        )
+
+        self.addParameter(
+            QgsProcessingParameterFeatureSink(
+                self.SHARED_BOUNDARIES,
+                self.tr("Shared boundaries"),
+                type=QgsProcessing.TypeVector,
+                optional=True,
+                createByDefault=False
+            )
+        )
+
+    def name(self):
+        return "polygon_edge_topology"
+
+    def displayName(self):
+        return self.tr("Polygons to shared edges")
+
+    def processAlgorithm(self, parameters, context, feedback):
+        # input / source
+        source = self.parameterAsSource(parameters, self.INPUT_LAYER, context)
+        if source is None:
+            raise QgsProcessingException(
+                self.invalidSourceError(parameters, self.INPUT_LAYER)
+            )
+
+        wkb_type = source.wkbType()
+
+        if QgsWkbTypes.geometryType(wkb_type) != QgsWkbTypes.PolygonGeometry:
+            feedback.reportError("The layer geometry type is different from a polygon")
+            return {}
+
+        if source.featureCount() == 0:
+            feedback.reportError(
+                self.tr("The layer doesn't contain any feature: no output provided")
+            )
+            return {}
+
+        # output
+        fields = QgsFields()
+        fields.append(QgsField("LEFT_FID", QVariant.LongLong))
+        fields.append(QgsField("RIGHT_FID", QVariant.LongLong))
+        fields.append(QgsField("LENGTH", QVariant.Double))
+
+        (sink, dest_id) = self.parameterAsSink(
+            parameters,
+            self.OUTPUT_LAYER,
+            context,
+            fields,
+            QgsWkbTypes.LineString,
+            source.sourceCrs(),
+        )
+        if sink is None:
+            raise QgsProcessingException(
+                self.invalidSinkError(parameters, self.OUTPUT_LAYER))
+
+        shared_fields = QgsFields()
+        shared_fields.append(QgsField("FID_1", QVariant.LongLong))
+        shared_fields.append(QgsField("FID_2", QVariant.LongLong))
+        shared_fields.append(QgsField("SHARED_LENGTH", QVariant.Double))
+
+        (shared_sink, shared_dest_id) = self.parameterAsSink(
+            parameters,
+            self.SHARED_BOUNDARIES,
+            context,
+            shared_fields,
+            QgsWkbTypes.NoGeometry,
+            source.sourceCrs(),
+        )
+
+        # process: edges are matched in a single pass, thanks to the hash maps
+        # of a compact segment network, the ids of the polygons located on
+        # the left and on the right of each edge being stored in two arrays
+        request = QgsFeatureRequest()
+        request.setSubsetOfAttributes([])
+
+        network = SegmentNetwork()
+        left_fids = array("q")
+        right_fids = array("q")
+
+        features = prefetch_features(source.getFeatures(request), feedback)
+        total = 50.0 / source.featureCount() if source.featureCount() else 0
+        for current, f in enumerate(features):
+            if feedback.isCanceled():
+                return {}
+
+            if not f.hasGeometry():
+                continue
+
+            self.add_polygon_edges(network, left_fids, right_fids, f.id(), f.geometry())
+
+            feedback.setProgress(int(current * total))
+
+        network.freeze()
+
+        shared_lengths = {}
+
+        edge_count = network.edge_count()
+        total = 50.0 / edge_count if edge_count else 0
+        with BufferedFeatureSink(sink, background=True) as writer:
+            for current in range(edge_count):
+                if feedback.isCanceled():
+                    return {}
+
+                left_fid = left_fids[current]
+                right_fid = right_fids[current]
+                length = network.edge_length(current)
+
+                if left_fid != NO_FID and right_fid != NO_FID and left_fid != right_fid:
+                    pair = (min(left_fid, right_fid), max(left_fid, right_fid))
+                    shared_lengths[pair] = shared_lengths.get(pair, 0.0) + length
+
+                feat = QgsFeature()
+                feat.setGeometry(network.edge_geometry(current))
+                feat.setAttributes([
+                    NULL if left_fid == NO_FID else left_fid,
+                    NULL if right_fid == NO_FID else right_fid,
+                    length
+                ])
+                writer.addFeature(feat, QgsFeatureSink.FastInsert)
+
+                feedback.setProgress(50 + int(current * total))
+
+        if shared_sink is not None:
+            with BufferedFeatureSink(shared_sink, background=True) as shared_writer:
+                for (fid_1, fid_2), length in shared_lengths.items():
+                    feat = QgsFeature()
+                    feat.setAttributes([fid_1, fid_2, length])
+                    shared_writer.addFeature(feat, QgsFeatureSink.FastInsert)
+
+        # rename output layers
+        global edges_renamer, shared_boundaries_renamer
+
+        edges_renamer = LayerRenamer(f'{source.sourceName()}-{self.tr("Shared_edges")}')
+        context.layerToLoadOnCompletionDetails(
+            dest_id).setPostProcessor(edges_renamer)
+
+        results = {self.OUTPUT_LAYER: dest_id}
+
+        if shared_sink is not None:
+            shared_boundaries_renamer = LayerRenamer(f'{source.sourceName()}-{self.tr("Shared_boundaries")}')
+            context.layerToLoadOnCompletionDetails(
+                shared_dest_id).setPostProcessor(shared_boundaries_renamer)
+
+            results[self.SHARED_BOUNDARIES] = shared_dest_id
+
+        return results
+
+    def add_polygon_edges(self, network, left_fids, right_fids, fid, geometry):
+        """
+        Add the edges of a polygon to the segment network. The side of each
+        edge on which the polygon lies is deduced from the orientation of its
+        ring: the interior of a counterclockwise exterior ring, or of a
+        clockwise interior ring, is located on the left of its edges.
+        If two polygons lie on the same side of an edge (overlapping polygons),
+        the first one is kept.
+        """
+        for rings in geometry_utils.geometry_rings(geometry):
+            for ring_index, ring in enumerate(rings):
+                counterclockwise = geometry_utils.ring_signed_area(ring) > 0
+                polygon_on_left = counterclockwise == (ring_index == 0)
+
+                for i in range(len(ring) - 1):
+                    p1 = ring[i]
+                    p2 = ring[i + 1]
+
+                    index, created = network.add_edge(p1.x(), p1.y(), p2.x(), p2.y(), fid)
+                    if index < 0:
+                        continue
+
+                    if created:
+                        left_fids.append(NO_FID)
+                        right_fids.append(NO_FID)
+
+                    on_left = polygon_on_left
+                    if geometry_utils.points_comparison(p1, p2) > 0:
+                        on_left = not polygon_on_left
+
+                    side_fids = left_fids if on_left else right_fids
+                    if side_fids[index] == NO_FID:
+                        side_fids[index] = fid
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+    MorphAL: PTM plugin for QGIS
+    --------------
+    Start date           : January 2021
+    Copyright            : (C) 2021, Eric Grosso, PTM
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+import heapq
+import os
+import pickle
+import tempfile
+
+
+class ExternalDeduplicator:
+    """
+    Out-of-core deduplication of records based on a sortable key.
+
+    Records are accumulated in memory up to a given number, then sorted by
+    (key, insertion order) and spilled to a temporary file (a sorted run).
+    The runs are finally merged (external merge sort) and only the first
+    inserted record of each key is returned, so that the memory used stays
+    bounded whatever the number of records.
+
+    Records must be picklable.
+    """
+
+    def __init__(self, memory_limit: int, directory: str = None):
+        self.memory_limit = max(1, memory_limit)
+        self.directory = directory
+        self.run_count = 0
+        self._records = []
+        self._runs = []
+        self._readers = []
+        self._sequence = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def add(self, key, record):
+        self._records.append((key, self._sequence, record))
+        self._sequence += 1
+        if len(self._records) >= self.memory_limit:
+            self._spill()
+
+    def unique_records(self):
+        """
+        Merge the sorted runs and the records still in memory.
+
+        :return: a generator of tuples (key, record), sorted by key, with
+          the first inserted record of each key
+        """
+        self._records.sort(key=_sort_key)
+        self._readers = [_read_run(path) for path in self._runs]
+        runs = self._readers + [iter(self._records)]
+
+        last_key = None
+        first = True
+        for key, _, record in heapq.merge(*runs, key=_sort_key):
+            if first or key != last_key:
+                first = False
+                last_key = key
+                yield key, record
+
+    def close(self):
+        # the run files still open in an unfinished merge are closed first,
+        # as open files can not be removed on Windows
+        for reader in self._readers:
+            reader.close()
+        self._readers = []
+
+        for path in self._runs:
+            if os.path.exists(path):
+                os.remove(path)
+        self._runs = []
+        self._records = []
+
+    def _spill(self):
+        self._records.sort(key=_sort_key)
+
+        fd, path = tempfile.mkstemp(prefix="morphal_run_", suffix=".bin", dir=self.directory)
+        self._runs.append(path)
+        with os.fdopen(fd, "wb") as run_file:
+            pickler = pickle.Pickler(run_file, pickle.HIGHEST_PROTOCOL)
+            for item in self._records:
+                pickler.dump(item)
+                # the memo would otherwise keep every record alive
+                pickler.clear_memo()
+
+        self.run_count += 1
+        self._records = []
+
+
+def _sort_key(item):
+    return item[0], item[1]
+
+
+def _read_run(path: str):
+    with open(path, "rb") as run_file:
+        unpickler = pickle.Unpickler(run_file)
+        while True:
+            try:
+                yield unpickler.load()
+            except EOFError:
+                return
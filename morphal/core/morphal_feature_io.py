@@ -0,0 +1,290 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+    MorphAL: PTM plugin for QGIS
+    --------------
+    Start date           : January 2021
+    Copyright            : (C) 2021, Eric Grosso, PTM
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+import queue
+import threading
+
+from qgis.core import (
+    QgsFeature,
+    QgsFeatureIterator,
+    QgsFeatureRequest,
+    QgsFeatureSink,
+    QgsField,
+    QgsFields,
+    QgsProcessingException,
+)
+from qgis.PyQt.QtCore import QVariant
+
+DEFAULT_BATCH_SIZE = 1000
+DEFAULT_QUEUE_SIZE = 4
+DEFAULT_CHUNK_SIZE = 500
+
+SOURCE_FID_FIELD = "SRC_FID"
+
+_STOP = object()
+
+
+class BufferedFeatureSink:
+    """
+    Feature sink wrapper buffering features into batches written through
+    addFeatures() instead of one addFeature() call per feature.
+
+    If background is true, the batches are written by a dedicated thread,
+    fed through a bounded queue, so that computation and writing overlap.
+    The wrapper must be closed (or used as a context manager) to write the
+    last batch and to stop the writing thread.
+    """
+
+    def __init__(
+            self,
+            sink: QgsFeatureSink,
+            batch_size: int = DEFAULT_BATCH_SIZE,
+            background: bool = False,
+            queue_size: int = DEFAULT_QUEUE_SIZE,
+            flags=QgsFeatureSink.FastInsert
+    ):
+        self.sink = sink
+        self.batch_size = max(1, batch_size)
+        self.flags = flags
+        self.count = 0
+        self.error = None
+        self._batch = []
+        self._queue = None
+        self._thread = None
+
+        if background:
+            self._queue = queue.Queue(maxsize=max(1, queue_size))
+            self._thread = threading.Thread(target=self._write_batches, daemon=True)
+            self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def addFeature(self, feature, flags=None):  # pylint: disable=invalid-name,unused-argument
+        self._batch.append(feature)
+        self.count += 1
+        if len(self._batch) >= self.batch_size:
+            self.flush()
+        return True
+
+    def addFeatures(self, features, flags=None):  # pylint: disable=invalid-name,unused-argument
+        for feature in features:
+            self.addFeature(feature)
+        return True
+
+    def flush(self):
+        if not self._batch:
+            return
+
+        batch = self._batch
+        self._batch = []
+
+        if self._thread is None:
+            self._write(batch)
+        else:
+            self._raise_error()
+            self._queue.put(batch)
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            if self._thread is not None:
+                self._queue.put(_STOP)
+                self._thread.join()
+                self._thread = None
+
+        self._raise_error()
+
+    def _write(self, batch):
+        # PyQGIS returns a tuple (success, features), features being in/out
+        result = self.sink.addFeatures(batch, self.flags)
+        ok = result[0] if isinstance(result, tuple) else result
+        if not ok:
+            error = self.sink.lastError() if hasattr(self.sink, "lastError") else ""
+            raise QgsProcessingException(f"Could not write features to the output layer: {error}")
+
+    def _write_batches(self):
+        while True:
+            batch = self._queue.get()
+            if batch is _STOP:
+                return
+            if self.error is not None:
+                # keep draining the queue so that the producer never blocks
+                continue
+            try:
+                self._write(batch)
+            except Exception as e:  # pylint: disable=broad-except
+                self.error = e
+
+    def _raise_error(self):
+        if self.error is not None:
+            raise self.error
+
+
+class _ReadError:
+    def __init__(self, error: Exception):
+        self.error = error
+
+
+def prefetch_features(
+        features: QgsFeatureIterator,
+        feedback=None,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        queue_size: int = DEFAULT_QUEUE_SIZE
+):
+    """
+    Iterate over the features of an iterator (typically the result of
+    source.getFeatures()) read in chunks by a dedicated thread, and handed
+    over through a bounded queue, so that reading and decoding features
+    overlap with the computation done by the caller.
+
+    The reading stops as soon as the feedback is canceled or the returned
+    generator is closed (end of the iteration, break, return or exception
+    in the caller loop).
+
+    :param QgsFeatureIterator features: feature iterator, created by the caller
+    :param QgsFeedback feedback: feedback used to stop reading on cancelation
+    :param int chunk_size: number of features handed over at once
+    :param int queue_size: maximum number of chunks read in advance
+    :return: a generator of features
+    """
+
+    chunks = queue.Queue(maxsize=max(1, queue_size))
+    stop = threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                chunks.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def read():
+        chunk = []
+        try:
+            for feature in features:
+                if stop.is_set() or (feedback is not None and feedback.isCanceled()):
+                    break
+
+                chunk.append(feature)
+                if len(chunk) >= chunk_size:
+                    if not put(chunk):
+                        break
+                    chunk = []
+
+            if chunk:
+                put(chunk)
+        except Exception as e:  # pylint: disable=broad-except
+            put(_ReadError(e))
+        finally:
+            if hasattr(features, "close"):
+                features.close()
+            put(_STOP)
+
+    thread = threading.Thread(target=read, daemon=True)
+    thread.start()
+
+    try:
+        while True:
+            item = chunks.get()
+            if item is _STOP:
+                break
+            if isinstance(item, _ReadError):
+                raise item.error
+            yield from item
+    finally:
+        stop.set()
+        thread.join()
+
+
+class SourceAttributes:
+    """
+    Source attributes copied to the output features of an algorithm.
+
+    By default, all the attributes of the source features are fetched and
+    copied. In slim mode, only the feature id of the source features (in a
+    SRC_FID field) and an optional key field are fetched and copied, so
+    that the computed indicators can be joined back to the source later on.
+    """
+
+    def __init__(
+            self,
+            source_fields: QgsFields,
+            slim: bool = False,
+            key_field: str = ""
+    ):
+        self.source_fields = source_fields
+        self.slim = slim
+        self.key_index = -1
+        if slim and key_field:
+            self.key_index = source_fields.lookupField(key_field)
+
+    def fields(self):
+        if not self.slim:
+            return QgsFields(self.source_fields)
+
+        fields = QgsFields()
+        fields.append(QgsField(SOURCE_FID_FIELD, QVariant.LongLong))
+        if self.key_index >= 0:
+            fields.append(self.source_fields.at(self.key_index))
+        return fields
+
+    def request(self, extra_indices=()):
+        """
+        Request fetching the source attributes, and in slim mode the
+        attributes of the given extra indices (needed by the computation).
+        """
+        request = QgsFeatureRequest()
+        if self.slim:
+            indices = [self.key_index] if self.key_index >= 0 else []
+            indices.extend(index for index in extra_indices if index >= 0 and index not in indices)
+            request.setSubsetOfAttributes(indices)
+        return request
+
+    def attributes(self, feature: QgsFeature):
+        if not self.slim:
+            return feature.attributes()
+
+        if self.key_index >= 0:
+            return [feature.id(), feature.attribute(self.key_index)]
+        return [feature.id()]
+
+
+def numeric_attributes(feature: QgsFeature, indices):
+    """
+    Return the values of the given attributes of a feature as floats, or
+    None if one of them is null or not numeric.
+    """
+    values = []
+    for index in indices:
+        value = feature.attribute(index)
+        if value is None or (isinstance(value, QVariant) and value.isNull()):
+            return None
+        try:
+            values.append(float(value))
+        except (TypeError, ValueError):
+            return None
+    return values
@@ -17,43 +17,84 @@
  ***************************************************************************/
 """
 
-import processing
+import math
+from array import array
+
 from qgis.core import (
     QgsFeature,
+    QgsFeatureRequest,
     QgsFeatureSink,
-    QgsGeometry,
-    QgsPoint,
+    QgsField,
+    QgsFields,
     QgsProcessing,
     QgsProcessingException,
     QgsProcessingParameterBoolean,
+    QgsProcessingParameterDefinition,
+    QgsProcessingParameterEnum,
     QgsProcessingParameterFeatureSink,
     QgsProcessingParameterFeatureSource,
-    QgsVectorLayer,
+    QgsProcessingParameterNumber,
+    QgsProcessingUtils,
     QgsWkbTypes,
 )
+from qgis.PyQt.QtCore import QVariant
 
 from morphal.ptm4qgis_algorithm import PTM4QgisAlgorithm
 
 from . import morphal_geometry_utils as geometry_utils
+from . import morphal_noding as noding
+from .morphal_external_sort import ExternalDeduplicator
+from .morphal_feature_io import BufferedFeatureSink, prefetch_features
+from .morphal_segment_network import SegmentNetwork, segment_angle, segment_geometry, snap_segment
 from .utils import LayerRenamer
 
 
 class MorphALGeometryToSegments(PTM4QgisAlgorithm):
     INPUT_LAYER = "INPUT_LAYER"
     UNICITY = "UNICITY"
+    UNICITY_TOLERANCE = "UNICITY_TOLERANCE"
+    UNICITY_MEMORY_LIMIT = "UNICITY_MEMORY_LIMIT"
+    NODING = "NODING"
+    MERGE_ANGLE = "MERGE_ANGLE"
+    PARENT_IDS = "PARENT_IDS"
+    ORIENTATION = "ORIENTATION"
+    ORIENTATION_ORIGIN = "ORIENTATION_ORIGIN"
+    CLASSIFICATION = "CLASSIFICATION"
+    CLASSIFICATION_STEP = "CLASSIFICATION_STEP"
     OUTPUT_LAYER = "OUTPUT_LAYER"
+    PARENT_TABLE = "PARENT_TABLE"
 
     def help(self):
         return self.tr("\
             This algorithm generates a segment layer from an input line layer or an input polygon layer.\
             \nThese segments are normalised, i.e. their point of origin is always located as far west \
             as possible, or otherwise as far south as possible.\
-            \nOptionally, it is possible to generate unique segments based on geometry.\
-            \nThe attribute table of the output layer is identical to the one of the input layer.")
+            \nOptionally, it is possible to generate unique segments based on geometry. Their extremities\
+            can be snapped to a grid whose cell size is a snapping tolerance, two segments being considered\
+            identical if their snapped extremities are identical (degenerated snapped segments are dropped).\
+            For layers too large to fit in memory, the number of segments kept in memory can be bounded:\
+            segments are then deduplicated by an external merge sort on disk, and written in sorted order.\
+            \nOptionally, segments can be split at all their mutual intersections, so that the output\
+            is a planar set of segments (intersections are searched with a grid of buckets). Noding\
+            keeps the coordinates of all the segments in memory, as well as the attributes of their\
+            features (unless parent identifiers only are kept).\
+            \nOptionally, consecutive segments of a same line or ring whose orientations differ by less\
+            than an angular tolerance can be merged, the number of merged segments being stored (SEG_COUNT).\
+            \nThe attribute table of the output layer is identical to the one of the input layer,\
+            unless the slim output is selected (source feature id and key field only).\
+            \nOptionally, segments can only hold the identifiers of their parent geometry (feature id,\
+            part, ring and vertex indices), the parent attributes being written once per parent feature\
+            in a separate table.\
+            \nOptionally, the orientation (in degrees, from East or from North, in [0 ; 180[), its\
+            classification and the length of each segment can be computed in the same pass.")
 
     def __init__(self):
         super().__init__()
         self.unicity = True
+        self.orientation_origins = [
+            self.tr("East"),
+            self.tr("North")
+        ]
 
     def initAlgorithm(self, config):
         self.addParameter(
@@ -72,6 +113,91 @@ class MorphALGeometryToSegments(PTM4QgisAlgorithm):
             )
         )
 
+        self.addParameter(
+            QgsProcessingParameterNumber(
+                self.UNICITY_TOLERANCE,
+                self.tr("Snapping tolerance for the unicity of segments (0: exact coordinates)"),
+                type=QgsProcessingParameterNumber.Double,
+                minValue=0.0,
+                defaultValue=0.0,
+            )
+        )
+
+        unicity_memory_limit = QgsProcessingParameterNumber(
+            self.UNICITY_MEMORY_LIMIT,
+            self.tr("Maximum number of segments kept in memory for the unicity (0: no limit)"),
+            type=QgsProcessingParameterNumber.Integer,
+            minValue=0,
+            defaultValue=0,
+        )
+        unicity_memory_limit.setFlags(unicity_memory_limit.flags() | QgsProcessingParameterDefinition.FlagAdvanced)
+        self.addParameter(unicity_memory_limit)
+
+        self.addParameter(
+            QgsProcessingParameterBoolean(
+                self.NODING,
+                self.tr("Split segments at their mutual intersections (planar noding)"),
+                defaultValue=False
+            )
+        )
+
+        self.addParameter(
+            QgsProcessingParameterNumber(
+                self.MERGE_ANGLE,
+                self.tr("Angular tolerance (in degrees) to merge consecutive segments (0: no merging)"),
+                type=QgsProcessingParameterNumber.Double,
+                minValue=0.0,
+                maxValue=90.0,
+                defaultValue=0.0,
+            )
+        )
+
+        self.addParameter(
+            QgsProcessingParameterBoolean(
+                self.PARENT_IDS,
+                self.tr("Segments with parent identifiers only (feature id, part, ring and vertex indices)"),
+                defaultValue=False
+            )
+        )
+
+        self.addParameter(
+            QgsProcessingParameterBoolean(
+                self.ORIENTATION,
+                self.tr("Compute orientations and lengths of segments"),
+                defaultValue=False
+            )
+        )
+
+        self.addParameter(
+            QgsProcessingParameterEnum(
+                self.ORIENTATION_ORIGIN,
+                self.tr("Orientations calculated from"),
+                options=self.orientation_origins,
+                defaultValue=0
+            )
+        )
+
+        self.addParameter(
+            QgsProcessingParameterBoolean(
+                self.CLASSIFICATION,
+                self.tr("Compute a classification of orientations"),
+                defaultValue=True,
+            )
+        )
+
+        self.addParameter(
+            QgsProcessingParameterNumber(
+                self.CLASSIFICATION_STEP,
+                self.tr("Step of the classification"),
+                type=QgsProcessingParameterNumber.Double,
+                minValue=0.001,
+                maxValue=200,
+                defaultValue=10,
+            )
+        )
+
+        self.addSlimOutputParameters(self.INPUT_LAYER)
+
         self.addParameter(
             QgsProcessingParameterFeatureSink(
                 self.OUTPUT_LAYER,
@@ -80,6 +206,16 @@ class MorphALGeometryToSegments(PTM4QgisAlgorithm):
             )
         )
 
+        self.addParameter(
+            QgsProcessingParameterFeatureSink(
+                self.PARENT_TABLE,
+                self.tr("Parent attributes (with parent identifiers only)"),
+                type=QgsProcessing.TypeVector,
+                optional=True,
+                createByDefault=False
+            )
+        )
+
     def name(self):
         return "geometry_to_segments"
 
@@ -113,13 +249,67 @@ class MorphALGeometryToSegments(PTM4QgisAlgorithm):
 
         # other parameters
         unicity = self.parameterAsBoolean(parameters, self.UNICITY, context)
+        unicity_tolerance = self.parameterAsDouble(parameters, self.UNICITY_TOLERANCE, context)
+        unicity_memory_limit = self.parameterAsInt(parameters, self.UNICITY_MEMORY_LIMIT, context)
+        noding = self.parameterAsBoolean(parameters, self.NODING, context)
+        merge_angle = math.radians(self.parameterAsDouble(parameters, self.MERGE_ANGLE, context))
+        parent_ids = self.parameterAsBoolean(parameters, self.PARENT_IDS, context)
+        source_attributes = self.parameterAsSourceAttributes(parameters, source, context)
+
+        orientation = self.parameterAsBoolean(parameters, self.ORIENTATION, context)
+
+        # Orientation origin:
+        # 0 - East
+        # 1 - North
+        orientation_origin = self.parameterAsEnum(parameters, self.ORIENTATION_ORIGIN, context)
+        from_north = False
+        if orientation_origin == 1:
+            from_north = True
+
+        classification = orientation and self.parameterAsBoolean(
+            parameters, self.CLASSIFICATION, context
+        )
+        classification_step = self.parameterAsDouble(
+            parameters, self.CLASSIFICATION_STEP, context
+        )
+
+        if parent_ids:
+            fields = QgsFields()
+            fields.append(QgsField("PARENT_FID", QVariant.LongLong))
+            fields.append(QgsField("PART_INDEX", QVariant.Int))
+            fields.append(QgsField("RING_INDEX", QVariant.Int))
+            fields.append(QgsField("VERTEX_INDEX", QVariant.Int))
+        else:
+            fields = source_attributes.fields()
+
+        if merge_angle > 0:
+            merge_fields = QgsFields()
+            merge_fields.append(QgsField("SEG_COUNT", QVariant.Int))
+            fields = QgsProcessingUtils.combineFields(fields, merge_fields)
+
+        if orientation:
+            new_fields = QgsFields()
+            if from_north:
+                new_fields.append(QgsField("N_ORIENTATION", QVariant.Double))
+            else:
+                new_fields.append(QgsField("E_ORIENTATION", QVariant.Double))
+
+            if classification:
+                if from_north:
+                    new_fields.append(QgsField("N_CLASSIFICATION", QVariant.Double))
+                else:
+                    new_fields.append(QgsField("E_CLASSIFICATION", QVariant.Double))
+
+            new_fields.append(QgsField("LENGTH", QVariant.Double))
+
+            fields = QgsProcessingUtils.combineFields(fields, new_fields)
 
         # output
         (sink, dest_id) = self.parameterAsSink(
             parameters,
             self.OUTPUT_LAYER,
             context,
-            source.fields(),
+            fields,
             QgsWkbTypes.LineString,
             source.sourceCrs(),
         )
@@ -127,72 +317,127 @@ class MorphALGeometryToSegments(PTM4QgisAlgorithm):
             raise QgsProcessingException(
                 self.invalidSinkError(parameters, self.OUTPUT_LAYER))
 
-        # process
-        vector_layer = QgsVectorLayer("LineString", "temp", "memory")
+        request = source_attributes.request()
+
+        parent_sink = None
+        parent_dest_id = None
+        if parent_ids:
+            parent_fields = QgsFields()
+            parent_fields.append(QgsField("PARENT_FID", QVariant.LongLong))
+            parent_fields = QgsProcessingUtils.combineFields(parent_fields, source.fields())
+
+            (parent_sink, parent_dest_id) = self.parameterAsSink(
+                parameters,
+                self.PARENT_TABLE,
+                context,
+                parent_fields,
+                QgsWkbTypes.NoGeometry,
+                source.sourceCrs(),
+            )
 
-        dp = vector_layer.dataProvider()
-        dp.addAttributes(source.fields())
-        vector_layer.updateFields()
+            # attributes are only needed to fill the parent table
+            request = QgsFeatureRequest()
+            if parent_sink is None:
+                request.setSubsetOfAttributes([])
 
-        vector_layer.startEditing()
+        # process: segments are streamed to the output in a single pass,
+        # duplicates being detected with a compact segment network, or with
+        # an external merge sort if the memory used has to be bounded
+        unique_segments = SegmentNetwork(unicity_tolerance)
 
-        features = source.getFeatures()
+        deduplicator = None
+        if unicity and unicity_memory_limit > 0:
+            deduplicator = ExternalDeduplicator(unicity_memory_limit)
+
+        features = prefetch_features(source.getFeatures(request), feedback)
         total = 100.0 / source.featureCount() if source.featureCount() else 0
+        if noding:
+            # half of the progress for reading, half for noding and writing
+            total /= 2
+
+        parent_writer = None
+        if parent_sink is not None:
+            parent_writer = BufferedFeatureSink(parent_sink, background=True)
+
+        try:
+            segments = self.source_segments(
+                features,
+                parent_ids,
+                source_attributes,
+                parent_writer,
+                merge_angle,
+                total,
+                feedback
+            )
 
-        if QgsWkbTypes.geometryType(wkb_type) == QgsWkbTypes.PolygonGeometry:
-            for current, f in enumerate(features):
-                if feedback.isCanceled():
-                    return {}
+            if noding:
+                segments = self.noded_segments(segments, feedback)
+
+            with BufferedFeatureSink(sink, background=True) as writer:
+                for attrs, part_index, ring_index, vertex_index, fid, x0, y0, x1, y1, count in segments:
+                    if unicity:
+                        # same snapping rule for the in-memory and the external unicity
+                        coords = snap_segment(x0, y0, x1, y1, unicity_tolerance)
+                        if coords is None:
+                            continue
+
+                        if deduplicator is None:
+                            index, created = unique_segments.add_edge(*coords, fid)
+                            if not created:
+                                continue
+                            # the unique segment is read back from the arrays of the network
+                            coords = unique_segments.edge(index)
+                    elif (x1, y1) < (x0, y0):
+                        coords = (x1, y1, x0, y0)
+                    else:
+                        coords = (x0, y0, x1, y1)
+
+                    if parent_ids:
+                        segment_attrs = attrs + [part_index, ring_index, vertex_index]
+                    else:
+                        segment_attrs = list(attrs)
+
+                    if merge_angle > 0:
+                        segment_attrs.append(count)
+
+                    if orientation:
+                        segment_attrs.extend(
+                            self.segment_attributes(coords, from_north, classification, classification_step)
+                        )
+
+                    if deduplicator is not None:
+                        # unique segments are written once all segments are sorted
+                        deduplicator.add(
+                            coords,
+                            [None if isinstance(a, QVariant) and a.isNull() else a for a in segment_attrs]
+                        )
+                        continue
+
+                    feat = QgsFeature()
+                    feat.setAttributes(segment_attrs)
+                    feat.setGeometry(segment_geometry(*coords))
+                    writer.addFeature(feat, QgsFeatureSink.FastInsert)
 
-                if not f.hasGeometry():
-                    continue
-                else:
-                    for p in self.polygon_to_segments(f.geometry()):
-                        feat = QgsFeature()
-                        feat.setAttributes(f.attributes())
-                        feat.setGeometry(p)
-                        vector_layer.addFeature(feat, QgsFeatureSink.FastInsert)
-
-                feedback.setProgress(int(current * total))
-        else:  # LineGeometry
-            for current, f in enumerate(features):
                 if feedback.isCanceled():
                     return {}
 
-                if not f.hasGeometry():
-                    continue
-                else:
-                    for p in self.line_to_segments(f.geometry()):
-                        feat = QgsFeature()
-                        feat.setAttributes(f.attributes())
-                        feat.setGeometry(p)
-                        vector_layer.addFeature(feat, QgsFeatureSink.FastInsert)
+                if deduplicator is not None:
+                    feedback.pushInfo(
+                        self.tr("Merging {} sorted runs of segments").format(deduplicator.run_count + 1)
+                    )
+                    for coords, segment_attrs in deduplicator.unique_records():
+                        if feedback.isCanceled():
+                            return {}
 
-                feedback.setProgress(int(current * total))
-
-        vector_layer.commitChanges()
-
-        if unicity:
-            alg_params = {
-                'INPUT': vector_layer,
-                'OUTPUT': 'TEMPORARY_OUTPUT'
-            }
-
-            layer_with_deleted_duplicate_geom = processing.run(
-                "native:deleteduplicategeometries",
-                alg_params,
-                context=context,
-                feedback=feedback,
-                is_child_algorithm=True
-            )
-
-            vlyr = context.getMapLayer(layer_with_deleted_duplicate_geom['OUTPUT'])
-
-            for f in vlyr.getFeatures():
-                sink.addFeature(f, QgsFeatureSink.FastInsert)
-        else:
-            for f in vector_layer.getFeatures():
-                sink.addFeature(f, QgsFeatureSink.FastInsert)
+                        feat = QgsFeature()
+                        feat.setAttributes(segment_attrs)
+                        feat.setGeometry(segment_geometry(*coords))
+                        writer.addFeature(feat, QgsFeatureSink.FastInsert)
+        finally:
+            if parent_writer is not None:
+                parent_writer.close()
+            if deduplicator is not None:
+                deduplicator.close()
 
         # rename output layer
         global segments_renamer
@@ -207,126 +452,121 @@ class MorphALGeometryToSegments(PTM4QgisAlgorithm):
         context.layerToLoadOnCompletionDetails(
             dest_id).setPostProcessor(segments_renamer)
 
-        return {self.OUTPUT_LAYER: dest_id}
-
-    def polygon_to_unique_segments(self, geometry, all_segments):
-        # polygons to lines (multipart)
-        boundary = QgsGeometry(geometry.constGet().boundary())
-        boundaries = boundary.asGeometryCollection()
-
-        segments = []
-
-        for boundary in boundaries:
-            if boundary.isMultipart():
-                lines = boundary.asMultiPolyline()
-                for line in lines:
-                    for i in range(len(line) - 1):
-                        p1 = QgsPoint(line[i])
-                        p2 = QgsPoint(line[i + 1])
+        results = {self.OUTPUT_LAYER: dest_id}
 
-                        segment = geometry_utils.create_normalized_segment(p1, p2)
-                        segment_wkt = segment.asWkt()
+        if parent_sink is not None:
+            global parents_renamer
 
-                        if segment_wkt not in all_segments:
-                            all_segments.append(segment_wkt)
-                            segments.append(segment)
-            else:
-                line = boundary.asPolyline()
-                for i in range(len(line) - 1):
-                    p1 = QgsPoint(line[i])
-                    p2 = QgsPoint(line[i + 1])
-
-                    segment = geometry_utils.create_normalized_segment(p1, p2)
-                    segment_wkt = segment.asWkt()
-
-                    if segment_wkt not in all_segments:
-                        all_segments.append(segment_wkt)
-                        segments.append(segment)
+            parents_renamer = LayerRenamer(f'{source.sourceName()}-Segments-Parents')
+            context.layerToLoadOnCompletionDetails(
+                parent_dest_id).setPostProcessor(parents_renamer)
 
-        return segments
+            results[self.PARENT_TABLE] = parent_dest_id
 
-    def polygon_to_segments(self, geometry):
-        # polygons to lines (multipart)
-        boundary = QgsGeometry(geometry.constGet().boundary())
-        boundaries = boundary.asGeometryCollection()
+        return results
 
-        segments = []
+    def source_segments(self, features, parent_ids, source_attributes, parent_writer, merge_angle, total, feedback):
+        """
+        Generate the segments of the source features, as tuples (base attributes,
+        part index, ring index, vertex index, parent feature id, x0, y0, x1, y1,
+        number of merged segments). The parent table is filled along the way.
+        """
+        for current, f in enumerate(features):
+            if feedback.isCanceled():
+                return
 
-        for boundary in boundaries:
-            if boundary.isMultipart():
-                lines = boundary.asMultiPolyline()
-                for line in lines:
-                    for i in range(len(line) - 1):
-                        p1 = QgsPoint(line[i])
-                        p2 = QgsPoint(line[i + 1])
+            if not f.hasGeometry():
+                continue
 
-                        segment = geometry_utils.create_normalized_segment(p1, p2)
-                        segments.append(segment)
+            if parent_ids:
+                attrs = [f.id()]
+                if parent_writer is not None:
+                    parent_feat = QgsFeature()
+                    parent_feat.setAttributes(attrs + f.attributes())
+                    parent_writer.addFeature(parent_feat, QgsFeatureSink.FastInsert)
             else:
-                line = boundary.asPolyline()
-                for i in range(len(line) - 1):
-                    p1 = QgsPoint(line[i])
-                    p2 = QgsPoint(line[i + 1])
-
-                    segment = geometry_utils.create_normalized_segment(p1, p2)
-                    segments.append(segment)
-        return segments
-
-    def line_to_unique_segments(self, geometry, all_segments):
-        collection = geometry.asGeometryCollection()
-
-        segments = []
-
-        for geom in collection:
-            if geom.isMultipart():
-                lines = geom.asMultiPolyline()
-                for line in lines:
-                    for i in range(len(line) - 1):
-                        p1 = QgsPoint(line[i])
-                        p2 = QgsPoint(line[i + 1])
-
-                        segment = geometry_utils.create_normalized_segment(p1, p2)
-                        segment_wkt = segment.asWkt()
-
-                        if segment_wkt not in all_segments:
-                            all_segments.append(segment_wkt)
-                            segments.append(segment)
+                attrs = source_attributes.attributes(f)
+
+            if merge_angle > 0:
+                for part_index, rings in enumerate(geometry_utils.geometry_rings(f.geometry())):
+                    for ring_index, ring in enumerate(rings):
+                        for vertex_index, count, p1, p2 in geometry_utils.merged_ring_segments(ring, merge_angle):
+                            yield (
+                                attrs, part_index, ring_index, vertex_index, f.id(),
+                                p1.x(), p1.y(), p2.x(), p2.y(), count
+                            )
             else:
-                line = geom.asPolyline()
-                for i in range(len(line) - 1):
-                    p1 = QgsPoint(line[i])
-                    p2 = QgsPoint(line[i + 1])
-
-                    segment = geometry_utils.create_normalized_segment(p1, p2)
-                    segment_wkt = segment.asWkt()
-
-                    if segment_wkt not in all_segments:
-                        all_segments.append(segment_wkt)
-                        segments.append(segment)
-
-        return segments
-
-    def line_to_segments(self, geometry):
-        collection = geometry.asGeometryCollection()
-
-        segments = []
+                for part_index, ring_index, vertex_index, p1, p2 in geometry_utils.indexed_segments(f.geometry()):
+                    yield attrs, part_index, ring_index, vertex_index, f.id(), p1.x(), p1.y(), p2.x(), p2.y(), 1
+
+            feedback.setProgress(int(current * total))
+
+    def noded_segments(self, segments, feedback):
+        """
+        Split segments at all their mutual intersections (planar noding),
+        the pieces of a segment keeping its attributes and indices.
+
+        All the segments have to be read before noding: their coordinates
+        and indices are stored in compact arrays, the base attributes being
+        stored once per parent feature.
+        """
+        coords = array("d")
+        indices = array("i")
+        fids = array("q")
+        attrs_positions = array("q")
+        feature_attrs = []
+
+        for attrs, part_index, ring_index, vertex_index, fid, x0, y0, x1, y1, count in segments:
+            if not feature_attrs or feature_attrs[-1] is not attrs:
+                feature_attrs.append(attrs)
+            attrs_positions.append(len(feature_attrs) - 1)
+            indices.extend((part_index, ring_index, vertex_index, count))
+            fids.append(fid)
+            coords.extend((x0, y0, x1, y1))
+
+        if feedback.isCanceled():
+            return
+
+        segment_count = len(fids)
+        feedback.pushInfo(self.tr("Noding {} segments").format(segment_count))
+        splits = noding.node_segments(coords, feedback=feedback)
+
+        total = 50.0 / segment_count if segment_count else 0
+        for current in range(segment_count):
+            attrs = feature_attrs[attrs_positions[current]]
+            part_index, ring_index, vertex_index, count = indices[4 * current:4 * current + 4]
+            x0, y0, x1, y1 = coords[4 * current:4 * current + 4]
+
+            # the split points are shared with the intersecting segments
+            points = [(x0, y0)]
+            points.extend(splits.get(current, ()))
+            points.append((x1, y1))
+
+            for i in range(len(points) - 1):
+                if len(points) > 2 and points[i] == points[i + 1]:
+                    continue
+                yield (
+                    attrs, part_index, ring_index, vertex_index, fids[current],
+                    points[i][0], points[i][1], points[i + 1][0], points[i + 1][1], count
+                )
+
+            if current % 1000 == 0:
+                feedback.setProgress(50 + int(current * total))
+
+    def segment_attributes(self, coords, from_north, classification, classification_step):
+        # same semantics as the segment orientation algorithm: degrees, [0 ; Pi[, rounded
+        x0, y0, x1, y1 = coords
+        segment_orientation = geometry_utils.convert_angle(
+            segment_angle(x0, y0, x1, y1),
+            0,
+            0,
+            True,
+            from_north
+        )
 
-        for geom in collection:
-            if geom.isMultipart():
-                lines = geom.asMultiPolyline()
-                for line in lines:
-                    for i in range(len(line) - 1):
-                        p1 = QgsPoint(line[i])
-                        p2 = QgsPoint(line[i + 1])
+        attrs = [segment_orientation]
+        if classification:
+            attrs.append(geometry_utils.orientation_class(segment_orientation, classification_step))
+        attrs.append(math.hypot(x1 - x0, y1 - y0))
 
-                        segment = geometry_utils.create_normalized_segment(p1, p2)
-                        segments.append(segment)
-            else:
-                line = geom.asPolyline()
-                for i in range(len(line) - 1):
-                    p1 = QgsPoint(line[i])
-                    p2 = QgsPoint(line[i + 1])
-
-                    segment = geometry_utils.create_normalized_segment(p1, p2)
-                    segments.append(segment)
-        return segments
+        return attrs
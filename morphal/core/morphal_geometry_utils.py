@@ -19,7 +19,14 @@
 
 import math
 
-from qgis.core import QgsDistanceArea, QgsGeometry, QgsLineString, QgsPoint, QgsPolygon
+from qgis.core import (
+    QgsDistanceArea,
+    QgsGeometry,
+    QgsLineString,
+    QgsPoint,
+    QgsPolygon,
+    QgsWkbTypes,
+)
 
 from .utils import round_float_to_3_decimals
 
@@ -48,51 +55,482 @@ def create_normalized_segment(
     return QgsGeometry(QgsLineString([point_1, point_0]))
 
 
-def polygon_orientation(polygon: QgsPolygon):
+def geometry_rings(geometry: QgsGeometry):
     """
-    Compute the orientation of a polygon (QgsPolygon) (in degrees)
-    comparatively to the cartographic East (axis X).
+    Return the parts of a line or a polygon geometry, each part being a list
+    of rings (a line part has a single ring, the line itself), each ring being
+    a list of QgsPointXY. Curved geometries are segmentized.
+    """
+
+    if geometry.type() == QgsWkbTypes.PolygonGeometry:
+        if geometry.isMultipart():
+            return geometry.asMultiPolygon()
+        return [geometry.asPolygon()]
+
+    if geometry.isMultipart():
+        return [[line] for line in geometry.asMultiPolyline()]
+    return [[geometry.asPolyline()]]
+
+
+def ring_signed_area(ring):
+    """
+    Compute the signed area of a ring (list of points), positive if the ring
+    is counterclockwise oriented, negative otherwise (shoelace formula).
+    """
+
+    area = 0.0
+    for i in range(len(ring) - 1):
+        area += ring[i].x() * ring[i + 1].y() - ring[i + 1].x() * ring[i].y()
+    return area / 2.0
+
+
+def indexed_segments(geometry: QgsGeometry):
+    """
+    Iterate over the segments of a line or a polygon geometry.
+
+    :param QgsGeometry geometry: geometry to process
+    :return: a generator of tuples (part index, ring index, vertex index,
+      first point, second point), the points being QgsPointXY
+    """
+
+    for part_index, rings in enumerate(geometry_rings(geometry)):
+        for ring_index, ring in enumerate(rings):
+            for vertex_index in range(len(ring) - 1):
+                yield part_index, ring_index, vertex_index, ring[vertex_index], ring[vertex_index + 1]
+
+
+def merged_ring_segments(ring, tolerance: float):
+    """
+    Merge the consecutive segments of a ring (or of a line) whose directions
+    differ by less than an angular tolerance, in a single pass.
+
+    The direction of each segment is compared to the direction of the first
+    segment of the current run, so that the deviation of a merged segment
+    stays bounded by the tolerance. Degenerated segments are absorbed by the
+    current run. For closed rings, the last run is merged with the first one
+    if they are aligned.
+
+    :param ring: list of QgsPointXY
+    :param float tolerance: angular tolerance in radians
+    :return: a list of tuples (index of the first vertex, number of merged
+      segments, first point, last point)
+    """
+
+    runs = []
+    start = 0
+    anchor = None
+    for i in range(len(ring) - 1):
+        dx = ring[i + 1].x() - ring[i].x()
+        dy = ring[i + 1].y() - ring[i].y()
+        if dx == 0 and dy == 0:
+            continue
+
+        direction = math.atan2(dy, dx)
+        if anchor is None:
+            anchor = direction
+        elif _direction_difference(direction, anchor) >= tolerance:
+            runs.append([start, i, anchor])
+            start = i
+            anchor = direction
+
+    if len(ring) > 1:
+        runs.append([start, len(ring) - 1, anchor])
+
+    merged = [[run_start, run_end - run_start, run_start, run_end] for run_start, run_end, _ in runs]
+
+    closed = len(ring) > 3 and ring[0] == ring[-1]
+    if (
+        closed
+        and len(runs) > 1
+        and runs[0][2] is not None
+        and runs[-1][2] is not None
+        and _direction_difference(runs[0][2], runs[-1][2]) < tolerance
+    ):
+        last = merged.pop()
+        merged[0] = [last[0], last[1] + merged[0][1], last[2], merged[0][3]]
+
+    return [(vertex_index, count, ring[first], ring[last]) for vertex_index, count, first, last in merged]
+
+
+def _direction_difference(direction_1: float, direction_2: float):
+    # absolute difference between two directions, in [0 ; Pi]
+    difference = abs(direction_1 - direction_2) % (2 * math.pi)
+    return min(difference, 2 * math.pi - difference)
+
+
+def edge_orientation_indicators(geometry: QgsGeometry, bin_count: int = 18):
+    """
+    Compute indicators of the orientations of the edges of a polygon, in a
+    single pass over the coordinates of its rings. Orientations are folded
+    into [ 0 ; PI/2 [, i.e. perpendicular edges are considered identical,
+    and edges are weighted by their length.
+
+    - dominant orientation: mean of the quadrupled angles, in degrees from
+      East, in [ 0 ; 90 [
+    - entropy: Shannon entropy of the histogram of orientations (bin_count
+      bins over [ 0 ; PI/2 [), normalised between 0 (single orientation)
+      and 1 (uniform orientations)
+    - orthogonality: length of the resultant of the quadrupled-angle vectors
+      divided by the perimeter, 1 if all edges are parallel or perpendicular
+
+    :param QgsGeometry geometry: polygon geometry to process
+    :param int bin_count: number of bins of the entropy histogram
+    :return: a tuple (dominant orientation, entropy, orthogonality), or None
+      if the perimeter is null
+    """
+
+    bins = [0.0] * bin_count
+    bin_size = (math.pi / 2.0) / bin_count
+    sum_cos = 0.0
+    sum_sin = 0.0
+    total_length = 0.0
+
+    for _, _, _, p1, p2 in indexed_segments(geometry):
+        dx = p2.x() - p1.x()
+        dy = p2.y() - p1.y()
+        length = math.hypot(dx, dy)
+        if length == 0:
+            continue
+
+        folded = math.atan2(dy, dx) % (math.pi / 2.0)
+        sum_cos += length * math.cos(4 * folded)
+        sum_sin += length * math.sin(4 * folded)
+        total_length += length
+        bins[min(int(folded / bin_size), bin_count - 1)] += length
+
+    if total_length == 0:
+        return None
+
+    dominant = math.degrees((math.atan2(sum_sin, sum_cos) / 4.0) % (math.pi / 2.0))
+    if dominant >= 90.0:
+        dominant = 0.0
+
+    entropy = 0.0
+    for length in bins:
+        if length > 0:
+            p = length / total_length
+            entropy -= p * math.log(p)
+    if bin_count > 1:
+        entropy /= math.log(bin_count)
+
+    orthogonality = min(1.0, math.hypot(sum_cos, sum_sin) / total_length)
+
+    return dominant, entropy, orthogonality
+
+
+def box_counting_dimension(geometry: QgsGeometry, min_level: int, max_level: int):
+    """
+    Estimate the fractal dimension of the boundary of a polygon (or of a line)
+    by box counting: at each level k, the extent of the geometry, padded by
+    half a box on each side, is divided into square boxes of size
+    extent / 2^k, and the boxes crossed by the boundary are counted by
+    traversing the grid along each segment. The padding keeps the boundary
+    off the edges of the grid, so that boxes are not counted twice on the
+    edges (nor missed at the corners) of axis-aligned boundaries. The
+    dimension is the slope of the least squares regression of log(count)
+    against log(2^k).
+
+    Only the keys of the crossed boxes of the current level are kept in
+    memory, i.e. memory is bounded by the number of boxes crossed at the
+    finest level.
+
+    :param QgsGeometry geometry: geometry to process
+    :param int min_level: coarsest level of subdivision
+    :param int max_level: finest level of subdivision
+    :return: the estimated dimension, or None if it can not be estimated
+      (less than two levels or degenerated geometry)
+    """
+
+    segments = [
+        (p1.x(), p1.y(), p2.x(), p2.y())
+        for _, _, _, p1, p2 in indexed_segments(geometry)
+    ]
+    if not segments or max_level - min_level < 1:
+        return None
+
+    min_x = min(min(segment[0], segment[2]) for segment in segments)
+    min_y = min(min(segment[1], segment[3]) for segment in segments)
+    extent = max(
+        max(max(segment[0], segment[2]) for segment in segments) - min_x,
+        max(max(segment[1], segment[3]) for segment in segments) - min_y
+    )
+    if extent <= 0:
+        return None
+
+    log_scales = []
+    log_counts = []
+    for level in range(min_level, max_level + 1):
+        size = extent / (2 ** level)
+        origin_x = min_x - size / 2.0
+        origin_y = min_y - size / 2.0
+        boxes = set()
+        for x0, y0, x1, y1 in segments:
+            _traverse_grid(x0 - origin_x, y0 - origin_y, x1 - origin_x, y1 - origin_y, size, 2 ** level, boxes)
+
+        log_scales.append(level * math.log(2))
+        log_counts.append(math.log(len(boxes)))
+
+    mean_scale = sum(log_scales) / len(log_scales)
+    mean_count = sum(log_counts) / len(log_counts)
+    covariance = sum((s - mean_scale) * (c - mean_count) for s, c in zip(log_scales, log_counts))
+    variance = sum((s - mean_scale) ** 2 for s in log_scales)
+
+    return covariance / variance
+
+
+def _traverse_grid(x0: float, y0: float, x1: float, y1: float, size: float, last: int, boxes: set):
+    # add the boxes of a grid (origin 0, 0, boxes 0 to last in both directions)
+    # crossed by a segment (Amanatides & Woo traversal), box indices being
+    # clamped so that points on the maximum extent belong to the last boxes
+    cx = int(x0 // size)
+    cy = int(y0 // size)
+    end_x = int(x1 // size)
+    end_y = int(y1 // size)
+    boxes.add((min(cx, last), min(cy, last)))
+
+    dx = x1 - x0
+    dy = y1 - y0
+    step_x = 1 if dx > 0 else -1
+    step_y = 1 if dy > 0 else -1
+    t_max_x = ((cx + (step_x > 0)) * size - x0) / dx if dx != 0 else math.inf
+    t_max_y = ((cy + (step_y > 0)) * size - y0) / dy if dy != 0 else math.inf
+    t_delta_x = size / abs(dx) if dx != 0 else math.inf
+    t_delta_y = size / abs(dy) if dy != 0 else math.inf
+
+    # the number of steps is bounded against rounding errors
+    for _ in range(abs(end_x - cx) + abs(end_y - cy)):
+        if t_max_x < t_max_y:
+            cx += step_x
+            t_max_x += t_delta_x
+        else:
+            cy += step_y
+            t_max_y += t_delta_y
+        boxes.add((min(cx, last), min(cy, last)))
+
+
+def fourier_twiddles(samples: int):
+    """
+    Precompute the table of the DFT twiddle factors (cosines and sines of
+    2 PI k / samples) used by fourier_descriptors().
+    """
+
+    return (
+        [math.cos(2 * math.pi * k / samples) for k in range(samples)],
+        [math.sin(2 * math.pi * k / samples) for k in range(samples)],
+    )
+
+
+def fourier_descriptors(geometry: QgsGeometry, coefficients: int, twiddles):
+    """
+    Compute translation, rotation, scale and starting point invariant Fourier
+    descriptors of the outer boundary of a polygon (of its largest part for
+    multipolygons).
+
+    The counterclockwise exterior ring is resampled into N points equally
+    spaced by arc length (N being the size of the twiddle table), seen as
+    complex numbers, and their discrete Fourier transform is computed for
+    the needed frequencies only. The descriptors are the magnitudes of the
+    coefficients of frequencies -1, 2, -2, 3, -3... divided by the magnitude
+    of the coefficient of frequency 1.
+
+    :param QgsGeometry geometry: polygon geometry to process
+    :param int coefficients: number of descriptors
+    :param twiddles: twiddle factors computed by fourier_twiddles(N)
+    :return: the list of descriptors, or None for degenerated geometries
+    """
+
+    cos_table, sin_table = twiddles
+    samples = len(cos_table)
+
+    # exterior ring of the largest part, counterclockwise
+    ring = None
+    ring_area = 0.0
+    for rings in geometry_rings(geometry):
+        if rings:
+            area = ring_signed_area(rings[0])
+            if ring is None or abs(area) > abs(ring_area):
+                ring = rings[0]
+                ring_area = area
+    if ring is None or len(ring) < 4 or ring_area == 0:
+        return None
+    if ring_area < 0:
+        ring = list(reversed(ring))
+
+    # resampling by arc length
+    lengths = [math.hypot(ring[i + 1].x() - ring[i].x(), ring[i + 1].y() - ring[i].y()) for i in range(len(ring) - 1)]
+    perimeter = sum(lengths)
+    step = perimeter / samples
+
+    xs = []
+    ys = []
+    segment = 0
+    start = 0.0
+    for j in range(samples):
+        target = j * step
+        while segment < len(lengths) - 1 and start + lengths[segment] < target:
+            start += lengths[segment]
+            segment += 1
+        t = (target - start) / lengths[segment] if lengths[segment] > 0 else 0.0
+        t = min(max(t, 0.0), 1.0)
+        p0 = ring[segment]
+        p1 = ring[segment + 1]
+        xs.append(p0.x() + t * (p1.x() - p0.x()))
+        ys.append(p0.y() + t * (p1.y() - p0.y()))
+
+    def magnitude(frequency):
+        # c_k = sum z_j exp(-2 i PI k j / N)
+        real = 0.0
+        imaginary = 0.0
+        for j in range(samples):
+            k = (frequency * j) % samples
+            real += xs[j] * cos_table[k] + ys[j] * sin_table[k]
+            imaginary += ys[j] * cos_table[k] - xs[j] * sin_table[k]
+        return math.hypot(real, imaginary)
+
+    reference = magnitude(1)
+    if reference == 0:
+        return None
+
+    descriptors = []
+    frequency = 1
+    while len(descriptors) < coefficients:
+        if frequency > 1:
+            descriptors.append(magnitude(frequency) / reference)
+        if len(descriptors) < coefficients:
+            descriptors.append(magnitude(-frequency) / reference)
+        frequency += 1
+
+    return descriptors
+
+
+def polygon_orientation(polygon: QgsGeometry):
+    """
+    Compute the orientation of a polygon (in degrees) comparatively to the
+    cartographic East (axis X).
     The orientation is based on the orientation of the associated minimum
     bounding rectangle. Its value is between 0 and 180 degrees, except if
     the MBR can not be defined. In that last case, the value -2.0 is returned.
     """
     # orientedMinimumBoundingBox(self) → Tuple[QgsGeometry, float, float, float, float]
-    # angle (clockwise in degrees from North)
     (mbr, area, angle, width, height) = polygon.orientedMinimumBoundingBox()
     if mbr.isNull() or mbr.isEmpty():
         return -2.0
 
-    # geom = mbr.geometry()
-    v0 = QgsPoint(mbr[0])
-    v1 = QgsPoint(mbr[1])
-    v2 = QgsPoint(mbr[2])
+    return _mbr_orientation(mbr)
 
-    length = v0.distanceSquared(v1.x(), v1.y())
-    length2 = v1.distanceSquared(v2.x(), v2.y())
 
-    if length > length2:
-        angle = math.atan2(v0.y() - v1.y(), v0.x() - v1.x())
-    else:
-        angle = math.atan2(v1.y() - v2.y(), v1.x() - v2.x())
+def second_moments(geometry: QgsGeometry):
+    """
+    Compute the centroid and the principal axes of a polygon or a line,
+    based on its second moments, in a single pass over its coordinates.
+    Moments of polygons are area moments (shoelace sums, holes being
+    subtracted whatever the orientation of the rings), moments of lines are
+    length moments. Coordinates are translated to the first vertex for
+    numerical stability.
+
+    :param QgsGeometry geometry: polygon or line geometry to process
+    :return: None for null, empty or degenerated geometries, otherwise a tuple
+      (centroid x, centroid y, orientation of the major axis in radians in
+      [ 0 ; PI [ comparatively to the X axis, variance along the major axis,
+      variance along the minor axis)
+    """
+
+    if geometry.isNull() or geometry.isEmpty():
+        return None
 
-    if angle < 0:
-        angle += math.pi
+    polygon = geometry.type() == QgsWkbTypes.PolygonGeometry
+
+    origin = None
+    m = s_x = s_y = s_xx = s_yy = s_xy = 0.0
+
+    for rings in geometry_rings(geometry):
+        for ring_index, ring in enumerate(rings):
+            if len(ring) < 2:
+                continue
+            if origin is None:
+                origin = ring[0]
+            ox = origin.x()
+            oy = origin.y()
+
+            r_m = r_x = r_y = r_xx = r_yy = r_xy = 0.0
+            for i in range(len(ring) - 1):
+                x0 = ring[i].x() - ox
+                y0 = ring[i].y() - oy
+                x1 = ring[i + 1].x() - ox
+                y1 = ring[i + 1].y() - oy
+
+                if polygon:
+                    w = x0 * y1 - x1 * y0
+                    r_m += w / 2.0
+                    r_x += (x0 + x1) * w / 6.0
+                    r_y += (y0 + y1) * w / 6.0
+                    r_xx += (x0 * x0 + x0 * x1 + x1 * x1) * w / 12.0
+                    r_yy += (y0 * y0 + y0 * y1 + y1 * y1) * w / 12.0
+                    r_xy += (2 * x0 * y0 + x0 * y1 + x1 * y0 + 2 * x1 * y1) * w / 24.0
+                else:
+                    w = math.hypot(x1 - x0, y1 - y0)
+                    r_m += w
+                    r_x += (x0 + x1) * w / 2.0
+                    r_y += (y0 + y1) * w / 2.0
+                    r_xx += (x0 * x0 + x0 * x1 + x1 * x1) * w / 3.0
+                    r_yy += (y0 * y0 + y0 * y1 + y1 * y1) * w / 3.0
+                    r_xy += (2 * x0 * y0 + x0 * y1 + x1 * y0 + 2 * x1 * y1) * w / 6.0
+
+            # exterior rings are added, holes are subtracted
+            sign = 1.0
+            if polygon:
+                sign = 1.0 if r_m >= 0 else -1.0
+                if ring_index > 0:
+                    sign = -sign
+
+            m += sign * r_m
+            s_x += sign * r_x
+            s_y += sign * r_y
+            s_xx += sign * r_xx
+            s_yy += sign * r_yy
+            s_xy += sign * r_xy
+
+    if origin is None or m <= 0:
+        return None
+
+    c_x = s_x / m
+    c_y = s_y / m
+    c_xx = max(0.0, s_xx / m - c_x * c_x)
+    c_yy = max(0.0, s_yy / m - c_y * c_y)
+    c_xy = s_xy / m - c_x * c_y
+
+    angle_x = 0.5 * math.atan2(2 * c_xy, c_xx - c_yy)
+    if angle_x < 0:
+        angle_x += math.pi
+    if angle_x >= math.pi:
+        angle_x = 0.0
 
-    return angle * 180.0 / math.pi
+    half_trace = (c_xx + c_yy) / 2.0
+    delta = math.hypot((c_xx - c_yy) / 2.0, c_xy)
 
-    # for v in mbr.vertices():
-    #     print(v.x(), v.y())
-    # line = mbr.asPolyline()
+    return c_x + origin.x(), c_y + origin.y(), angle_x, half_trace + delta, max(0.0, half_trace - delta)
 
-    # for i in range(len(line) - 1):
-    #     p1 = QgsPoint(line[i])
-    #     p2 = QgsPoint(line[i + 1])
 
-    #
-    # # QgsGeometry = polygon.convexHull()
-    # convex_hull = polygon.convexHull()
-    # if convex_hull is null:
-    #     return -2.0
+def moments_elongation(major_variance: float, minor_variance: float):
+    """
+    Compute the elongation of a geometry from the variances along its
+    principal axes: the ratio length / width of the rectangle having the
+    same second moments, -1.0 if the minor variance is null.
+    """
+
+    if minor_variance <= 0:
+        return -1.0
+    return math.sqrt(major_variance / minor_variance)
+
+
+def orientation_difference(orientation_1: float, orientation_2: float, period: float = 180.0):
+    """
+    Compute the difference between two axial orientations of a given period,
+    in [ 0 ; period / 2 ].
+    """
+
+    difference = abs(orientation_1 - orientation_2) % period
+    return min(difference, period - difference)
 
 
 def _mbr_orientation(mbr: QgsPolygon):
@@ -181,6 +619,106 @@ def rectangle_elongation(polygon: QgsPolygon):
     return length2 / length
 
 
+def convex_hull_points(points):
+    """
+    Compute the convex hull of a set of points (monotone chain algorithm).
+
+    :param points: list of tuples (x, y)
+    :return: the list of the hull vertices (tuples (x, y)), counterclockwise,
+      without repetition of the first vertex
+    """
+
+    points = sorted(set(points))
+    if len(points) <= 2:
+        return points
+
+    def cross(o, a, b):
+        return (a[0] - o[0]) * (b[1] - o[1]) - (a[1] - o[1]) * (b[0] - o[0])
+
+    lower = []
+    for point in points:
+        while len(lower) >= 2 and cross(lower[-2], lower[-1], point) <= 0:
+            lower.pop()
+        lower.append(point)
+
+    upper = []
+    for point in reversed(points):
+        while len(upper) >= 2 and cross(upper[-2], upper[-1], point) <= 0:
+            upper.pop()
+        upper.append(point)
+
+    return lower[:-1] + upper[:-1]
+
+
+def minimum_enclosing_circle(points, rng=None):
+    """
+    Compute the minimum enclosing circle of a set of points with Welzl's
+    algorithm (iterative version), in expected linear time once the points
+    are shuffled. Only the vertices of the convex hull are used.
+
+    :param points: list of tuples (x, y)
+    :param random.Random rng: random generator used to shuffle the points
+      (seeded by the caller for reproducible results)
+    :return: a tuple (centre x, centre y, radius), or None if there is no point
+    """
+
+    hull = convex_hull_points(points)
+    if not hull:
+        return None
+
+    if rng is not None:
+        rng.shuffle(hull)
+
+    circle = (hull[0][0], hull[0][1], 0.0)
+    for i, p in enumerate(hull):
+        if _in_circle(circle, p):
+            continue
+
+        circle = (p[0], p[1], 0.0)
+        for j in range(i):
+            q = hull[j]
+            if _in_circle(circle, q):
+                continue
+
+            circle = _circle_from_2_points(p, q)
+            for k in range(j):
+                r = hull[k]
+                if not _in_circle(circle, r):
+                    circle = _circle_from_3_points(p, q, r)
+
+    return circle
+
+
+def _in_circle(circle, point):
+    c_x, c_y, radius = circle
+    return math.hypot(point[0] - c_x, point[1] - c_y) <= radius * (1 + 1e-12) + 1e-12
+
+
+def _circle_from_2_points(p, q):
+    c_x = (p[0] + q[0]) / 2.0
+    c_y = (p[1] + q[1]) / 2.0
+    return c_x, c_y, math.hypot(p[0] - c_x, p[1] - c_y)
+
+
+def _circle_from_3_points(p, q, r):
+    # circumscribed circle, relative to p for numerical stability
+    b_x = q[0] - p[0]
+    b_y = q[1] - p[1]
+    c_x = r[0] - p[0]
+    c_y = r[1] - p[1]
+    d = 2.0 * (b_x * c_y - b_y * c_x)
+    if d == 0:
+        # collinear points: circle on the two farthest points
+        circles = [_circle_from_2_points(p, q), _circle_from_2_points(p, r), _circle_from_2_points(q, r)]
+        return max(circles, key=lambda circle: circle[2])
+
+    b = b_x * b_x + b_y * b_y
+    c = c_x * c_x + c_y * c_y
+    u_x = (c_y * b - b_y * c) / d
+    u_y = (b_x * c - c_x * b) / d
+    return p[0] + u_x, p[1] + u_y, math.hypot(u_x, u_y)
+
+
 def is_circle(
     polygon: QgsPolygon,
     miller_index_threshold: float,
@@ -413,6 +951,15 @@ def angle(
     :return: the computed angle or None otherwise
     """
 
+    angle_x = _segment_angle(geometry)
+    if angle_x is None:
+        return None
+
+    return convert_angle(angle_x, unit, interval, accuracy)
+
+
+def _segment_angle(geometry: QgsGeometry):
+    # angle in radians of a 2 vertices geometry, in [ -PI ; PI ]
     num_vertices = _geometry_num_vertices(geometry)
     if num_vertices != 2:  # includes null or empty geometries
         return None
@@ -423,7 +970,91 @@ def angle(
 
     x = v1.x() - v0.x()
     y = v1.y() - v0.y()
-    angle_x = math.atan2(y, x)
+
+    return math.atan2(y, x)
+
+
+def line_orientations(geometry: QgsGeometry):
+    """
+    Compute the orientations of a (multi)line with any number of vertices,
+    in a single pass over its vertices.
+
+    The mean orientation is the length-weighted axial mean of the orientations
+    of its segments (doubled angles are averaged, so that opposite directions
+    are considered identical). The dispersion is 1 - R / L, with R the length
+    of the resultant of the doubled-angle vectors and L the total length:
+    0 for a straight line, 1 for isotropic segments.
+
+    :param QgsGeometry geometry: line geometry to process
+    :return: None for null, empty or zero-length geometries, otherwise a tuple
+      (mean orientation, endpoint-to-endpoint orientation, dispersion), the
+      orientations being in radians in [ -PI ; PI ], comparatively to the
+      X axis (the endpoint orientation being None for closed lines)
+    """
+
+    if geometry.isNull() or geometry.isEmpty():
+        return None
+
+    sum_cos = 0.0
+    sum_sin = 0.0
+    total_length = 0.0
+    first = None
+    last = None
+
+    for rings in geometry_rings(geometry):
+        for line in rings:
+            if not line:
+                continue
+            if first is None:
+                first = line[0]
+            last = line[-1]
+
+            for i in range(len(line) - 1):
+                dx = line[i + 1].x() - line[i].x()
+                dy = line[i + 1].y() - line[i].y()
+                length = math.hypot(dx, dy)
+                if length == 0:
+                    continue
+
+                # cos(2a) and sin(2a) from the direction cosines
+                cos_a = dx / length
+                sin_a = dy / length
+                sum_cos += length * (cos_a * cos_a - sin_a * sin_a)
+                sum_sin += length * 2 * cos_a * sin_a
+                total_length += length
+
+    if total_length == 0:
+        return None
+
+    mean_angle = math.atan2(sum_sin, sum_cos) / 2.0
+    dispersion = max(0.0, 1 - math.hypot(sum_cos, sum_sin) / total_length)
+
+    end_angle = None
+    if first.x() != last.x() or first.y() != last.y():
+        end_angle = math.atan2(last.y() - first.y(), last.x() - first.x())
+
+    return mean_angle, end_angle, dispersion
+
+
+def convert_angle(
+        angle_x: float,
+        unit: int,
+        interval: int,
+        accuracy: bool,
+        from_north: bool = False
+):
+    """
+    Convert an angle in radians, comparatively to the X axis, to an
+    orientation in a given interval, unit and origin.
+
+    :param float angle_x: angle to convert, in radians, in [ -PI ; PI ]
+    :param int unit: unit in degree if 0, grade if 2 (radian if something else)
+    :param float interval: interval [ 0 ; PI [ if 0, [ 0 ; PI/2 [ if 1,
+                    otherwise the interval [ 0 ; PI/2 [ is the default choice
+    :param bool accuracy: true to keep two numbers after the dot, false to keep all numbers
+    :param bool from_north: true to compute an orientation from the North
+    :return: the converted angle
+    """
 
     #  [O ; Pi[
     if interval == 0:
@@ -444,6 +1075,20 @@ def angle(
     elif unit == 2:  # grade
         angle_x = angle_x * 200.0 / math.pi
 
+    if from_north:
+        if unit == 0:  # degree
+            angle_x = 90 - angle_x
+            if angle_x == 90.0:
+                angle_x = 0.0
+        elif unit == 1:  # radian
+            angle_x = math.pi / 2.0 - angle_x
+            if angle_x == (math.pi / 2.0):
+                angle_x = 0.0
+        elif unit == 2:  # grade
+            angle_x = 100 - angle_x
+            if angle_x == 100.0:
+                angle_x = 0.0
+
     # accuracy
     if accuracy:
         angle_x = round_float_to_3_decimals(angle_x)
@@ -474,32 +1119,29 @@ def angle_north_east(
     :return: the computed angle or None otherwise
     """
 
-    angle_output = angle(
-            geometry,
-            unit,
-            interval,
-            False
-    )
+    angle_x = _segment_angle(geometry)
+    if angle_x is None:
+        return None
 
-    if from_north:
-        if unit == 0:  # degree
-            angle_output = 90 - angle_output
-            if angle_output == 90.0:
-                angle_output = 0.0
-        elif unit == 1:  # radian
-            angle_output = math.pi / 2.0 - angle_output
-            if angle_output == (math.pi / 2.0):
-                angle_output = 0.0
-        elif unit == 2:  # grade
-            angle_output = 100 - angle_output
-            if angle_output == 100.0:
-                angle_output = 0.0
+    return convert_angle(angle_x, unit, interval, accuracy, from_north)
 
-    # accuracy
-    if accuracy:
-        angle_output = round_float_to_3_decimals(angle_output)
 
-    return angle_output
+def orientation_class(
+        orientation: float,
+        step: float
+):
+    """
+    Compute the class of an orientation in a classification of given step.
+
+    :param float orientation: orientation to classify
+    :param float step: step of the classification
+    :return: the class (integer) of the orientation
+    """
+
+    class_int = int(orientation / step)
+    if orientation < 0:
+        class_int = class_int - 1
+    return class_int
 
 
 def median_segment(
@@ -599,3 +1241,43 @@ def median_segment(
     median_length = distance_area.measureLength(median_geom)
 
     return median_geom, median_orientation, median_length, median_elongation
+
+
+def moments_median_segment(
+        geom: QgsGeometry,
+        from_north: bool,
+        distance_area: QgsDistanceArea
+):
+    """
+    Compute the median segment of a geometry based on its second moments,
+    as a cheap alternative to the median of the minimum bounding rectangle:
+    the median is the major axis of the rectangle having the same second
+    moments (same centroid, orientation and variances), which is the median
+    of the geometry itself for a rectangle.
+
+    :param QgsGeometry geom: polygon or line geometry to process
+    :param bool from_north: true to compute an orientation from the North
+    :param QgsDistanceArea distance_area: distance area
+    :return: the same tuple as median_segment(): median geometry (None if
+      the moments can not be computed), median orientation, median length
+      and elongation (-1.0 if not defined)
+    """
+
+    moments = second_moments(geom)
+    if moments is None:
+        return None, -1.0, -1.0, -1.0
+
+    c_x, c_y, angle_x, major_variance, minor_variance = moments
+
+    half_length = math.sqrt(3.0 * major_variance)
+    d_x = half_length * math.cos(angle_x)
+    d_y = half_length * math.sin(angle_x)
+
+    median_geom = create_normalized_segment(
+        QgsPoint(c_x - d_x, c_y - d_y),
+        QgsPoint(c_x + d_x, c_y + d_y)
+    )
+    median_orientation = convert_angle(angle_x, 0, 0, True, from_north)
+    median_length = distance_area.measureLength(median_geom)
+
+    return median_geom, median_orientation, median_length, moments_elongation(major_variance, minor_variance)
@@ -0,0 +1,279 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+    MorphAL: PTM plugin for QGIS
+    --------------
+    Start date           : January 2021
+    Copyright            : (C) 2021, Eric Grosso, PTM
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+from qgis.core import (
+    NULL,
+    QgsFeatureRequest,
+    QgsFeatureSink,
+    QgsField,
+    QgsFields,
+    QgsProcessing,
+    QgsProcessingException,
+    QgsProcessingParameterFeatureSink,
+    QgsProcessingParameterFeatureSource,
+    QgsProcessingParameterField,
+    QgsProcessingParameterNumber,
+    QgsProcessingUtils,
+)
+from qgis.PyQt.QtCore import QVariant
+
+from morphal.ptm4qgis_algorithm import PTM4QgisAlgorithm
+
+from .morphal_clustering import MiniBatchKMeans, RunningStatistics
+from .morphal_feature_io import BufferedFeatureSink, numeric_attributes, prefetch_features
+from .utils import LayerRenamer, round_float_to_3_decimals
+
+
+class MorphALIndicatorClustering(PTM4QgisAlgorithm):
+    INPUT_LAYER = "INPUT_LAYER"
+    INDICATOR_FIELDS = "INDICATOR_FIELDS"
+    CLUSTERS = "CLUSTERS"
+    BATCH_SIZE = "BATCH_SIZE"
+    PASSES = "PASSES"
+    SEED = "SEED"
+    OUTPUT_LAYER = "OUTPUT_LAYER"
+
+    def help(self):
+        return self.tr("\
+            This algorithm assigns morphological typology classes to the features of a layer,\
+            based on numeric indicator fields (e.g. the outputs of the polygon indicators algorithm),\
+            with a mini-batch k-means clustering.\
+            \nIndicators are standardised (z-score), then the layer is read in batches of a fixed\
+            size, each batch moving the centres of the clusters towards its features, so that the\
+            memory used stays bounded whatever the number of features. The centres are initialised\
+            with k-means++ on the first batch, and results are reproducible for a given seed.\
+            \nThe output layer holds the content of the input layer, and the id of the cluster of\
+            each feature (CLUSTER_ID) as well as its distance to the centre of the cluster, in\
+            the standardised space (CLUSTER_DIST). Features with null indicators are not clustered.")
+
+    def __init__(self):
+        super().__init__()
+
+    def initAlgorithm(self, config):
+        self.addParameter(
+            QgsProcessingParameterFeatureSource(
+                self.INPUT_LAYER,
+                self.tr("Input layer"),
+                types=[QgsProcessing.TypeVector],
+            )
+        )
+
+        self.addParameter(
+            QgsProcessingParameterField(
+                self.INDICATOR_FIELDS,
+                self.tr("Indicator fields"),
+                parentLayerParameterName=self.INPUT_LAYER,
+                type=QgsProcessingParameterField.Numeric,
+                allowMultiple=True,
+            )
+        )
+
+        self.addParameter(
+            QgsProcessingParameterNumber(
+                self.CLUSTERS,
+                self.tr("Number of clusters"),
+                type=QgsProcessingParameterNumber.Integer,
+                minValue=2,
+                defaultValue=5,
+            )
+        )
+
+        self.addParameter(
+            QgsProcessingParameterNumber(
+                self.BATCH_SIZE,
+                self.tr("Number of features per batch"),
+                type=QgsProcessingParameterNumber.Integer,
+                minValue=10,
+                defaultValue=1000,
+            )
+        )
+
+        self.addParameter(
+            QgsProcessingParameterNumber(
+                self.PASSES,
+                self.tr("Number of training passes over the layer"),
+                type=QgsProcessingParameterNumber.Integer,
+                minValue=1,
+                maxValue=100,
+                defaultValue=3,
+            )
+        )
+
+        self.addParameter(
+            QgsProcessingParameterNumber(
+                self.SEED,
+                self.tr("Random seed"),
+                type=QgsProcessingParameterNumber.Integer,
+                minValue=0,
+                defaultValue=0,
+            )
+        )
+
+        self.addSlimOutputParameters(self.INPUT_LAYER)
+
+        self.addParameter(
+            QgsProcessingParameterFeatureSink(
+                self.OUTPUT_LAYER,
+                self.tr("Clusters"),
+                type=QgsProcessing.TypeVector
+            )
+        )
+
+    def name(self):
+        return "indicator_clustering"
+
+    def displayName(self):
+        return self.tr("Morphological typology clustering (mini-batch k-means)")
+
+    def processAlgorithm(self, parameters, context, feedback):
+        # input / source
+        source = self.parameterAsSource(parameters, self.INPUT_LAYER, context)
+        if source is None:
+            raise QgsProcessingException(
+                self.invalidSourceError(parameters, self.INPUT_LAYER)
+            )
+
+        if source.featureCount() == 0:
+            feedback.reportError(
+                self.tr("The layer doesn't contain any feature: no output provided")
+            )
+            return {}
+
+        # other parameters
+        indicator_fields = self.parameterAsFields(parameters, self.INDICATOR_FIELDS, context)
+        if not indicator_fields:
+            feedback.reportError(self.tr("At least one indicator field is required"))
+            return {}
+        indices = [source.fields().lookupField(name) for name in indicator_fields]
+
+        cluster_count = self.parameterAsInt(parameters, self.CLUSTERS, context)
+        batch_size = self.parameterAsInt(parameters, self.BATCH_SIZE, context)
+        passes = self.parameterAsInt(parameters, self.PASSES, context)
+        seed = self.parameterAsInt(parameters, self.SEED, context)
+
+        source_attributes = self.parameterAsSourceAttributes(parameters, source, context)
+
+        # output
+        fields = source_attributes.fields()
+
+        new_fields = QgsFields()
+        new_fields.append(QgsField("CLUSTER_ID", QVariant.Int))
+        new_fields.append(QgsField("CLUSTER_DIST", QVariant.Double))
+
+        fields = QgsProcessingUtils.combineFields(fields, new_fields)
+
+        (sink, dest_id) = self.parameterAsSink(
+            parameters,
+            self.OUTPUT_LAYER,
+            context,
+            fields,
+            source.wkbType(),
+            source.sourceCrs(),
+        )
+        if sink is None:
+            raise QgsProcessingException(
+                self.invalidSinkError(parameters, self.OUTPUT_LAYER))
+
+        # process: one pass for the standardisation, training passes by batches,
+        # and a last pass for the assignment of the features
+        pass_progress = 100.0 / (passes + 2)
+        total = pass_progress / source.featureCount() if source.featureCount() else 0
+
+        request = QgsFeatureRequest()
+        request.setFlags(QgsFeatureRequest.NoGeometry)
+        request.setSubsetOfAttributes(indices)
+
+        statistics = RunningStatistics(len(indices))
+        for current, f in enumerate(prefetch_features(source.getFeatures(request), feedback)):
+            if feedback.isCanceled():
+                return {}
+
+            vector = numeric_attributes(f, indices)
+            if vector is not None:
+                statistics.add(vector)
+
+            feedback.setProgress(int(current * total))
+
+        if statistics.count == 0:
+            feedback.reportError(
+                self.tr("No feature with non null indicators: no output provided")
+            )
+            return {}
+
+        std = statistics.std()
+
+        kmeans = MiniBatchKMeans(cluster_count, seed)
+        for training_pass in range(passes):
+            batch = []
+            for current, f in enumerate(prefetch_features(source.getFeatures(request), feedback)):
+                if feedback.isCanceled():
+                    return {}
+
+                vector = numeric_attributes(f, indices)
+                if vector is not None:
+                    batch.append(statistics.standardize(vector, std))
+                    if len(batch) >= batch_size:
+                        kmeans.partial_fit(batch)
+                        batch = []
+
+                feedback.setProgress(int((training_pass + 1) * pass_progress + current * total))
+
+            if batch:
+                kmeans.partial_fit(batch)
+
+        if len(kmeans.centres) < cluster_count:
+            feedback.pushInfo(
+                self.tr("Only {} distinct clusters could be initialised").format(len(kmeans.centres))
+            )
+
+        # assignment
+        request = source_attributes.request(indices)
+        features = prefetch_features(source.getFeatures(request), feedback)
+        with BufferedFeatureSink(sink, background=True) as writer:
+            for current, f in enumerate(features):
+                if feedback.isCanceled():
+                    return {}
+
+                out_feature = f
+                attrs = source_attributes.attributes(f)
+
+                vector = numeric_attributes(f, indices)
+                if vector is not None:
+                    cluster_id, distance = kmeans.predict(statistics.standardize(vector, std))
+                    attrs.extend([cluster_id, round_float_to_3_decimals(distance)])
+
+                # ensure consistent count of attributes - otherwise null
+                # geometry features will have incorrect attribute length
+                # and provider may reject them
+                if len(attrs) < len(fields):
+                    attrs += [NULL] * (len(fields) - len(attrs))
+
+                out_feature.setAttributes(attrs)
+                writer.addFeature(out_feature, QgsFeatureSink.FastInsert)
+
+                feedback.setProgress(int((passes + 1) * pass_progress + current * total))
+
+        # rename output layer
+        global clusters_renamer
+
+        clusters_renamer = LayerRenamer(f'{source.sourceName()}-{self.tr("Clusters")}-{cluster_count}')
+        context.layerToLoadOnCompletionDetails(
+            dest_id).setPostProcessor(clusters_renamer)
+
+        return {self.OUTPUT_LAYER: dest_id}
@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+    MorphAL: PTM plugin for QGIS
+    --------------
+    Start date           : January 2021
+    Copyright            : (C) 2021, Eric Grosso, PTM
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+import heapq
+import math
+from array import array
+
+SQRT_2 = math.sqrt(2.0)
+
+
+class RingSegmentIndex:
+    """
+    Grid index of the segments of a set of rings (coordinates as tuples),
+    answering the distance queries and the point in polygon tests needed by
+    the search of the largest inscribed circle.
+
+    Segments are bucketed into the cells of a uniform grid (by bounding box).
+    The distance to the nearest segment is found by visiting the cells ring
+    by ring around the query point, and the point in polygon test (even-odd
+    rule) only checks the segments of the row of cells of the point.
+    """
+
+    def __init__(self, rings, cell_count: int = 0):
+        self.segments = array("d")
+        for ring in rings:
+            for i in range(len(ring) - 1):
+                self.segments.extend((ring[i][0], ring[i][1], ring[i + 1][0], ring[i + 1][1]))
+
+        self.count = len(self.segments) // 4
+        self.cells = {}
+        self.rows = {}
+        if self.count == 0:
+            return
+
+        xs = self.segments[0::2]
+        ys = self.segments[1::2]
+        self.min_x = min(xs)
+        self.min_y = min(ys)
+        width = max(xs) - self.min_x
+        height = max(ys) - self.min_y
+
+        # about one segment per cell by default
+        if cell_count <= 0:
+            cell_count = self.count
+        self.cell_size = max(width, height) / max(1, math.ceil(math.sqrt(cell_count)))
+        if self.cell_size <= 0:
+            self.cell_size = 1.0
+        self.max_cell_x = int(width / self.cell_size)
+        self.max_cell_y = int(height / self.cell_size)
+
+        for i in range(self.count):
+            x0, y0, x1, y1 = self.segments[4 * i:4 * i + 4]
+            min_cx, min_cy = self._cell(min(x0, x1), min(y0, y1))
+            max_cx, max_cy = self._cell(max(x0, x1), max(y0, y1))
+            for cy in range(min_cy, max_cy + 1):
+                self.rows.setdefault(cy, []).append(i)
+                for cx in range(min_cx, max_cx + 1):
+                    self.cells.setdefault((cx, cy), []).append(i)
+
+    def _cell(self, x: float, y: float):
+        return (
+            min(max(int((x - self.min_x) / self.cell_size), 0), self.max_cell_x),
+            min(max(int((y - self.min_y) / self.cell_size), 0), self.max_cell_y),
+        )
+
+    def contains(self, x: float, y: float):
+        """
+        Return true if the point is inside the rings (even-odd rule).
+        """
+        if self.count == 0:
+            return False
+
+        inside = False
+        row = int((y - self.min_y) / self.cell_size)
+        for i in self.rows.get(row, ()):
+            x0, y0, x1, y1 = self.segments[4 * i:4 * i + 4]
+            if (y0 > y) != (y1 > y) and x < (x1 - x0) * (y - y0) / (y1 - y0) + x0:
+                inside = not inside
+        return inside
+
+    def distance(self, x: float, y: float):
+        """
+        Return the distance from the point to the nearest segment.
+        """
+        if self.count == 0:
+            return math.inf
+
+        cx, cy = self._cell(x, y)
+
+        best = math.inf
+        visited = set()
+        max_radius = max(cx, self.max_cell_x - cx, cy, self.max_cell_y - cy)
+        for radius in range(max_radius + 1):
+            for i in self._ring_segments(cx, cy, radius):
+                if i in visited:
+                    continue
+                visited.add(i)
+                best = min(best, segment_distance(x, y, *self.segments[4 * i:4 * i + 4]))
+
+            # the cells of the next rings are at least at this distance
+            if best <= radius * self.cell_size:
+                break
+
+        return best
+
+    def _ring_segments(self, cx: int, cy: int, radius: int):
+        if radius == 0:
+            yield from self.cells.get((cx, cy), ())
+            return
+
+        for i in range(cx - radius, cx + radius + 1):
+            yield from self.cells.get((i, cy - radius), ())
+            yield from self.cells.get((i, cy + radius), ())
+        for j in range(cy - radius + 1, cy + radius):
+            yield from self.cells.get((cx - radius, j), ())
+            yield from self.cells.get((cx + radius, j), ())
+
+    def signed_distance(self, x: float, y: float):
+        """
+        Return the distance from the point to the boundary, positive inside,
+        negative outside.
+        """
+        distance = self.distance(x, y)
+        return distance if self.contains(x, y) else -distance
+
+
+def largest_inscribed_circle(rings, precision: float, start=None):
+    """
+    Find the largest inscribed circle of a polygon (pole of inaccessibility)
+    with a quadtree search: square cells covering the polygon are refined
+    best-first (priority queue on the maximum distance a point of the cell
+    may reach), cells which can not improve the best circle by more than
+    the precision being discarded.
+
+    :param rings: all the rings of the polygon (of all its parts), as lists
+      of tuples (x, y)
+    :param float precision: precision of the result, in the units of the
+      coordinates (at least a ten-thousandth of the size of the polygon)
+    :param start: optional tuple (x, y) of a first candidate, e.g. the centroid
+    :return: a tuple (centre x, centre y, radius), or None for degenerated
+      polygons
+    """
+
+    index = RingSegmentIndex(rings)
+    if index.count == 0:
+        return None
+
+    xs = index.segments[0::2]
+    ys = index.segments[1::2]
+    min_x = min(xs)
+    min_y = min(ys)
+    width = max(xs) - min_x
+    height = max(ys) - min_y
+    cell_size = min(width, height)
+    if cell_size <= 0:
+        return None
+
+    # bounded refinement whatever the requested precision: along a ridge of
+    # equally good centres (e.g. the medial axis of a rectangle), the number
+    # of refined cells grows as the length of the ridge divided by the precision
+    precision = max(precision, cell_size * 1e-4)
+
+    queue = []
+
+    def push(x, y, half):
+        distance = index.signed_distance(x, y)
+        heapq.heappush(queue, (-(distance + half * SQRT_2), distance, x, y, half))
+
+    half = cell_size / 2.0
+    x = min_x
+    while x < min_x + width:
+        y = min_y
+        while y < min_y + height:
+            push(x + half, y + half, half)
+            y += cell_size
+        x += cell_size
+
+    best_x = min_x + width / 2.0
+    best_y = min_y + height / 2.0
+    best_distance = index.signed_distance(best_x, best_y)
+
+    if start is not None:
+        distance = index.signed_distance(start[0], start[1])
+        if distance > best_distance:
+            best_x, best_y, best_distance = start[0], start[1], distance
+
+    while queue:
+        potential, distance, x, y, half = heapq.heappop(queue)
+
+        if distance > best_distance:
+            best_x, best_y, best_distance = x, y, distance
+
+        # the best cells come first: no remaining cell can improve the result
+        if -potential - best_distance <= precision:
+            break
+
+        half /= 2.0
+        push(x - half, y - half, half)
+        push(x + half, y - half, half)
+        push(x - half, y + half, half)
+        push(x + half, y + half, half)
+
+    return best_x, best_y, max(0.0, best_distance)
+
+
+def segment_distance(x, y, x0, y0, x1, y1):
+    """
+    Return the distance from the point (x, y) to the segment (x0, y0, x1, y1).
+    """
+    dx = x1 - x0
+    dy = y1 - y0
+    length2 = dx * dx + dy * dy
+    if length2 > 0:
+        t = ((x - x0) * dx + (y - y0) * dy) / length2
+        if t > 1:
+            x0 = x1
+            y0 = y1
+        elif t > 0:
+            x0 += dx * t
+            y0 += dy * t
+    return math.hypot(x - x0, y - y0)
@@ -0,0 +1,310 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+    MorphAL: PTM plugin for QGIS
+    --------------
+    Start date           : January 2021
+    Copyright            : (C) 2021, Eric Grosso, PTM
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+import heapq
+import json
+import math
+import os
+import struct
+import sys
+from array import array
+
+KDTREE_MAGIC = b"MORPHAL-KDTREE\n"
+KDTREE_FORMAT_VERSION = 2
+
+# arrays of a tree, saved in this order
+KDTREE_ARRAYS = (
+    ("coordinates", "d"),
+    ("ids", "q"),
+    ("node_start", "i"),
+    ("node_end", "i"),
+    ("node_dimension", "i"),
+    ("node_value", "d"),
+    ("node_left", "i"),
+    ("node_right", "i"),
+)
+
+
+class KDTree:
+    """
+    K-d tree over points of any dimension, each point holding an integer id
+    (typically a feature id), answering k nearest neighbours queries
+    (euclidean distance).
+
+    The tree is stored in flat arrays (coordinates, ids and nodes), so that
+    it stays compact and can be saved to disk and loaded back quickly. Nodes
+    are split at the median of the dimension of largest spread, until they
+    contain at most leaf_size points.
+
+    Metadata (e.g. the names of the indexed fields and the standardisation
+    parameters) can be attached to the tree and are saved with it, as JSON.
+    """
+
+    def __init__(self, points, ids, leaf_size: int = 16, metadata=None):
+        """
+        :param points: sequence of points, each point being a sequence of
+          coordinates (all points having the same dimension)
+        :param ids: sequence of the ids of the points
+        :param int leaf_size: maximum number of points of a leaf
+        :param metadata: metadata saved with the tree
+        """
+        self.metadata = metadata if metadata is not None else {}
+        self.leaf_size = max(1, leaf_size)
+        self.dimension = len(points[0]) if len(points) else 0
+
+        self.coordinates = array("d")
+        for point in points:
+            self.coordinates.extend(point)
+        self.ids = array("q", ids)
+
+        # nodes: range of points [start ; end[, split dimension (-1 for a leaf),
+        # split value and children
+        self.node_start = array("i")
+        self.node_end = array("i")
+        self.node_dimension = array("i")
+        self.node_value = array("d")
+        self.node_left = array("i")
+        self.node_right = array("i")
+
+        if len(self.ids):
+            self._build()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _add_node(self, start, end):
+        self.node_start.append(start)
+        self.node_end.append(end)
+        self.node_dimension.append(-1)
+        self.node_value.append(0.0)
+        self.node_left.append(-1)
+        self.node_right.append(-1)
+        return len(self.node_start) - 1
+
+    def _build(self):
+        dimension = self.dimension
+        coordinates = self.coordinates
+        order = list(range(len(self.ids)))
+
+        stack = [self._add_node(0, len(order))]
+        while stack:
+            node = stack.pop()
+            start = self.node_start[node]
+            end = self.node_end[node]
+            if end - start <= self.leaf_size:
+                continue
+
+            # dimension of largest spread
+            split_dimension = 0
+            largest_spread = -1.0
+            for d in range(dimension):
+                values = [coordinates[i * dimension + d] for i in order[start:end]]
+                spread = max(values) - min(values)
+                if spread > largest_spread:
+                    largest_spread = spread
+                    split_dimension = d
+            if largest_spread <= 0:
+                # identical points
+                continue
+
+            order[start:end] = sorted(order[start:end], key=lambda i: coordinates[i * dimension + split_dimension])
+            middle = (start + end) // 2
+
+            self.node_dimension[node] = split_dimension
+            self.node_value[node] = coordinates[order[middle] * dimension + split_dimension]
+            self.node_left[node] = self._add_node(start, middle)
+            self.node_right[node] = self._add_node(middle, end)
+            stack.append(self.node_left[node])
+            stack.append(self.node_right[node])
+
+        # points stored in the order of the leaves
+        self.coordinates = array(
+            "d",
+            (coordinates[i * dimension + d] for i in order for d in range(dimension))
+        )
+        self.ids = array("q", (self.ids[i] for i in order))
+
+    def query(self, point, k: int = 1, exclude_id=None):
+        """
+        Find the k nearest neighbours of a point.
+
+        :param point: sequence of coordinates
+        :param int k: number of neighbours
+        :param exclude_id: id of a point to ignore (e.g. the query point itself)
+        :return: a list of tuples (distance, id), sorted by distance
+        """
+
+        if not len(self.ids) or k <= 0:
+            return []
+
+        dimension = self.dimension
+        coordinates = self.coordinates
+
+        # max-heap of the k best squared distances (negated)
+        best = []
+
+        def bound():
+            return -best[0][0] if len(best) == k else math.inf
+
+        # stack of (node, lower bound of the squared distance to the node)
+        stack = [(0, 0.0)]
+        while stack:
+            node, node_distance = stack.pop()
+            if node_distance >= bound():
+                continue
+
+            split_dimension = self.node_dimension[node]
+            if split_dimension < 0:
+                for i in range(self.node_start[node], self.node_end[node]):
+                    if exclude_id is not None and self.ids[i] == exclude_id:
+                        continue
+                    offset = i * dimension
+                    distance = 0.0
+                    for d in range(dimension):
+                        delta = coordinates[offset + d] - point[d]
+                        distance += delta * delta
+                    if len(best) < k:
+                        heapq.heappush(best, (-distance, -i))
+                    elif distance < -best[0][0]:
+                        heapq.heapreplace(best, (-distance, -i))
+                continue
+
+            delta = point[split_dimension] - self.node_value[node]
+            if delta < 0:
+                near, far = self.node_left[node], self.node_right[node]
+            else:
+                near, far = self.node_right[node], self.node_left[node]
+
+            # the far child is visited last (pushed first)
+            stack.append((far, max(node_distance, delta * delta)))
+            stack.append((near, node_distance))
+
+        return sorted((math.sqrt(-distance), self.ids[-i]) for distance, i in best)
+
+    def save(self, path: str):
+        """
+        Save the tree (and its metadata, which must be JSON serialisable) to
+        a file: a JSON header followed by the raw bytes of the arrays.
+        """
+        header = {
+            "version": KDTREE_FORMAT_VERSION,
+            "byteorder": sys.byteorder,
+            "metadata": self.metadata,
+            "leaf_size": self.leaf_size,
+            "dimension": self.dimension,
+            "arrays": [[name, len(getattr(self, name))] for name, _ in KDTREE_ARRAYS],
+        }
+        header = json.dumps(header).encode("utf-8")
+
+        with open(path, "wb") as index_file:
+            index_file.write(KDTREE_MAGIC)
+            index_file.write(struct.pack("<Q", len(header)))
+            index_file.write(header)
+            for name, _ in KDTREE_ARRAYS:
+                index_file.write(getattr(self, name).tobytes())
+
+    @classmethod
+    def load(cls, path: str):
+        """
+        Load a tree saved with save(). The file is checked (header and
+        consistency of the arrays) before the tree is used.
+
+        :raise ValueError: if the file is not a valid saved tree
+        """
+        invalid = ValueError(f"{path} is not a valid index file")
+
+        with open(path, "rb") as index_file:
+            # sizes read from the file are checked against its size before reading
+            file_size = os.fstat(index_file.fileno()).st_size
+
+            if index_file.read(len(KDTREE_MAGIC)) != KDTREE_MAGIC:
+                raise invalid
+            size = index_file.read(8)
+            if len(size) != 8:
+                raise invalid
+            size = struct.unpack("<Q", size)[0]
+            if size > file_size - index_file.tell():
+                raise invalid
+            header = index_file.read(size)
+            try:
+                header = json.loads(header.decode("utf-8"))
+            except (UnicodeDecodeError, ValueError, RecursionError):
+                raise invalid
+
+            if (
+                not isinstance(header, dict)
+                or header.get("version") != KDTREE_FORMAT_VERSION
+                or header.get("byteorder") not in ("little", "big")
+                or not isinstance(header.get("leaf_size"), int)
+                or not isinstance(header.get("dimension"), int)
+                or header.get("dimension") < 0
+                or "metadata" not in header
+                or not isinstance(header.get("arrays"), list)
+                or not all(isinstance(entry, list) and len(entry) == 2 for entry in header["arrays"])
+                or [entry[0] for entry in header["arrays"]] != [name for name, _ in KDTREE_ARRAYS]
+            ):
+                raise invalid
+
+            tree = cls([], [], header["leaf_size"], header["metadata"])
+            tree.dimension = header["dimension"]
+            for (name, typecode), (_, length) in zip(KDTREE_ARRAYS, header["arrays"]):
+                values = array(typecode)
+                if not isinstance(length, int) or not 0 <= length * values.itemsize <= file_size - index_file.tell():
+                    raise invalid
+                data = index_file.read(length * values.itemsize)
+                if len(data) != length * values.itemsize:
+                    raise invalid
+                values.frombytes(data)
+                if header["byteorder"] != sys.byteorder:
+                    values.byteswap()
+                setattr(tree, name, values)
+
+            if index_file.read(1):
+                raise invalid
+
+        if not tree._is_consistent():
+            raise invalid
+        return tree
+
+    def _is_consistent(self):
+        # sizes of the arrays, finite coordinates and ranges of the nodes, so that queries can not fail
+        count = len(self.ids)
+        node_count = len(self.node_start)
+        if len(self.coordinates) != count * self.dimension:
+            return False
+        if any(
+            len(values) != node_count
+            for values in (self.node_end, self.node_dimension, self.node_value, self.node_left, self.node_right)
+        ):
+            return False
+        if count and node_count == 0:
+            return False
+        if not all(math.isfinite(value) for value in self.coordinates):
+            return False
+
+        for node in range(node_count):
+            if not 0 <= self.node_start[node] <= self.node_end[node] <= count:
+                return False
+            if self.node_dimension[node] >= 0:
+                if self.node_dimension[node] >= self.dimension:
+                    return False
+                # children are created after their parent, so the tree has no cycle
+                if not node < self.node_left[node] < node_count or not node < self.node_right[node] < node_count:
+                    return False
+        return True
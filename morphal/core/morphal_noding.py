@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+    MorphAL: PTM plugin for QGIS
+    --------------
+    Start date           : January 2021
+    Copyright            : (C) 2021, Eric Grosso, PTM
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+import math
+
+EPSILON = 1e-12
+
+
+def node_segments(coords, cell_size: float = 0.0, feedback=None):
+    """
+    Compute the mutual intersections of a set of segments (planar noding).
+
+    Segments are bucketed into a uniform grid (by bounding box) and only the
+    segments sharing a cell are tested against each other. Each intersection
+    is only handled in the cell containing it, so that each pair of segments
+    is processed once whatever the number of cells they share.
+
+    The split points of an intersection are computed once, and given to both
+    segments, so that the pieces of two crossing segments share the same
+    vertex.
+
+    :param coords: flat sequence of segment coordinates (x0, y0, x1, y1, ...)
+    :param float cell_size: size of the grid cells, by default the mean
+      extent of the segments
+    :param QgsFeedback feedback: feedback used to stop on cancelation
+    :return: a dictionary segment index -> list of the points (x, y) at
+      which the segment has to be split, sorted from its first point
+    """
+
+    count = len(coords) // 4
+    if count < 2:
+        return {}
+
+    if cell_size <= 0:
+        extent = 0.0
+        for i in range(count):
+            x0, y0, x1, y1 = coords[4 * i:4 * i + 4]
+            extent += max(abs(x1 - x0), abs(y1 - y0))
+        cell_size = extent / count
+        if cell_size <= 0:
+            return {}
+
+    # bucketing
+    grid = {}
+    for i in range(count):
+        x0, y0, x1, y1 = coords[4 * i:4 * i + 4]
+        for cx in range(math.floor(min(x0, x1) / cell_size), math.floor(max(x0, x1) / cell_size) + 1):
+            for cy in range(math.floor(min(y0, y1) / cell_size), math.floor(max(y0, y1) / cell_size) + 1):
+                cell = grid.get((cx, cy))
+                if cell is None:
+                    grid[(cx, cy)] = [i]
+                else:
+                    cell.append(i)
+
+    splits = {}
+
+    for current, (cell_key, cell) in enumerate(grid.items()):
+        if feedback is not None and current % 1000 == 0 and feedback.isCanceled():
+            return {}
+
+        for a in range(len(cell) - 1):
+            i = cell[a]
+            ax0, ay0, ax1, ay1 = coords[4 * i:4 * i + 4]
+            for b in range(a + 1, len(cell)):
+                j = cell[b]
+                bx0, by0, bx1, by1 = coords[4 * j:4 * j + 4]
+
+                # bounding box overlap, which also gives the reference point clamp box
+                min_x = max(min(ax0, ax1), min(bx0, bx1))
+                max_x = min(max(ax0, ax1), max(bx0, bx1))
+                if min_x > max_x:
+                    continue
+                min_y = max(min(ay0, ay1), min(by0, by1))
+                max_y = min(max(ay0, ay1), max(by0, by1))
+                if min_y > max_y:
+                    continue
+
+                result = segment_intersection(ax0, ay0, ax1, ay1, bx0, by0, bx1, by1)
+                if result is None:
+                    continue
+
+                (px, py), splits_i, splits_j = result
+
+                # the pair is handled in the cell containing the reference point,
+                # clamped to the shared bounding box against rounding errors
+                px = min(max(px, min_x), max_x)
+                py = min(max(py, min_y), max_y)
+                if (math.floor(px / cell_size), math.floor(py / cell_size)) != cell_key:
+                    continue
+
+                if splits_i:
+                    splits.setdefault(i, []).extend(splits_i)
+                if splits_j:
+                    splits.setdefault(j, []).extend(splits_j)
+
+    for i, params in splits.items():
+        splits[i] = [(x, y) for _, x, y in sorted(set(params))]
+
+    return splits
+
+
+def segment_intersection(ax0, ay0, ax1, ay1, bx0, by0, bx1, by1):
+    """
+    Compute the intersection of two segments A and B.
+
+    :return: None if the segments do not intersect, otherwise a tuple
+      (reference point, splits of A, splits of B), the splits being tuples
+      (t, x, y) of the points at which each segment has to be split and of
+      their parameter t on the segment (between 0 and 1, excluded), and the
+      reference point being the intersection point (or the first point of
+      the overlap for collinear segments). A point shared by both segments
+      has the same coordinates in the splits of A and of B, an extremity of
+      a segment being kept as is.
+    """
+
+    rx = ax1 - ax0
+    ry = ay1 - ay0
+    sx = bx1 - bx0
+    sy = by1 - by0
+    qx = bx0 - ax0
+    qy = by0 - ay0
+
+    denom = rx * sy - ry * sx
+    r2 = rx * rx + ry * ry
+    s2 = sx * sx + sy * sy
+    if r2 == 0 or s2 == 0:
+        return None
+
+    if abs(denom) <= EPSILON * math.sqrt(r2 * s2):
+        # parallel segments: only collinear ones can overlap
+        if abs(qx * ry - qy * rx) > EPSILON * r2:
+            return None
+
+        t0 = (qx * rx + qy * ry) / r2
+        t1 = ((bx1 - ax0) * rx + (by1 - ay0) * ry) / r2
+        if max(t0, t1) < -EPSILON or min(t0, t1) > 1 + EPSILON:
+            return None
+
+        u0 = (-qx * sx - qy * sy) / s2
+        u1 = ((ax1 - bx0) * sx + (ay1 - by0) * sy) / s2
+
+        # the overlap is split at the extremities of the other segment
+        splits_a = [(t, x, y) for t, x, y in ((t0, bx0, by0), (t1, bx1, by1)) if EPSILON < t < 1 - EPSILON]
+        splits_b = [(u, x, y) for u, x, y in ((u0, ax0, ay0), (u1, ax1, ay1)) if EPSILON < u < 1 - EPSILON]
+
+        t_start = max(0.0, min(t0, t1))
+        return (ax0 + t_start * rx, ay0 + t_start * ry), splits_a, splits_b
+
+    t = (qx * sy - qy * sx) / denom
+    u = (qx * ry - qy * rx) / denom
+    if t < -EPSILON or t > 1 + EPSILON or u < -EPSILON or u > 1 + EPSILON:
+        return None
+
+    # the intersection point is computed once, an extremity being kept as is
+    if u <= EPSILON:
+        point = (bx0, by0)
+    elif u >= 1 - EPSILON:
+        point = (bx1, by1)
+    elif t <= EPSILON:
+        point = (ax0, ay0)
+    elif t >= 1 - EPSILON:
+        point = (ax1, ay1)
+    else:
+        point = (ax0 + t * rx, ay0 + t * ry)
+
+    splits_a = [(t, point[0], point[1])] if EPSILON < t < 1 - EPSILON else []
+    splits_b = [(u, point[0], point[1])] if EPSILON < u < 1 - EPSILON else []
+
+    return point, splits_a, splits_b
@@ -0,0 +1,291 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+    MorphAL: PTM plugin for QGIS
+    --------------
+    Start date           : January 2021
+    Copyright            : (C) 2021, Eric Grosso, PTM
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+import math
+from array import array
+
+from qgis.core import (
+    NULL,
+    QgsFeatureRequest,
+    QgsFeatureSink,
+    QgsField,
+    QgsFields,
+    QgsProcessing,
+    QgsProcessingException,
+    QgsProcessingParameterBoolean,
+    QgsProcessingParameterEnum,
+    QgsProcessingParameterFeatureSink,
+    QgsProcessingParameterFeatureSource,
+    QgsProcessingParameterNumber,
+    QgsProcessingUtils,
+    QgsWkbTypes,
+)
+from qgis.PyQt.QtCore import QVariant
+
+from morphal.ptm4qgis_algorithm import PTM4QgisAlgorithm
+
+from . import morphal_geometry_utils as geometry_utils
+from .morphal_feature_io import BufferedFeatureSink, prefetch_features
+from .morphal_kdtree import KDTree
+from .utils import LayerRenamer, round_float_to_5_decimals
+
+
+class MorphALOrientationAlignment(PTM4QgisAlgorithm):
+    INPUT_LAYER = "INPUT_LAYER"
+    ORIENTATION_METHOD = "ORIENTATION_METHOD"
+    NEIGHBORS = "NEIGHBORS"
+    ORTHOGONAL = "ORTHOGONAL"
+    OUTPUT_LAYER = "OUTPUT_LAYER"
+
+    def help(self):
+        return self.tr("\
+            This algorithm measures the regularity of an urban fabric: for each polygon of a layer\
+            (e.g. buildings), it computes the mean angular deviation (ALIGN_DEV, in degrees) between\
+            its orientation (ORIENTATION, in degrees comparatively to the cartographic East) and the\
+            orientations of its K nearest neighbours.\
+            \nOrientations are based on the minimum bounding rectangle of the polygons (as in the\
+            rectangular characterisation algorithm), or on their second moments. Neighbours are the\
+            polygons with the nearest centroids, found with a k-d tree built once for the whole layer.\
+            \nOptionally, perpendicular orientations can be considered as aligned (deviations\
+            computed modulo 90 degrees instead of 180 degrees), e.g. for buildings of a grid plan.\
+            \nPolygons whose orientation can not be defined are ignored.")
+
+    def __init__(self):
+        super().__init__()
+        self.orientation_methods = [
+            self.tr("Minimum bounding rectangle"),
+            self.tr("Second moments"),
+        ]
+
+    def initAlgorithm(self, config):
+        self.addParameter(
+            QgsProcessingParameterFeatureSource(
+                self.INPUT_LAYER,
+                self.tr("Input layer"),
+                types=[QgsProcessing.TypeVectorPolygon],
+            )
+        )
+
+        self.addParameter(
+            QgsProcessingParameterEnum(
+                self.ORIENTATION_METHOD,
+                self.tr("Orientations based on"),
+                options=self.orientation_methods,
+                defaultValue=0,
+            )
+        )
+
+        self.addParameter(
+            QgsProcessingParameterNumber(
+                self.NEIGHBORS,
+                self.tr("Number of neighbours"),
+                type=QgsProcessingParameterNumber.Integer,
+                minValue=1,
+                defaultValue=8,
+            )
+        )
+
+        self.addParameter(
+            QgsProcessingParameterBoolean(
+                self.ORTHOGONAL,
+                self.tr("Consider perpendicular orientations as aligned"),
+                defaultValue=False,
+            )
+        )
+
+        self.addSlimOutputParameters(self.INPUT_LAYER)
+
+        self.addParameter(
+            QgsProcessingParameterFeatureSink(
+                self.OUTPUT_LAYER,
+                self.tr("Orientation alignment"),
+                type=QgsProcessing.TypeVectorPolygon
+            )
+        )
+
+    def name(self):
+        return "orientation_alignment"
+
+    def displayName(self):
+        return self.tr("Orientation alignment with the nearest neighbours")
+
+    def processAlgorithm(self, parameters, context, feedback):
+        # input / source
+        source = self.parameterAsSource(parameters, self.INPUT_LAYER, context)
+        if source is None:
+            raise QgsProcessingException(
+                self.invalidSourceError(parameters, self.INPUT_LAYER)
+            )
+
+        wkb_type = source.wkbType()
+
+        if QgsWkbTypes.geometryType(wkb_type) != QgsWkbTypes.PolygonGeometry:
+            feedback.reportError("The layer geometry type is different from a polygon")
+            return {}
+
+        if source.featureCount() == 0:
+            feedback.reportError(
+                self.tr("The layer doesn't contain any feature: no output provided")
+            )
+            return {}
+
+        # other parameters
+        orientation_method = self.parameterAsEnum(parameters, self.ORIENTATION_METHOD, context)
+        neighbors = self.parameterAsInt(parameters, self.NEIGHBORS, context)
+        orthogonal = self.parameterAsBoolean(parameters, self.ORTHOGONAL, context)
+        period = 90.0 if orthogonal else 180.0
+
+        source_attributes = self.parameterAsSourceAttributes(parameters, source, context)
+
+        # output
+        fields = source_attributes.fields()
+
+        new_fields = QgsFields()
+        new_fields.append(QgsField("ORIENTATION", QVariant.Double))
+        new_fields.append(QgsField("ALIGN_DEV", QVariant.Double))
+
+        fields = QgsProcessingUtils.combineFields(fields, new_fields)
+
+        (sink, dest_id) = self.parameterAsSink(
+            parameters,
+            self.OUTPUT_LAYER,
+            context,
+            fields,
+            wkb_type,
+            source.sourceCrs(),
+        )
+        if sink is None:
+            raise QgsProcessingException(
+                self.invalidSinkError(parameters, self.OUTPUT_LAYER))
+
+        # process: orientations and centroids are computed in a first pass and
+        # stored in compact arrays, the centroids are indexed in a k-d tree,
+        # then the deviations are computed for all the polygons before the
+        # output pass
+        request = QgsFeatureRequest()
+        request.setSubsetOfAttributes([])
+
+        ids = array("q")
+        centroids = []
+        orientations = array("d")
+
+        features = prefetch_features(source.getFeatures(request), feedback)
+        total = 40.0 / source.featureCount() if source.featureCount() else 0
+        for current, f in enumerate(features):
+            if feedback.isCanceled():
+                return {}
+
+            if f.hasGeometry():
+                oriented_centroid = self.oriented_centroid(f.geometry(), orientation_method)
+                if oriented_centroid is not None:
+                    ids.append(f.id())
+                    centroids.append(oriented_centroid[:2])
+                    orientations.append(oriented_centroid[2])
+
+            feedback.setProgress(int(current * total))
+
+        if len(ids) <= 1:
+            feedback.reportError(
+                self.tr("Less than two polygons with a defined orientation: no output provided")
+            )
+            return {}
+
+        feedback.pushInfo(self.tr("Building the index of {} centroids").format(len(ids)))
+        tree = KDTree(centroids, range(len(ids)))
+
+        deviations = array("d")
+        total = 40.0 / len(ids)
+        for current in range(len(ids)):
+            if feedback.isCanceled():
+                return {}
+
+            nearest = tree.query(centroids[current], neighbors, exclude_id=current)
+            orientation = orientations[current]
+            deviations.append(
+                sum(
+                    geometry_utils.orientation_difference(orientation, orientations[i], period)
+                    for _, i in nearest
+                ) / len(nearest)
+            )
+
+            feedback.setProgress(40 + int(current * total))
+
+        tree = None
+        centroids = None
+        positions = {fid: position for position, fid in enumerate(ids)}
+
+        features = prefetch_features(source.getFeatures(source_attributes.request()), feedback)
+        total = 20.0 / source.featureCount() if source.featureCount() else 0
+        with BufferedFeatureSink(sink, background=True) as writer:
+            for current, f in enumerate(features):
+                if feedback.isCanceled():
+                    return {}
+
+                out_feat = f
+                attrs = source_attributes.attributes(f)
+
+                position = positions.get(f.id())
+                if position is not None:
+                    attrs.extend([
+                        round_float_to_5_decimals(orientations[position]),
+                        round_float_to_5_decimals(deviations[position]),
+                    ])
+
+                # ensure consistent count of attributes - otherwise null
+                # geometry features will have incorrect attribute length
+                # and provider may reject them
+                if len(attrs) < len(fields):
+                    attrs += [NULL] * (len(fields) - len(attrs))
+
+                out_feat.setAttributes(attrs)
+                writer.addFeature(out_feat, QgsFeatureSink.FastInsert)
+
+                feedback.setProgress(80 + int(current * total))
+
+        # rename output layer
+        global alignment_renamer
+
+        alignment_renamer = LayerRenamer(f'{source.sourceName()}-{self.tr("Orientation_alignment")}')
+        context.layerToLoadOnCompletionDetails(
+            dest_id).setPostProcessor(alignment_renamer)
+
+        return {self.OUTPUT_LAYER: dest_id}
+
+    def oriented_centroid(self, geom, orientation_method):
+        # tuple (centroid x, centroid y, orientation in degrees in [0 ; 180[),
+        # None if the orientation is not defined
+        if geom.isNull() or geom.isEmpty():
+            return None
+
+        if orientation_method == 1:
+            moments = geometry_utils.second_moments(geom)
+            if moments is None:
+                return None
+            return moments[0], moments[1], math.degrees(moments[2])
+
+        # orientation of the minimum bounding rectangle, -2.0 if not defined
+        orientation = geometry_utils.polygon_orientation(geom)
+        if orientation < 0:
+            return None
+
+        centroid = geom.centroid()
+        if centroid.isNull() or centroid.isEmpty():
+            return None
+        point = centroid.asPoint()
+        return point.x(), point.y(), orientation % 180.0
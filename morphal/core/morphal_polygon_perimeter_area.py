@@ -36,6 +36,7 @@ from qgis.PyQt.QtCore import QVariant
 
 from morphal.ptm4qgis_algorithm import PTM4QgisAlgorithm
 
+from .morphal_feature_io import BufferedFeatureSink, prefetch_features
 from .utils import LayerRenamer
 
 
@@ -77,6 +78,8 @@ class MorphALPolygonPerimeterArea(PTM4QgisAlgorithm):
             )
         )
 
+        self.addSlimOutputParameters(self.INPUT)
+
         self.addParameter(
             QgsProcessingParameterFeatureSink(
                 self.OUTPUT, self.tr("Layer with added perimeters and areas")
@@ -117,8 +120,10 @@ class MorphALPolygonPerimeterArea(PTM4QgisAlgorithm):
         # 2 - ellipsoidal
         method = self.parameterAsEnum(parameters, self.METHOD, context)
 
+        source_attributes = self.parameterAsSourceAttributes(parameters, source, context)
+
         # output
-        fields = source.fields()
+        fields = source_attributes.fields()
 
         new_fields = QgsFields()
         new_fields.append(QgsField("PERIMETER", QVariant.Double))
@@ -149,31 +154,32 @@ class MorphALPolygonPerimeterArea(PTM4QgisAlgorithm):
                 source.sourceCrs(), context.project().crs(), context.project()
             )
 
-        features = source.getFeatures()
+        features = prefetch_features(source.getFeatures(source_attributes.request()), feedback)
         total = 100.0 / source.featureCount() if source.featureCount() else 0
-        for current, f in enumerate(features):
-            if feedback.isCanceled():
-                return {}
-
-            out_feat = f
-            attrs = f.attributes()
-            in_geom = f.geometry()
-            if in_geom:
-                if coord_transform is not None:
-                    in_geom.transform(coord_transform)
-
-                attrs.extend(self.polygon_attributes(in_geom))
-
-            # ensure consistent count of attributes - otherwise null
-            # geometry features will have incorrect attribute length
-            # and provider may reject them
-            if len(attrs) < len(fields):
-                attrs += [NULL] * (len(fields) - len(attrs))
-
-            out_feat.setAttributes(attrs)
-            sink.addFeature(out_feat, QgsFeatureSink.FastInsert)
-
-            feedback.setProgress(int(current * total))
+        with BufferedFeatureSink(sink, background=True) as writer:
+            for current, f in enumerate(features):
+                if feedback.isCanceled():
+                    return {}
+
+                out_feat = f
+                attrs = source_attributes.attributes(f)
+                in_geom = f.geometry()
+                if in_geom:
+                    if coord_transform is not None:
+                        in_geom.transform(coord_transform)
+
+                    attrs.extend(self.polygon_attributes(in_geom))
+
+                # ensure consistent count of attributes - otherwise null
+                # geometry features will have incorrect attribute length
+                # and provider may reject them
+                if len(attrs) < len(fields):
+                    attrs += [NULL] * (len(fields) - len(attrs))
+
+                out_feat.setAttributes(attrs)
+                writer.addFeature(out_feat, QgsFeatureSink.FastInsert)
+
+                feedback.setProgress(int(current * total))
 
         # rename output layer
         global area_perimeter_renamer
@@ -17,11 +17,12 @@
  ***************************************************************************/
 """
 
+import math
+
 from qgis.core import (
     NULL,
     QgsDistanceArea,
     QgsFeature,
-    QgsFeatureRequest,
     QgsFeatureSink,
     QgsField,
     QgsFields,
@@ -41,6 +42,7 @@ from qgis.PyQt.QtCore import QVariant
 from morphal.ptm4qgis_algorithm import PTM4QgisAlgorithm
 
 from . import morphal_geometry_utils as geometry_utils
+from .morphal_feature_io import BufferedFeatureSink, prefetch_features
 from .utils import LayerRenamer, round_float_to_5_decimals
 
 
@@ -48,6 +50,7 @@ class MorphALRectangularCharacterisation(PTM4QgisAlgorithm):
     INPUT_LAYER = "INPUT_LAYER"
 
     METHOD = "CALC_METHOD"
+    ORIENTATION_METHOD = "ORIENTATION_METHOD"
 
     RECTANGLE_LEVEL_1 = "RECTANGLE_LEVEL_1"
     SD_CONVEX_RECT_1 = "SD_CONVEX_RECT_1"
@@ -82,7 +85,12 @@ class MorphALRectangularCharacterisation(PTM4QgisAlgorithm):
     CIRCULAR_LAYER_OUTPUT = "CIRCULAR_LAYER_OUTPUT"
 
     def help(self):
-        return self.tr("Rectangular characterisation")
+        return self.tr("\
+            Rectangular characterisation.\
+            \nThe orientation (ORIENT_REC) and the elongation (ELONGATION) are based on the minimum\
+            bounding rectangle by default. Alternatively, they can be based on the second moments\
+            of the polygons, or both can be computed side by side (MOM_ORIENT, MOM_ELONG and the\
+            difference in degrees between the two orientations, ORIENT_DIFF).")
 
     def __init__(self):
         super().__init__()
@@ -91,6 +99,11 @@ class MorphALRectangularCharacterisation(PTM4QgisAlgorithm):
             self.tr("Project CRS"),
             self.tr("Ellipsoidal"),
         ]
+        self.orientation_methods = [
+            self.tr("Minimum bounding rectangle"),
+            self.tr("Second moments"),
+            self.tr("Both (minimum bounding rectangle and second moments)")
+        ]
 
     def initAlgorithm(self, config=None):
         self.addParameter(
@@ -110,6 +123,15 @@ class MorphALRectangularCharacterisation(PTM4QgisAlgorithm):
             )
         )
 
+        self.addParameter(
+            QgsProcessingParameterEnum(
+                self.ORIENTATION_METHOD,
+                self.tr("Orientations and elongations based on"),
+                options=self.orientation_methods,
+                defaultValue=0,
+            )
+        )
+
         # Rectangle detection - Level 1
         self.addParameter(
             QgsProcessingParameterBoolean(
@@ -265,6 +287,8 @@ class MorphALRectangularCharacterisation(PTM4QgisAlgorithm):
             )
         )
 
+        self.addSlimOutputParameters(self.INPUT_LAYER)
+
     def name(self):
         return "rectangular_characterisation"
 
@@ -335,7 +359,15 @@ class MorphALRectangularCharacterisation(PTM4QgisAlgorithm):
             parameters, self.MILLER_INDEX, context
         )
 
-        fields = source.fields()
+        # Orientation method:
+        # 0 - minimum bounding rectangle
+        # 1 - second moments
+        # 2 - both
+        orientation_method = self.parameterAsEnum(parameters, self.ORIENTATION_METHOD, context)
+
+        source_attributes = self.parameterAsSourceAttributes(parameters, source, context)
+
+        fields = source_attributes.fields()
         new_fields = QgsFields()
         new_fields.append(QgsField("SD_CONVEX", QVariant.Double))
         new_fields.append(QgsField("SD_MBR", QVariant.Double))
@@ -345,6 +377,11 @@ class MorphALRectangularCharacterisation(PTM4QgisAlgorithm):
         new_fields.append(QgsField("CIRCLE", QVariant.Bool))
         new_fields.append(QgsField("ELONGATION", QVariant.Double))
 
+        if orientation_method == 2:
+            new_fields.append(QgsField("MOM_ORIENT", QVariant.Double))
+            new_fields.append(QgsField("MOM_ELONG", QVariant.Double))
+            new_fields.append(QgsField("ORIENT_DIFF", QVariant.Double))
+
         fields = QgsProcessingUtils.combineFields(fields, new_fields)
 
         (rect_1_output_sink, rect_1_output_dest_id) = self.parameterAsSink(
@@ -409,92 +446,126 @@ class MorphALRectangularCharacterisation(PTM4QgisAlgorithm):
 
         distance_area = QgsDistanceArea()
 
-        features = source.getFeatures(
-            QgsFeatureRequest(),
-            QgsProcessingFeatureSource.FlagSkipGeometryValidityChecks,
+        features = prefetch_features(
+            source.getFeatures(
+                source_attributes.request(),
+                QgsProcessingFeatureSource.FlagSkipGeometryValidityChecks,
+            ),
+            feedback
         )
         total = 100.0 / source.featureCount() if source.featureCount() else 0
-        for current, f in enumerate(features):
-            if feedback.isCanceled():
-                return {}
-
-            geom = f.geometry()
-            attrs = f.attributes()
-            sd_convex_hull = -2.0
-            sd_mbr = -2.0
-            mbr_orientation = -1.0
-
-            if not geom.isNull() and not geom.isEmpty():
-                sd_convex_hull, sd_mbr, mbr_orientation, elongation = geometry_utils.is_rectangle_indices(
-                    geom, distance_area
-                )
-                index_compact = geometry_utils.compactness_miller_index(geom, distance_area)
-                index_circle = geometry_utils.is_circle(geom, miller_index_threshold, distance_area)
-
-                # round indicators
-                sd_convex_hull = round_float_to_5_decimals(sd_convex_hull)
-                if sd_convex_hull <= 0 and sd_convex_hull >= -0.00001:
-                    sd_convex_hull = 0
-                sd_mbr = round_float_to_5_decimals(sd_mbr)
-                mbr_orientation = round_float_to_5_decimals(mbr_orientation)
-                elongation = round_float_to_5_decimals(elongation)
-                index_compact = round_float_to_5_decimals(index_compact)
-
-                attrs.extend(
-                    [
-                        sd_convex_hull,
-                        sd_mbr,
-                        mbr_orientation,
-                        index_compact,
-                        index_circle,
-                        elongation
-                    ]
-                )
-
-            if len(attrs) < len(fields):
-                attrs += [NULL] * (len(fields) - len(attrs))
-
-            if mbr_orientation != -1.0:
-                out_feat = QgsFeature()
-                out_feat.setGeometry(geom)
-                out_feat.setAttributes(attrs)
-
-                if sd_convex_hull != -2.0:
-                    rect_all_indicators_output_sink.addFeature(
-                        out_feat, QgsFeatureSink.FastInsert
+        rect_1_writer = BufferedFeatureSink(rect_1_output_sink, background=True)
+        rect_2_writer = BufferedFeatureSink(rect_2_output_sink, background=True)
+        rect_3_writer = BufferedFeatureSink(rect_3_output_sink, background=True)
+        rect_all_indicators_writer = BufferedFeatureSink(rect_all_indicators_output_sink, background=True)
+
+        try:
+            for current, f in enumerate(features):
+                if feedback.isCanceled():
+                    return {}
+
+                geom = f.geometry()
+                attrs = source_attributes.attributes(f)
+                sd_convex_hull = -2.0
+                sd_mbr = -2.0
+                mbr_orientation = -1.0
+
+                if not geom.isNull() and not geom.isEmpty():
+                    sd_convex_hull, sd_mbr, mbr_orientation, elongation = geometry_utils.is_rectangle_indices(
+                        geom, distance_area
                     )
-                    rect_all_indicators_count += 1
-                    if rect_level_1:
-                        if (
-                            sd_convex_hull <= sd_convex_level_1
-                            and sd_mbr <= sd_mbr_level_1
-                        ):
-                            rect_1_output_sink.addFeature(
-                                out_feat, QgsFeatureSink.FastInsert
-                            )
-                            rect_1_count += 1
+                    index_compact = geometry_utils.compactness_miller_index(geom, distance_area)
+                    index_circle = geometry_utils.is_circle(geom, miller_index_threshold, distance_area)
+
+                    orientation = mbr_orientation
+                    moments_attrs = []
+                    if orientation_method != 0:
+                        moments_orientation, moments_elongation = self.moments_orientation(geom)
+                        if orientation_method == 1:
+                            orientation = moments_orientation
+                            elongation = moments_elongation
                         else:
-                            if rect_level_2:
-                                if (
-                                    sd_convex_hull <= sd_convex_level_2
-                                    and sd_mbr <= sd_mbr_level_2
-                                ):
-                                    rect_2_output_sink.addFeature(
-                                        out_feat, QgsFeatureSink.FastInsert
-                                    )
-                                    rect_2_count += 1
-                                else:
-                                    if rect_level_3:
-                                        if (
-                                            sd_convex_hull <= sd_convex_level_3
-                                            and sd_mbr <= sd_mbr_level_3
-                                        ):
-                                            rect_3_output_sink.addFeature(
-                                                out_feat, QgsFeatureSink.FastInsert
-                                            )
-                                            rect_3_count += 1
-
-            feedback.setProgress(int(current * total))
+                            orientation_diff = NULL
+                            if moments_orientation >= 0 and mbr_orientation >= 0:
+                                orientation_diff = round_float_to_5_decimals(
+                                    geometry_utils.orientation_difference(moments_orientation, mbr_orientation)
+                                )
+                            moments_attrs = [
+                                round_float_to_5_decimals(moments_orientation),
+                                round_float_to_5_decimals(moments_elongation),
+                                orientation_diff
+                            ]
+
+                    # round indicators
+                    sd_convex_hull = round_float_to_5_decimals(sd_convex_hull)
+                    if sd_convex_hull <= 0 and sd_convex_hull >= -0.00001:
+                        sd_convex_hull = 0
+                    sd_mbr = round_float_to_5_decimals(sd_mbr)
+                    orientation = round_float_to_5_decimals(orientation)
+                    elongation = round_float_to_5_decimals(elongation)
+                    index_compact = round_float_to_5_decimals(index_compact)
+
+                    attrs.extend(
+                        [
+                            sd_convex_hull,
+                            sd_mbr,
+                            orientation,
+                            index_compact,
+                            index_circle,
+                            elongation
+                        ]
+                    )
+                    attrs.extend(moments_attrs)
+
+                if len(attrs) < len(fields):
+                    attrs += [NULL] * (len(fields) - len(attrs))
+
+                if mbr_orientation != -1.0:
+                    out_feat = QgsFeature()
+                    out_feat.setGeometry(geom)
+                    out_feat.setAttributes(attrs)
+
+                    if sd_convex_hull != -2.0:
+                        rect_all_indicators_writer.addFeature(
+                            out_feat, QgsFeatureSink.FastInsert
+                        )
+                        rect_all_indicators_count += 1
+                        if rect_level_1:
+                            if (
+                                sd_convex_hull <= sd_convex_level_1
+                                and sd_mbr <= sd_mbr_level_1
+                            ):
+                                rect_1_writer.addFeature(
+                                    out_feat, QgsFeatureSink.FastInsert
+                                )
+                                rect_1_count += 1
+                            else:
+                                if rect_level_2:
+                                    if (
+                                        sd_convex_hull <= sd_convex_level_2
+                                        and sd_mbr <= sd_mbr_level_2
+                                    ):
+                                        rect_2_writer.addFeature(
+                                            out_feat, QgsFeatureSink.FastInsert
+                                        )
+                                        rect_2_count += 1
+                                    else:
+                                        if rect_level_3:
+                                            if (
+                                                sd_convex_hull <= sd_convex_level_3
+                                                and sd_mbr <= sd_mbr_level_3
+                                            ):
+                                                rect_3_writer.addFeature(
+                                                    out_feat, QgsFeatureSink.FastInsert
+                                                )
+                                                rect_3_count += 1
+
+                feedback.setProgress(int(current * total))
+        finally:
+            rect_1_writer.close()
+            rect_2_writer.close()
+            rect_3_writer.close()
+            rect_all_indicators_writer.close()
 
         # results = {
         #     self.RECT_1_COUNT: rect_1_count,
@@ -536,3 +607,12 @@ class MorphALRectangularCharacterisation(PTM4QgisAlgorithm):
             results[self.RECT_ALL_INDICATORS_LAYER_OUTPUT] = rect_all_indicators_output_dest_id
 
         return results
+
+    def moments_orientation(self, geom):
+        # orientation (in degrees, in [0 ; 180[) and elongation based on the second moments,
+        # -1.0 if not defined
+        moments = geometry_utils.second_moments(geom)
+        if moments is None:
+            return -1.0, -1.0
+
+        return math.degrees(moments[2]), geometry_utils.moments_elongation(moments[3], moments[4])
@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+    MorphAL: PTM plugin for QGIS
+    --------------
+    Start date           : January 2021
+    Copyright            : (C) 2021, Eric Grosso, PTM
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+import math
+from array import array
+
+from qgis.core import QgsGeometry, QgsLineString, QgsPoint
+
+# initial number of slots of the hash tables (a power of 2)
+INITIAL_TABLE_SIZE = 1024
+
+
+def snap_segment(x0: float, y0: float, x1: float, y1: float, tolerance: float = 0.0):
+    """
+    Snap the extremities of a segment to the nearest point of a grid whose
+    cell size is the tolerance (snap rounding, no snapping if the tolerance
+    is 0), and normalise the segment: its first point is located as far west
+    as possible, or otherwise as far south as possible.
+
+    :return: the coordinates (x0, y0, x1, y1) of the snapped segment, or None
+      if the segment is degenerated once snapped
+    """
+    if tolerance > 0:
+        x0 = round(x0 / tolerance) * tolerance
+        y0 = round(y0 / tolerance) * tolerance
+        x1 = round(x1 / tolerance) * tolerance
+        y1 = round(y1 / tolerance) * tolerance
+
+    if (x1, y1) < (x0, y0):
+        return x1, y1, x0, y0
+    if (x1, y1) == (x0, y0):
+        return None
+    return x0, y0, x1, y1
+
+
+def segment_angle(x0: float, y0: float, x1: float, y1: float):
+    """
+    Return the orientation of a segment in radians, between 0 and Pi,
+    comparatively to the X axis.
+    """
+    angle_x = math.atan2(y1 - y0, x1 - x0)
+    if angle_x < 0:
+        angle_x += math.pi
+    if angle_x >= math.pi:
+        angle_x = 0.0
+    return angle_x
+
+
+def segment_geometry(x0: float, y0: float, x1: float, y1: float):
+    return QgsGeometry(QgsLineString([QgsPoint(x0, y0), QgsPoint(x1, y1)]))
+
+
+class SegmentNetwork:
+    """
+    Compact representation of a set of normalised segments: a pool of
+    deduplicated vertices (float64 x, y) and an array of edges (int32 vertex
+    indices), each edge holding the id of its parent feature.
+
+    Edges are normalised, i.e. their first vertex is always located as far
+    west as possible, or otherwise as far south as possible. Each edge is
+    stored only once: adding an edge twice returns the index of the
+    existing one. No QgsGeometry is created until edges are exported.
+
+    Vertices and edges are deduplicated with two hash tables stored in
+    arrays (open addressing with linear probing), holding only the indices
+    of the vertices and of the edges: keys are read back from the vertex
+    and edge arrays, so that no Python object is kept per vertex or edge.
+
+    If a tolerance is given, the vertices are snapped to the nearest point of
+    a grid whose cell size is the tolerance (snap rounding, see snap_segment),
+    so that vertices closer than the tolerance are generally merged.
+    """
+
+    def __init__(self, tolerance: float = 0.0):
+        self.tolerance = tolerance
+        self.vertices = array("d")
+        self.edge_vertices = array("i")
+        self.edge_parents = array("q")
+        self._vertex_table = _empty_table(INITIAL_TABLE_SIZE)
+        self._edge_table = _empty_table(INITIAL_TABLE_SIZE)
+
+    def vertex_count(self):
+        return len(self.vertices) // 2
+
+    def edge_count(self):
+        return len(self.edge_parents)
+
+    def add_vertex(self, x: float, y: float):
+        """
+        Return the index of the vertex (x, y), added to the pool if needed.
+        The vertex is expected to be already snapped.
+        """
+        vertices = self.vertices
+        table = self._vertex_table
+        mask = len(table) - 1
+        slot = hash((x, y)) & mask
+        while True:
+            index = table[slot]
+            if index < 0:
+                break
+            if vertices[2 * index] == x and vertices[2 * index + 1] == y:
+                return index
+            slot = (slot + 1) & mask
+
+        index = len(vertices) // 2
+        vertices.append(x)
+        vertices.append(y)
+        table[slot] = index
+
+        if 2 * (index + 1) > len(table):
+            self._vertex_table = _grown_table(
+                table, (hash(self.vertex(i)) for i in range(index + 1))
+            )
+        return index
+
+    def add_edge(self, x0: float, y0: float, x1: float, y1: float, parent: int = -1):
+        """
+        Add the segment (x0, y0) - (x1, y1) to the network.
+
+        :return: a tuple (edge index, true if the edge has been created),
+          the edge index being -1 for degenerated segments
+        """
+        coords = snap_segment(x0, y0, x1, y1, self.tolerance)
+        if coords is None:
+            return -1, False
+
+        v0 = self.add_vertex(coords[0], coords[1])
+        v1 = self.add_vertex(coords[2], coords[3])
+
+        edge_vertices = self.edge_vertices
+        table = self._edge_table
+        mask = len(table) - 1
+        slot = hash((v0, v1)) & mask
+        while True:
+            index = table[slot]
+            if index < 0:
+                break
+            if edge_vertices[2 * index] == v0 and edge_vertices[2 * index + 1] == v1:
+                return index, False
+            slot = (slot + 1) & mask
+
+        index = len(self.edge_parents)
+        edge_vertices.append(v0)
+        edge_vertices.append(v1)
+        self.edge_parents.append(parent)
+        table[slot] = index
+
+        if 2 * (index + 1) > len(table):
+            self._edge_table = _grown_table(
+                table,
+                (hash((edge_vertices[2 * i], edge_vertices[2 * i + 1])) for i in range(index + 1))
+            )
+        return index, True
+
+    def freeze(self):
+        """
+        Release the hash tables used to deduplicate vertices and edges.
+        No edge can be added afterwards.
+        """
+        self._vertex_table = None
+        self._edge_table = None
+
+    def vertex(self, index: int):
+        return self.vertices[2 * index], self.vertices[2 * index + 1]
+
+    def edge(self, index: int):
+        """
+        Return the coordinates (x0, y0, x1, y1) of an edge.
+        """
+        v0 = self.edge_vertices[2 * index]
+        v1 = self.edge_vertices[2 * index + 1]
+        return (
+            self.vertices[2 * v0],
+            self.vertices[2 * v0 + 1],
+            self.vertices[2 * v1],
+            self.vertices[2 * v1 + 1],
+        )
+
+    def edge_parent(self, index: int):
+        return self.edge_parents[index]
+
+    def edge_length(self, index: int):
+        x0, y0, x1, y1 = self.edge(index)
+        return math.hypot(x1 - x0, y1 - y0)
+
+    def edge_geometry(self, index: int):
+        return segment_geometry(*self.edge(index))
+
+
+def _empty_table(size: int):
+    # hash table slots, -1 for an empty slot
+    return array("q", [-1]) * size
+
+
+def _grown_table(table, hashes):
+    # table of twice the size, in which the indices are inserted again in
+    # their order (the hash of each index being given by hashes)
+    grown = _empty_table(2 * len(table))
+    mask = len(grown) - 1
+    for index, key_hash in enumerate(hashes):
+        slot = key_hash & mask
+        while grown[slot] >= 0:
+            slot = (slot + 1) & mask
+        grown[slot] = index
+    return grown
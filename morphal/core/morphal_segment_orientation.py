@@ -17,10 +17,14 @@
  ***************************************************************************/
 """
 
+import math
+from array import array
+
 from qgis.core import (
     NULL,
     QgsCoordinateTransform,
     QgsDistanceArea,
+    QgsFeature,
     QgsFeatureSink,
     QgsField,
     QgsFields,
@@ -30,6 +34,7 @@ from qgis.core import (
     QgsProcessingParameterEnum,
     QgsProcessingParameterFeatureSink,
     QgsProcessingParameterFeatureSource,
+    QgsProcessingParameterField,
     QgsProcessingParameterNumber,
     QgsProcessingUtils,
     QgsWkbTypes,
@@ -39,6 +44,7 @@ from qgis.PyQt.QtCore import QVariant
 from morphal.ptm4qgis_algorithm import PTM4QgisAlgorithm
 
 from . import morphal_geometry_utils as geometry_utils
+from .morphal_feature_io import BufferedFeatureSink, prefetch_features
 from .utils import LayerRenamer, round_float_to_3_decimals
 
 
@@ -49,18 +55,30 @@ class MorphALSegmentOrientation(PTM4QgisAlgorithm):
     UNIT = "UNIT"
     INTERVAL = "INTERVAL"
     ROUNDED = "ROUNDED"
-    # HISTOGRAM = "HISTOGRAM"
-    # HISTOGRAM_STEP = "HISTOGRAM_STEP"
+    HISTOGRAM = "HISTOGRAM"
+    HISTOGRAM_STEP = "HISTOGRAM_STEP"
+    HISTOGRAM_GROUP_FIELD = "HISTOGRAM_GROUP_FIELD"
     CLASSIFICATION = "CLASSIFICATION"
     CLASSIFICATION_STEP = "CLASSIFICATION_STEP"
+    LINE_DETAILS = "LINE_DETAILS"
     OUTPUT = "OUTPUT"
+    HISTOGRAM_OUTPUT = "HISTOGRAM_OUTPUT"
 
     def help(self):
         return self.tr("\
             This algorithm computes the orientations of a layer of segments.\
             \nIt generates a new vector layer with the same content as the input one, but with\
             additional attributes: orientation, computed from East or from North, and if specified,\
-            a classification based on the computed orientations and a classification step to specify.")
+            a classification based on the computed orientations and a classification step to specify.\
+            \nFor lines with more than two vertices, the orientation is the length-weighted mean\
+            orientation of their segments (opposite directions being considered identical).\
+            Optionally, the orientation from the first to the last vertex of each line and the\
+            dispersion of the orientations of its segments (0: straight line, 1: no main orientation)\
+            can also be computed.\
+            \nOptionally, a histogram of the orientations (rose diagram) is generated in a separate\
+            table: for each bin of orientations, the number of segments and their total length,\
+            the segments of lines being counted individually. The histogram can be computed per\
+            group of features sharing the same value of an attribute.")
 
     def __init__(self):
         super().__init__()
@@ -155,22 +173,41 @@ class MorphALSegmentOrientation(PTM4QgisAlgorithm):
             )
         )
 
-        # self.addParameter(
-        #     QgsProcessingParameterBoolean(
-        #         self.HISTOGRAM, self.tr("Create an histogram"), defaultValue=False
-        #     )
-        # )
-
-        # self.addParameter(
-        #     QgsProcessingParameterNumber(
-        #         self.HISTOGRAM_STEP,
-        #         self.tr("Step of the histogram"),
-        #         type=QgsProcessingParameterNumber.Double,
-        #         minValue=0.001,
-        #         maxValue=200,
-        #         defaultValue=5,
-        #     )
-        # )
+        self.addParameter(
+            QgsProcessingParameterBoolean(
+                self.LINE_DETAILS,
+                self.tr("Compute endpoint orientations and dispersions of lines"),
+                defaultValue=False,
+            )
+        )
+
+        self.addParameter(
+            QgsProcessingParameterBoolean(
+                self.HISTOGRAM, self.tr("Create an histogram"), defaultValue=False
+            )
+        )
+
+        self.addParameter(
+            QgsProcessingParameterNumber(
+                self.HISTOGRAM_STEP,
+                self.tr("Step of the histogram"),
+                type=QgsProcessingParameterNumber.Double,
+                minValue=0.001,
+                maxValue=200,
+                defaultValue=5,
+            )
+        )
+
+        self.addParameter(
+            QgsProcessingParameterField(
+                self.HISTOGRAM_GROUP_FIELD,
+                self.tr("Histogram grouped by"),
+                parentLayerParameterName=self.INPUT,
+                optional=True,
+            )
+        )
+
+        self.addSlimOutputParameters(self.INPUT)
 
         self.addParameter(
             QgsProcessingParameterFeatureSink(
@@ -180,6 +217,15 @@ class MorphALSegmentOrientation(PTM4QgisAlgorithm):
             )
         )
 
+        self.addParameter(
+            QgsProcessingParameterFeatureSink(
+                self.HISTOGRAM_OUTPUT,
+                self.tr("Histogram of orientations"),
+                type=QgsProcessing.TypeVector,
+                optional=True,
+            )
+        )
+
     def name(self):
         return "segment_orientation"
 
@@ -242,13 +288,19 @@ class MorphALSegmentOrientation(PTM4QgisAlgorithm):
             parameters, self.CLASSIFICATION_STEP, context
         )
 
-        # histogram = self.parameterAsBoolean(parameters, self.HISTOGRAM, context)
-        # histogram_step = self.parameterAsDouble(
-        #     parameters, self.HISTOGRAM_STEP, context
-        # )
+        line_details = self.parameterAsBoolean(parameters, self.LINE_DETAILS, context)
+
+        histogram = self.parameterAsBoolean(parameters, self.HISTOGRAM, context)
+        histogram_step = self.parameterAsDouble(
+            parameters, self.HISTOGRAM_STEP, context
+        )
+        group_field = self.parameterAsString(parameters, self.HISTOGRAM_GROUP_FIELD, context)
+        group_index = source.fields().lookupField(group_field) if group_field else -1
+
+        source_attributes = self.parameterAsSourceAttributes(parameters, source, context)
 
         # output
-        fields = source.fields()
+        fields = source_attributes.fields()
 
         new_fields = QgsFields()
         if from_north:
@@ -262,6 +314,13 @@ class MorphALSegmentOrientation(PTM4QgisAlgorithm):
             else:
                 new_fields.append(QgsField("E_CLASSIFICATION", QVariant.Double))
 
+        if line_details:
+            if from_north:
+                new_fields.append(QgsField("N_END_ORIENTATION", QVariant.Double))
+            else:
+                new_fields.append(QgsField("E_END_ORIENTATION", QVariant.Double))
+            new_fields.append(QgsField("DISPERSION", QVariant.Double))
+
         fields = QgsProcessingUtils.combineFields(fields, new_fields)
 
         (sink, dest_id) = self.parameterAsSink(
@@ -272,6 +331,37 @@ class MorphALSegmentOrientation(PTM4QgisAlgorithm):
                 self.invalidSinkError(parameters, self.OUTPUT)
             )
 
+        histogram_sink = None
+        histogram_dest_id = None
+        if histogram:
+            histogram_fields = QgsFields()
+            if group_index >= 0:
+                histogram_fields.append(source.fields().at(group_index))
+            histogram_fields.append(QgsField("BIN_INDEX", QVariant.Int))
+            histogram_fields.append(QgsField("BIN_START", QVariant.Double))
+            histogram_fields.append(QgsField("BIN_END", QVariant.Double))
+            histogram_fields.append(QgsField("COUNT", QVariant.LongLong))
+            histogram_fields.append(QgsField("LENGTH", QVariant.Double))
+
+            (histogram_sink, histogram_dest_id) = self.parameterAsSink(
+                parameters,
+                self.HISTOGRAM_OUTPUT,
+                context,
+                histogram_fields,
+                QgsWkbTypes.NoGeometry,
+                source.sourceCrs(),
+            )
+            if histogram_sink is None:
+                feedback.reportError(
+                    self.tr("No output is set for the histogram of orientations: no histogram provided")
+                )
+
+        # histogram: counts and lengths per bin, in fixed-size arrays per group,
+        # accumulated while streaming the features
+        histogram_range = self.orientation_range(unit, interval)
+        bin_count = max(1, math.ceil(histogram_range / histogram_step - 1e-9))
+        histograms = {}
+
         # process
         coord_transform = None
 
@@ -290,46 +380,94 @@ class MorphALSegmentOrientation(PTM4QgisAlgorithm):
                 source.sourceCrs(), context.project().crs(), context.project()
             )
 
-        features = source.getFeatures()
+        features = prefetch_features(source.getFeatures(source_attributes.request([group_index])), feedback)
         total = 100.0 / source.featureCount() if source.featureCount() else 0
-        for current, f in enumerate(features):
-            if feedback.isCanceled():
-                return {}
-
-            out_feature = f
-            attrs = f.attributes()
-            geom = f.geometry()
-            if geom:
-                if coord_transform is not None:
-                    geom.transform(coord_transform)
-
-                orientation = geometry_utils.angle_north_east(
-                    geom,
-                    unit,
-                    interval,
-                    rounded,
-                    from_north
-                    )
-
-                if orientation is not None:
-                    if classification:
-                        class_int = int(orientation / classification_step)
-                        if orientation < 0:
-                            class_int = class_int - 1
-                        attrs.extend([orientation, class_int])
-                    else:
-                        attrs.extend([orientation])
-
-            # ensure consistent count of attributes - otherwise null
-            # geometry features will have incorrect attribute length
-            # and provider may reject them
-            if len(attrs) < len(fields):
-                attrs += [NULL] * (len(fields) - len(attrs))
-
-            out_feature.setAttributes(attrs)
-            sink.addFeature(out_feature, QgsFeatureSink.FastInsert)
-
-            feedback.setProgress(int(current * total))
+        with BufferedFeatureSink(sink, background=True) as writer:
+            for current, f in enumerate(features):
+                if feedback.isCanceled():
+                    return {}
+
+                out_feature = f
+                attrs = source_attributes.attributes(f)
+                geom = f.geometry()
+                if geom:
+                    if coord_transform is not None:
+                        geom.transform(coord_transform)
+
+                    orientation = geometry_utils.angle_north_east(
+                        geom,
+                        unit,
+                        interval,
+                        rounded,
+                        from_north
+                        )
+
+                    # lines with more than two vertices: mean orientation of the segments
+                    line_orientations = None
+                    if orientation is None or line_details:
+                        line_orientations = geometry_utils.line_orientations(geom)
+
+                    if orientation is None and line_orientations is not None:
+                        orientation = geometry_utils.convert_angle(
+                            line_orientations[0],
+                            unit,
+                            interval,
+                            rounded,
+                            from_north
+                        )
+
+                    if histogram_sink is not None:
+                        group = None
+                        if group_index >= 0:
+                            group = f.attribute(group_index)
+                            if isinstance(group, QVariant) and group.isNull():
+                                group = None
+
+                        counts, lengths = histograms.get(group, (None, None))
+                        if counts is None:
+                            counts = array("q", [0] * bin_count)
+                            lengths = array("d", [0.0] * bin_count)
+                            histograms[group] = (counts, lengths)
+
+                        self.accumulate_histogram(
+                            geom,
+                            counts,
+                            lengths,
+                            histogram_range,
+                            histogram_step,
+                            method,
+                            unit,
+                            interval,
+                            rounded,
+                            from_north
+                        )
+
+                    if orientation is not None:
+                        if classification:
+                            class_int = geometry_utils.orientation_class(orientation, classification_step)
+                            attrs.extend([orientation, class_int])
+                        else:
+                            attrs.extend([orientation])
+
+                        if line_details:
+                            attrs.extend(self.line_details_attributes(
+                                line_orientations,
+                                unit,
+                                interval,
+                                rounded,
+                                from_north
+                            ))
+
+                # ensure consistent count of attributes - otherwise null
+                # geometry features will have incorrect attribute length
+                # and provider may reject them
+                if len(attrs) < len(fields):
+                    attrs += [NULL] * (len(fields) - len(attrs))
+
+                out_feature.setAttributes(attrs)
+                writer.addFeature(out_feature, QgsFeatureSink.FastInsert)
+
+                feedback.setProgress(int(current * total))
 
         # rename output layer
         global orientations_renamer
@@ -348,4 +486,92 @@ class MorphALSegmentOrientation(PTM4QgisAlgorithm):
         context.layerToLoadOnCompletionDetails(
             dest_id).setPostProcessor(orientations_renamer)
 
-        return {self.OUTPUT: dest_id}
+        results = {self.OUTPUT: dest_id}
+
+        if histogram_sink is not None:
+            with BufferedFeatureSink(histogram_sink) as histogram_writer:
+                for group, (counts, lengths) in histograms.items():
+                    for bin_index in range(bin_count):
+                        attrs = []
+                        if group_index >= 0:
+                            attrs.append(NULL if group is None else group)
+                        attrs.extend([
+                            bin_index,
+                            bin_index * histogram_step,
+                            min((bin_index + 1) * histogram_step, histogram_range),
+                            counts[bin_index],
+                            lengths[bin_index]
+                        ])
+
+                        feat = QgsFeature()
+                        feat.setAttributes(attrs)
+                        histogram_writer.addFeature(feat, QgsFeatureSink.FastInsert)
+
+            global histogram_renamer
+
+            histogram_renamer = LayerRenamer(
+                f'{source.sourceName()}-Histogram-{round_float_to_3_decimals(histogram_step)}'
+            )
+            context.layerToLoadOnCompletionDetails(
+                histogram_dest_id).setPostProcessor(histogram_renamer)
+
+            results[self.HISTOGRAM_OUTPUT] = histogram_dest_id
+
+        return results
+
+    def orientation_range(self, unit, interval):
+        # upper bound of the orientations, depending on the unit and the interval
+        if unit == 0:  # degree
+            orientation_range = 180.0
+        elif unit == 2:  # grade
+            orientation_range = 200.0
+        else:  # radian
+            orientation_range = math.pi
+
+        if interval != 0:
+            orientation_range /= 2.0
+
+        return orientation_range
+
+    def accumulate_histogram(
+            self,
+            geom,
+            counts,
+            lengths,
+            histogram_range,
+            histogram_step,
+            method,
+            unit,
+            interval,
+            rounded,
+            from_north
+    ):
+        # each segment of the line is added to the bin of its orientation
+        for _, _, _, p1, p2 in geometry_utils.indexed_segments(geom):
+            dx = p2.x() - p1.x()
+            dy = p2.y() - p1.y()
+            if dx == 0 and dy == 0:
+                continue
+
+            orientation = geometry_utils.convert_angle(math.atan2(dy, dx), unit, interval, rounded, from_north)
+            bin_index = min(int((orientation % histogram_range) / histogram_step), len(counts) - 1)
+
+            if method == 2:
+                length = self.distance_area.measureLine(p1, p2)
+            else:
+                length = math.hypot(dx, dy)
+
+            counts[bin_index] += 1
+            lengths[bin_index] += length
+
+    def line_details_attributes(self, line_orientations, unit, interval, rounded, from_north):
+        if line_orientations is None:
+            return [NULL, NULL]
+
+        _, end_angle, dispersion = line_orientations
+
+        end_orientation = NULL
+        if end_angle is not None:
+            end_orientation = geometry_utils.convert_angle(end_angle, unit, interval, rounded, from_north)
+
+        return [end_orientation, dispersion]
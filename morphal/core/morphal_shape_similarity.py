@@ -0,0 +1,399 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+    MorphAL: PTM plugin for QGIS
+    --------------
+    Start date           : January 2021
+    Copyright            : (C) 2021, Eric Grosso, PTM
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+import json
+import math
+
+from qgis.core import (
+    QgsFeature,
+    QgsFeatureRequest,
+    QgsFeatureSink,
+    QgsField,
+    QgsFields,
+    QgsProcessing,
+    QgsProcessingException,
+    QgsProcessingParameterBoolean,
+    QgsProcessingParameterFeatureSink,
+    QgsProcessingParameterFeatureSource,
+    QgsProcessingParameterField,
+    QgsProcessingParameterFile,
+    QgsProcessingParameterFileDestination,
+    QgsProcessingParameterNumber,
+    QgsWkbTypes,
+)
+from qgis.PyQt.QtCore import QVariant
+
+from morphal.ptm4qgis_algorithm import PTM4QgisAlgorithm
+
+from .morphal_feature_io import BufferedFeatureSink, prefetch_features
+from .morphal_kdtree import KDTree
+from .utils import LayerRenamer
+
+
+class MorphALShapeSimilarity(PTM4QgisAlgorithm):
+    INPUT_LAYER = "INPUT_LAYER"
+    DESCRIPTOR_FIELDS = "DESCRIPTOR_FIELDS"
+    STANDARDIZE = "STANDARDIZE"
+    INDEX_INPUT = "INDEX_INPUT"
+    QUERY_LAYER = "QUERY_LAYER"
+    NEIGHBORS = "NEIGHBORS"
+    OUTPUT = "OUTPUT"
+    INDEX_OUTPUT = "INDEX_OUTPUT"
+
+    def help(self):
+        return self.tr("\
+            This algorithm finds, for each feature of a query layer, the most similar features\
+            of an indexed layer, based on descriptor fields: morphological indicators (e.g. the\
+            outputs of the polygon indicators algorithm) and/or Fourier descriptors (JSON arrays).\
+            \nDescriptors are indexed in a k-d tree, optionally after standardisation of each\
+            descriptor (z-score), so that the nearest features (euclidean distance between\
+            descriptors) are found without comparing all pairs of features. The index can be\
+            saved to a file, and loaded back later on instead of the indexed layer.\
+            \nIf no query layer is given, the features of the indexed layer are queried (each\
+            feature being excluded from its own results if the index is built from the indexed layer,\
+            and not loaded); selected features can be used as queries.\
+            \nThe output table holds, for each query feature (QUERY_FID) and each rank (RANK), the\
+            id of the similar feature (MATCH_FID) and the distance between their descriptors\
+            (DISTANCE). Features with null or incomplete descriptors are ignored.")
+
+    def __init__(self):
+        super().__init__()
+
+    def initAlgorithm(self, config):
+        self.addParameter(
+            QgsProcessingParameterFeatureSource(
+                self.INPUT_LAYER,
+                self.tr("Indexed layer"),
+                types=[QgsProcessing.TypeVector],
+                optional=True,
+            )
+        )
+
+        self.addParameter(
+            QgsProcessingParameterField(
+                self.DESCRIPTOR_FIELDS,
+                self.tr("Descriptor fields (numbers or JSON arrays of numbers)"),
+                parentLayerParameterName=self.INPUT_LAYER,
+                allowMultiple=True,
+                optional=True,
+            )
+        )
+
+        self.addParameter(
+            QgsProcessingParameterBoolean(
+                self.STANDARDIZE,
+                self.tr("Standardise descriptors"),
+                defaultValue=True,
+            )
+        )
+
+        self.addParameter(
+            QgsProcessingParameterFile(
+                self.INDEX_INPUT,
+                self.tr("Existing index (instead of the indexed layer)"),
+                optional=True,
+                fileFilter=self.tr("Index files (*.kdtree)"),
+            )
+        )
+
+        self.addParameter(
+            QgsProcessingParameterFeatureSource(
+                self.QUERY_LAYER,
+                self.tr("Query layer (by default, the indexed layer)"),
+                types=[QgsProcessing.TypeVector],
+                optional=True,
+            )
+        )
+
+        self.addParameter(
+            QgsProcessingParameterNumber(
+                self.NEIGHBORS,
+                self.tr("Number of similar features"),
+                type=QgsProcessingParameterNumber.Integer,
+                minValue=1,
+                defaultValue=5,
+            )
+        )
+
+        self.addParameter(
+            QgsProcessingParameterFeatureSink(
+                self.OUTPUT,
+                self.tr("Similar features"),
+                type=QgsProcessing.TypeVector
+            )
+        )
+
+        self.addParameter(
+            QgsProcessingParameterFileDestination(
+                self.INDEX_OUTPUT,
+                self.tr("Saved index"),
+                fileFilter=self.tr("Index files (*.kdtree)"),
+                optional=True,
+                createByDefault=False,
+            )
+        )
+
+    def name(self):
+        return "shape_similarity"
+
+    def displayName(self):
+        return self.tr("Shape similarity search")
+
+    def processAlgorithm(self, parameters, context, feedback):
+        # input / source
+        source = self.parameterAsSource(parameters, self.INPUT_LAYER, context)
+        index_input = self.parameterAsFile(parameters, self.INDEX_INPUT, context)
+        query_source = self.parameterAsSource(parameters, self.QUERY_LAYER, context)
+
+        if source is None and not index_input:
+            feedback.reportError(
+                self.tr("An indexed layer or an existing index is required")
+            )
+            return {}
+
+        if query_source is None and source is None:
+            feedback.reportError(
+                self.tr("A query layer is required with an existing index")
+            )
+            return {}
+
+        # other parameters
+        neighbors = self.parameterAsInt(parameters, self.NEIGHBORS, context)
+        standardize = self.parameterAsBoolean(parameters, self.STANDARDIZE, context)
+        index_output = self.parameterAsFileOutput(parameters, self.INDEX_OUTPUT, context)
+
+        # index
+        if index_input:
+            try:
+                tree = KDTree.load(index_input)
+            except (OSError, ValueError) as e:
+                raise QgsProcessingException(
+                    self.tr("The index can not be loaded: {}").format(e)
+                )
+            if not self.valid_metadata(tree.metadata, tree.dimension):
+                raise QgsProcessingException(
+                    self.tr("The index can not be loaded: {} is not a valid index file").format(index_input)
+                )
+            feedback.pushInfo(self.tr("Index of {} features loaded").format(len(tree)))
+        else:
+            descriptor_fields = self.parameterAsFields(parameters, self.DESCRIPTOR_FIELDS, context)
+            if not descriptor_fields:
+                feedback.reportError(
+                    self.tr("At least one descriptor field is required to build the index")
+                )
+                return {}
+
+            tree = self.build_index(source, descriptor_fields, standardize, feedback)
+            if tree is None:
+                return {}
+
+        metadata = tree.metadata
+
+        # query: the ids of the query features are only comparable to the ids
+        # of the index if it has been built from the same layer in this run
+        exclude_self = query_source is None and not index_input
+        if query_source is None:
+            query_source = source
+
+        query_indices = [query_source.fields().lookupField(name) for name in metadata["fields"]]
+        if min(query_indices) < 0:
+            feedback.reportError(
+                self.tr("The query layer doesn't contain the descriptor fields: {}").format(
+                    ", ".join(metadata["fields"])
+                )
+            )
+            return {}
+
+        fields = QgsFields()
+        fields.append(QgsField("QUERY_FID", QVariant.LongLong))
+        fields.append(QgsField("RANK", QVariant.Int))
+        fields.append(QgsField("MATCH_FID", QVariant.LongLong))
+        fields.append(QgsField("DISTANCE", QVariant.Double))
+
+        (sink, dest_id) = self.parameterAsSink(
+            parameters,
+            self.OUTPUT,
+            context,
+            fields,
+            QgsWkbTypes.NoGeometry,
+            query_source.sourceCrs(),
+        )
+        if sink is None:
+            raise QgsProcessingException(
+                self.invalidSinkError(parameters, self.OUTPUT)
+            )
+
+        request = QgsFeatureRequest()
+        request.setFlags(QgsFeatureRequest.NoGeometry)
+        request.setSubsetOfAttributes(query_indices)
+
+        ignored = 0
+        features = prefetch_features(query_source.getFeatures(request), feedback)
+        total = 50.0 / query_source.featureCount() if query_source.featureCount() else 0
+        with BufferedFeatureSink(sink, background=True) as writer:
+            for current, f in enumerate(features):
+                if feedback.isCanceled():
+                    return {}
+
+                vector = self.descriptor_vector(f, query_indices, metadata)
+                if vector is None or len(vector) != tree.dimension:
+                    ignored += 1
+                    continue
+
+                exclude_id = f.id() if exclude_self else None
+                for rank, (distance, match_fid) in enumerate(tree.query(vector, neighbors, exclude_id)):
+                    feat = QgsFeature()
+                    feat.setAttributes([f.id(), rank + 1, match_fid, distance])
+                    writer.addFeature(feat, QgsFeatureSink.FastInsert)
+
+                feedback.setProgress(50 + int(current * total))
+
+        if ignored:
+            feedback.pushInfo(
+                self.tr("{} query features without valid descriptors have been ignored").format(ignored)
+            )
+
+        if index_output:
+            tree.save(index_output)
+
+        # rename output layer
+        global similarity_renamer
+
+        similarity_renamer = LayerRenamer(f'{query_source.sourceName()}-{self.tr("Similar_features")}')
+        context.layerToLoadOnCompletionDetails(
+            dest_id).setPostProcessor(similarity_renamer)
+
+        results = {self.OUTPUT: dest_id}
+        if index_output:
+            results[self.INDEX_OUTPUT] = index_output
+
+        return results
+
+    def build_index(self, source, descriptor_fields, standardize, feedback):
+        indices = [source.fields().lookupField(name) for name in descriptor_fields]
+        metadata = {
+            "fields": list(descriptor_fields),
+            "mean": None,
+            "std": None,
+        }
+
+        request = QgsFeatureRequest()
+        request.setFlags(QgsFeatureRequest.NoGeometry)
+        request.setSubsetOfAttributes(indices)
+
+        vectors = []
+        ids = []
+        ignored = 0
+        features = prefetch_features(source.getFeatures(request), feedback)
+        total = 40.0 / source.featureCount() if source.featureCount() else 0
+        for current, f in enumerate(features):
+            if feedback.isCanceled():
+                return None
+
+            vector = self.descriptor_vector(f, indices, metadata)
+            if vector is None or (vectors and len(vector) != len(vectors[0])):
+                ignored += 1
+                continue
+
+            vectors.append(vector)
+            ids.append(f.id())
+
+            feedback.setProgress(int(current * total))
+
+        if ignored:
+            feedback.pushInfo(
+                self.tr("{} features without valid descriptors have not been indexed").format(ignored)
+            )
+
+        if not vectors:
+            feedback.reportError(
+                self.tr("No feature with valid descriptors: no index built")
+            )
+            return None
+
+        if standardize:
+            dimension = len(vectors[0])
+            mean = [sum(vector[d] for vector in vectors) / len(vectors) for d in range(dimension)]
+            std = []
+            for d in range(dimension):
+                variance = sum((vector[d] - mean[d]) ** 2 for vector in vectors) / len(vectors)
+                # constant descriptors are only centred
+                std.append(math.sqrt(variance) if variance > 0 else 1.0)
+
+            metadata["mean"] = mean
+            metadata["std"] = std
+            vectors = [[(vector[d] - mean[d]) / std[d] for d in range(dimension)] for vector in vectors]
+
+        feedback.pushInfo(self.tr("Building the index of {} features").format(len(ids)))
+        tree = KDTree(vectors, ids, metadata=metadata)
+        feedback.setProgress(50)
+
+        return tree
+
+    def valid_metadata(self, metadata, dimension):
+        # metadata of a loaded index: descriptor fields and standardisation parameters
+        if not isinstance(metadata, dict) or not isinstance(metadata.get("fields"), list):
+            return False
+        if not metadata["fields"] or not all(isinstance(name, str) for name in metadata["fields"]):
+            return False
+        for name in ("mean", "std"):
+            values = metadata.get(name)
+            if values is None:
+                continue
+            if not isinstance(values, list) or len(values) != dimension:
+                return False
+            if not all(isinstance(value, (int, float)) and math.isfinite(value) for value in values):
+                return False
+            if name == "std" and min(values) <= 0:
+                return False
+        return (metadata.get("mean") is None) == (metadata.get("std") is None)
+
+    def descriptor_vector(self, feature, indices, metadata):
+        # numbers and JSON arrays of numbers concatenated, standardised if needed
+        vector = []
+        for index in indices:
+            value = feature.attribute(index)
+            if isinstance(value, QVariant) and value.isNull():
+                return None
+            if value is None:
+                return None
+
+            if isinstance(value, str):
+                try:
+                    values = json.loads(value)
+                except ValueError:
+                    return None
+                if not isinstance(values, list):
+                    values = [values]
+            else:
+                values = [value]
+
+            try:
+                vector.extend(float(v) for v in values)
+            except (TypeError, ValueError):
+                return None
+
+        # JSON and numeric fields may hold NaN or infinite values
+        if not all(math.isfinite(v) for v in vector):
+            return None
+
+        if metadata["mean"] is not None and len(vector) == len(metadata["mean"]):
+            vector = [(v - m) / s for v, m, s in zip(vector, metadata["mean"], metadata["std"])]
+
+        return vector
@@ -0,0 +1,438 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+    MorphAL: PTM plugin for QGIS
+    --------------
+    Start date           : January 2021
+    Copyright            : (C) 2021, Eric Grosso, PTM
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+import math
+from array import array
+
+from qgis.core import (
+    NULL,
+    QgsFeature,
+    QgsFeatureRequest,
+    QgsFeatureSink,
+    QgsField,
+    QgsFields,
+    QgsGeometry,
+    QgsProcessing,
+    QgsProcessingException,
+    QgsProcessingParameterEnum,
+    QgsProcessingParameterFeatureSink,
+    QgsProcessingParameterFeatureSource,
+    QgsProcessingParameterField,
+    QgsProcessingParameterNumber,
+    QgsProcessingUtils,
+    QgsSpatialIndex,
+    QgsWkbTypes,
+)
+from qgis.PyQt.QtCore import QVariant
+
+from morphal.ptm4qgis_algorithm import PTM4QgisAlgorithm
+
+from .morphal_autocorrelation import SpatialWeights, local_moran, moran
+from .morphal_feature_io import BufferedFeatureSink, numeric_attributes, prefetch_features
+from .morphal_kdtree import KDTree
+from .utils import LayerRenamer, round_float_to_5_decimals
+
+
+class MorphALSpatialAutocorrelation(PTM4QgisAlgorithm):
+    INPUT_LAYER = "INPUT_LAYER"
+    INDICATOR_FIELDS = "INDICATOR_FIELDS"
+    WEIGHTS_METHOD = "WEIGHTS_METHOD"
+    NEIGHBORS = "NEIGHBORS"
+    PERMUTATIONS = "PERMUTATIONS"
+    SEED = "SEED"
+    OUTPUT_LAYER = "OUTPUT_LAYER"
+    GLOBAL_OUTPUT = "GLOBAL_OUTPUT"
+
+    def help(self):
+        return self.tr("\
+            This algorithm measures the spatial autocorrelation of numeric indicator fields (e.g. the\
+            outputs of the polygon indicators algorithm), i.e. whether similar values are spatially\
+            clustered.\
+            \nSpatial weights are based either on contiguity (polygons sharing at least a point of\
+            their boundary, found with a spatial index), or on the K nearest neighbours of each feature\
+            (nearest centroids, found with a k-d tree). Weights are row-standardised and stored in\
+            compact sparse arrays.\
+            \nFor each indicator field, the output layer holds the local Moran's I of each feature\
+            (<field>_LISA), its pseudo p-value (<field>_P) and its quadrant in the Moran scatterplot\
+            (<field>_Q: 1 for high-high, 2 for low-high, 3 for low-low and 4 for high-low).\
+            Optionally, the global Moran's I of each field (MORAN_I), its expected value under the\
+            hypothesis of spatial randomness (EXPECTED_I) and its pseudo p-value (P_SIM) are\
+            computed in a separate table.\
+            \nPseudo p-values are based on random permutations (0 for none), reproducible for a given\
+            seed. Features with a null indicator, or without neighbour, are ignored.")
+
+    def __init__(self):
+        super().__init__()
+        self.weights_methods = [
+            self.tr("Contiguity (polygons)"),
+            self.tr("K nearest neighbours"),
+        ]
+
+    def initAlgorithm(self, config):
+        self.addParameter(
+            QgsProcessingParameterFeatureSource(
+                self.INPUT_LAYER,
+                self.tr("Input layer"),
+                types=[QgsProcessing.TypeVectorAnyGeometry],
+            )
+        )
+
+        self.addParameter(
+            QgsProcessingParameterField(
+                self.INDICATOR_FIELDS,
+                self.tr("Indicator fields"),
+                parentLayerParameterName=self.INPUT_LAYER,
+                type=QgsProcessingParameterField.Numeric,
+                allowMultiple=True,
+            )
+        )
+
+        self.addParameter(
+            QgsProcessingParameterEnum(
+                self.WEIGHTS_METHOD,
+                self.tr("Spatial weights based on"),
+                options=self.weights_methods,
+                defaultValue=0,
+            )
+        )
+
+        self.addParameter(
+            QgsProcessingParameterNumber(
+                self.NEIGHBORS,
+                self.tr("Number of neighbours (K nearest neighbours)"),
+                type=QgsProcessingParameterNumber.Integer,
+                minValue=1,
+                defaultValue=8,
+            )
+        )
+
+        self.addParameter(
+            QgsProcessingParameterNumber(
+                self.PERMUTATIONS,
+                self.tr("Number of permutations"),
+                type=QgsProcessingParameterNumber.Integer,
+                minValue=0,
+                maxValue=9999,
+                defaultValue=99,
+            )
+        )
+
+        self.addParameter(
+            QgsProcessingParameterNumber(
+                self.SEED,
+                self.tr("Random seed"),
+                type=QgsProcessingParameterNumber.Integer,
+                minValue=0,
+                defaultValue=0,
+            )
+        )
+
+        self.addSlimOutputParameters(self.INPUT_LAYER)
+
+        self.addParameter(
+            QgsProcessingParameterFeatureSink(
+                self.OUTPUT_LAYER,
+                self.tr("Local spatial autocorrelation"),
+                type=QgsProcessing.TypeVector
+            )
+        )
+
+        self.addParameter(
+            QgsProcessingParameterFeatureSink(
+                self.GLOBAL_OUTPUT,
+                self.tr("Global spatial autocorrelation"),
+                type=QgsProcessing.TypeVector,
+                optional=True,
+                createByDefault=False
+            )
+        )
+
+    def name(self):
+        return "spatial_autocorrelation"
+
+    def displayName(self):
+        return self.tr("Spatial autocorrelation of indicators (Moran's I / LISA)")
+
+    def processAlgorithm(self, parameters, context, feedback):
+        # input / source
+        source = self.parameterAsSource(parameters, self.INPUT_LAYER, context)
+        if source is None:
+            raise QgsProcessingException(
+                self.invalidSourceError(parameters, self.INPUT_LAYER)
+            )
+
+        if source.featureCount() == 0:
+            feedback.reportError(
+                self.tr("The layer doesn't contain any feature: no output provided")
+            )
+            return {}
+
+        # other parameters
+        indicator_fields = self.parameterAsFields(parameters, self.INDICATOR_FIELDS, context)
+        if not indicator_fields:
+            feedback.reportError(self.tr("At least one indicator field is required"))
+            return {}
+        indices = [source.fields().lookupField(name) for name in indicator_fields]
+
+        weights_method = self.parameterAsEnum(parameters, self.WEIGHTS_METHOD, context)
+        neighbors = self.parameterAsInt(parameters, self.NEIGHBORS, context)
+        permutations = self.parameterAsInt(parameters, self.PERMUTATIONS, context)
+        seed = self.parameterAsInt(parameters, self.SEED, context)
+
+        if weights_method == 0 and QgsWkbTypes.geometryType(source.wkbType()) != QgsWkbTypes.PolygonGeometry:
+            feedback.reportError(self.tr("Contiguity weights require a polygon layer"))
+            return {}
+
+        source_attributes = self.parameterAsSourceAttributes(parameters, source, context)
+
+        # output
+        fields = source_attributes.fields()
+
+        new_fields = QgsFields()
+        for name in indicator_fields:
+            new_fields.append(QgsField(f"{name}_LISA", QVariant.Double))
+            new_fields.append(QgsField(f"{name}_P", QVariant.Double))
+            new_fields.append(QgsField(f"{name}_Q", QVariant.Int))
+
+        fields = QgsProcessingUtils.combineFields(fields, new_fields)
+
+        (sink, dest_id) = self.parameterAsSink(
+            parameters,
+            self.OUTPUT_LAYER,
+            context,
+            fields,
+            source.wkbType(),
+            source.sourceCrs(),
+        )
+        if sink is None:
+            raise QgsProcessingException(
+                self.invalidSinkError(parameters, self.OUTPUT_LAYER))
+
+        global_fields = QgsFields()
+        global_fields.append(QgsField("FIELD", QVariant.String))
+        global_fields.append(QgsField("MORAN_I", QVariant.Double))
+        global_fields.append(QgsField("EXPECTED_I", QVariant.Double))
+        global_fields.append(QgsField("P_SIM", QVariant.Double))
+        global_fields.append(QgsField("COUNT", QVariant.LongLong))
+
+        (global_sink, global_dest_id) = self.parameterAsSink(
+            parameters,
+            self.GLOBAL_OUTPUT,
+            context,
+            global_fields,
+            QgsWkbTypes.NoGeometry,
+            source.sourceCrs(),
+        )
+
+        # process: the features with non null indicators are numbered in a
+        # first pass (their values being stored in compact arrays), the
+        # spatial weights are built on these numbers, then the statistics are
+        # computed field by field before the output pass
+        request = QgsFeatureRequest()
+        request.setSubsetOfAttributes(indices)
+
+        ids = array("q")
+        values = [array("d") for _ in indices]
+        index = QgsSpatialIndex() if weights_method == 0 else None
+        geometries = []
+        centroids = []
+
+        features = prefetch_features(source.getFeatures(request), feedback)
+        total = 20.0 / source.featureCount() if source.featureCount() else 0
+        for current, f in enumerate(features):
+            if feedback.isCanceled():
+                return {}
+
+            feedback.setProgress(int(current * total))
+
+            if not f.hasGeometry() or f.geometry().isEmpty():
+                continue
+
+            vector = numeric_attributes(f, indices)
+            if vector is None:
+                continue
+
+            geometry = f.geometry()
+            if weights_method == 0:
+                index.addFeature(len(ids), geometry.boundingBox())
+                geometries.append(geometry)
+            else:
+                centroid = geometry.centroid()
+                if centroid.isNull() or centroid.isEmpty():
+                    continue
+                point = centroid.asPoint()
+                centroids.append((point.x(), point.y()))
+
+            ids.append(f.id())
+            for field_values, value in zip(values, vector):
+                field_values.append(value)
+
+        if len(ids) < 3:
+            feedback.reportError(
+                self.tr("Less than three features with non null indicators: no output provided")
+            )
+            return {}
+
+        if weights_method == 0:
+            weights = self.contiguity_weights(index, geometries, feedback)
+        else:
+            weights = self.knn_weights(centroids, neighbors, feedback)
+        index = None
+        geometries = None
+        centroids = None
+        if weights is None:
+            return {}
+
+        islands = weights.islands()
+        if islands:
+            feedback.pushInfo(self.tr("{} features without neighbour").format(islands))
+
+        # statistics
+        local_results = []
+        global_results = []
+        for field_index, name in enumerate(indicator_fields):
+            if feedback.isCanceled():
+                return {}
+
+            feedback.pushInfo(self.tr("Spatial autocorrelation of {}").format(name))
+
+            local_result = local_moran(values[field_index], weights, permutations, seed)
+            if local_result is None:
+                feedback.pushInfo(self.tr("{} is constant: no spatial autocorrelation computed").format(name))
+            local_results.append(local_result)
+
+            if global_sink is not None:
+                global_results.append(moran(values[field_index], weights, permutations, seed))
+
+            feedback.setProgress(40 + int(40.0 * (field_index + 1) / len(indicator_fields)))
+
+        positions = {fid: position for position, fid in enumerate(ids)}
+
+        features = prefetch_features(source.getFeatures(source_attributes.request(indices)), feedback)
+        total = 20.0 / source.featureCount() if source.featureCount() else 0
+        with BufferedFeatureSink(sink, background=True) as writer:
+            for current, f in enumerate(features):
+                if feedback.isCanceled():
+                    return {}
+
+                out_feat = f
+                attrs = source_attributes.attributes(f)
+
+                position = positions.get(f.id())
+                if position is not None:
+                    for local_result in local_results:
+                        attrs.extend(self.local_attributes(local_result, position, weights))
+
+                # ensure consistent count of attributes - otherwise null
+                # geometry features will have incorrect attribute length
+                # and provider may reject them
+                if len(attrs) < len(fields):
+                    attrs += [NULL] * (len(fields) - len(attrs))
+
+                out_feat.setAttributes(attrs)
+                writer.addFeature(out_feat, QgsFeatureSink.FastInsert)
+
+                feedback.setProgress(80 + int(current * total))
+
+        if global_sink is not None:
+            with BufferedFeatureSink(global_sink, background=True) as global_writer:
+                for name, global_result in zip(indicator_fields, global_results):
+                    feat = QgsFeature()
+                    if global_result is None:
+                        feat.setAttributes([name, NULL, NULL, NULL, len(ids)])
+                    else:
+                        moran_i, expected_i, p_sim = global_result
+                        feat.setAttributes([
+                            name,
+                            round_float_to_5_decimals(moran_i),
+                            round_float_to_5_decimals(expected_i),
+                            NULL if p_sim is None else round_float_to_5_decimals(p_sim),
+                            len(ids),
+                        ])
+                    global_writer.addFeature(feat, QgsFeatureSink.FastInsert)
+
+        # rename output layers
+        global lisa_renamer, moran_renamer
+
+        lisa_renamer = LayerRenamer(f'{source.sourceName()}-{self.tr("LISA")}')
+        context.layerToLoadOnCompletionDetails(
+            dest_id).setPostProcessor(lisa_renamer)
+
+        results = {self.OUTPUT_LAYER: dest_id}
+
+        if global_sink is not None:
+            moran_renamer = LayerRenamer(f'{source.sourceName()}-{self.tr("Moran_I")}')
+            context.layerToLoadOnCompletionDetails(
+                global_dest_id).setPostProcessor(moran_renamer)
+
+            results[self.GLOBAL_OUTPUT] = global_dest_id
+
+        return results
+
+    def contiguity_weights(self, index, geometries, feedback):
+        # pairs of intersecting polygons, candidates given by the spatial index,
+        # each pair being tested once
+        firsts = array("q")
+        seconds = array("q")
+
+        total = 20.0 / len(geometries) if geometries else 0
+        for i, geometry in enumerate(geometries):
+            if feedback.isCanceled():
+                return None
+
+            candidates = [j for j in index.intersects(geometry.boundingBox()) if j > i]
+            if candidates:
+                engine = QgsGeometry.createGeometryEngine(geometry.constGet())
+                engine.prepareGeometry()
+                for j in candidates:
+                    if engine.intersects(geometries[j].constGet()):
+                        firsts.append(i)
+                        seconds.append(j)
+
+            feedback.setProgress(20 + int(i * total))
+
+        return SpatialWeights.from_pairs(len(geometries), firsts, seconds)
+
+    def knn_weights(self, centroids, neighbors, feedback):
+        tree = KDTree(centroids, range(len(centroids)))
+
+        rows = []
+        total = 20.0 / len(centroids) if centroids else 0
+        for i, centroid in enumerate(centroids):
+            if feedback.isCanceled():
+                return None
+
+            rows.append(sorted(j for _, j in tree.query(centroid, neighbors, exclude_id=i)))
+
+            feedback.setProgress(20 + int(i * total))
+
+        return SpatialWeights.from_rows(rows)
+
+    def local_attributes(self, local_result, position, weights):
+        # LISA, pseudo p-value and quadrant, null if not defined
+        if local_result is None or weights.cardinality(position) == 0:
+            return [NULL, NULL, NULL]
+
+        lisa, p_values, quadrants = local_result
+        p_value = p_values[position]
+        return [
+            round_float_to_5_decimals(lisa[position]),
+            NULL if math.isnan(p_value) else round_float_to_5_decimals(p_value),
+            quadrants[position],
+        ]
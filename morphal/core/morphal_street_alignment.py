@@ -0,0 +1,334 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+    MorphAL: PTM plugin for QGIS
+    --------------
+    Start date           : January 2021
+    Copyright            : (C) 2021, Eric Grosso, PTM
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+import math
+from array import array
+
+from qgis.core import (
+    NULL,
+    QgsDistanceArea,
+    QgsFeatureRequest,
+    QgsFeatureSink,
+    QgsField,
+    QgsFields,
+    QgsPointXY,
+    QgsProcessing,
+    QgsProcessingException,
+    QgsProcessingParameterDistance,
+    QgsProcessingParameterEnum,
+    QgsProcessingParameterFeatureSink,
+    QgsProcessingParameterFeatureSource,
+    QgsProcessingUtils,
+    QgsRectangle,
+    QgsSpatialIndex,
+    QgsWkbTypes,
+)
+from qgis.PyQt.QtCore import QVariant
+
+from morphal.ptm4qgis_algorithm import PTM4QgisAlgorithm
+
+from . import morphal_geometry_utils as geometry_utils
+from .morphal_feature_io import BufferedFeatureSink, prefetch_features
+from .morphal_inscribed_circle import segment_distance
+from .utils import LayerRenamer, round_float_to_3_decimals, round_float_to_5_decimals
+
+# number of candidate segments first given by the spatial index
+NEAREST_CANDIDATES = 4
+
+
+class MorphALStreetAlignment(PTM4QgisAlgorithm):
+    INPUT_LAYER = "INPUT_LAYER"
+    STREET_LAYER = "STREET_LAYER"
+    ORIENTATION_METHOD = "ORIENTATION_METHOD"
+    MAX_DISTANCE = "MAX_DISTANCE"
+    OUTPUT_LAYER = "OUTPUT_LAYER"
+
+    def help(self):
+        return self.tr("\
+            This algorithm computes the orientation of the polygons of a layer (e.g. buildings)\
+            relatively to the nearest segment of a street network (frontage alignment).\
+            \nFor each polygon, the nearest street segment of its centroid is found, and the\
+            polygon orientation (BLD_ORIENT), the orientation of the street segment (STREET_ORIENT),\
+            their difference (ORIENT_DIFF, in degrees between 0 and 90), the distance from the\
+            centroid to the street segment (STREET_DIST) and the id of the street (STREET_FID) are\
+            computed. Orientations are in degrees comparatively to the cartographic East, between\
+            0 and 180 degrees.\
+            \nPolygon orientations are based on the minimum bounding rectangle of the polygons (i.e.\
+            the orientation of their median segment), or on their second moments.\
+            \nThe street network is exploded into segments indexed once in a spatial index: the nearest\
+            candidates given by the index are refined with exact distances. Optionally, streets farther\
+            than a maximum distance are ignored (0 for no limit).")
+
+    def __init__(self):
+        super().__init__()
+        self.distance_area = None
+        self.orientation_methods = [
+            self.tr("Minimum bounding rectangle"),
+            self.tr("Second moments"),
+        ]
+
+    def initAlgorithm(self, config):
+        self.addParameter(
+            QgsProcessingParameterFeatureSource(
+                self.INPUT_LAYER,
+                self.tr("Input layer"),
+                types=[QgsProcessing.TypeVectorPolygon],
+            )
+        )
+
+        self.addParameter(
+            QgsProcessingParameterFeatureSource(
+                self.STREET_LAYER,
+                self.tr("Street layer"),
+                types=[QgsProcessing.TypeVectorLine],
+            )
+        )
+
+        self.addParameter(
+            QgsProcessingParameterEnum(
+                self.ORIENTATION_METHOD,
+                self.tr("Orientations based on"),
+                options=self.orientation_methods,
+                defaultValue=0,
+            )
+        )
+
+        self.addParameter(
+            QgsProcessingParameterDistance(
+                self.MAX_DISTANCE,
+                self.tr("Maximum distance to the streets (0 for no limit)"),
+                parentParameterName=self.INPUT_LAYER,
+                minValue=0.0,
+                defaultValue=0.0,
+            )
+        )
+
+        self.addSlimOutputParameters(self.INPUT_LAYER)
+
+        self.addParameter(
+            QgsProcessingParameterFeatureSink(
+                self.OUTPUT_LAYER,
+                self.tr("Street alignment"),
+                type=QgsProcessing.TypeVectorPolygon
+            )
+        )
+
+    def name(self):
+        return "street_alignment"
+
+    def displayName(self):
+        return self.tr("Orientation relatively to the nearest street")
+
+    def processAlgorithm(self, parameters, context, feedback):
+        # input / source
+        source = self.parameterAsSource(parameters, self.INPUT_LAYER, context)
+        if source is None:
+            raise QgsProcessingException(
+                self.invalidSourceError(parameters, self.INPUT_LAYER)
+            )
+
+        street_source = self.parameterAsSource(parameters, self.STREET_LAYER, context)
+        if street_source is None:
+            raise QgsProcessingException(
+                self.invalidSourceError(parameters, self.STREET_LAYER)
+            )
+
+        wkb_type = source.wkbType()
+
+        if QgsWkbTypes.geometryType(wkb_type) != QgsWkbTypes.PolygonGeometry:
+            feedback.reportError("The layer geometry type is different from a polygon")
+            return {}
+
+        if QgsWkbTypes.geometryType(street_source.wkbType()) != QgsWkbTypes.LineGeometry:
+            feedback.reportError("The street layer geometry type is different from a line")
+            return {}
+
+        if source.featureCount() == 0:
+            feedback.reportError(
+                self.tr("The layer doesn't contain any feature: no output provided")
+            )
+            return {}
+
+        # other parameters
+        orientation_method = self.parameterAsEnum(parameters, self.ORIENTATION_METHOD, context)
+        max_distance = self.parameterAsDouble(parameters, self.MAX_DISTANCE, context)
+
+        # lengths of the median segments in the layer CRS
+        self.distance_area = QgsDistanceArea()
+
+        source_attributes = self.parameterAsSourceAttributes(parameters, source, context)
+
+        # output
+        fields = source_attributes.fields()
+
+        new_fields = QgsFields()
+        new_fields.append(QgsField("BLD_ORIENT", QVariant.Double))
+        new_fields.append(QgsField("STREET_ORIENT", QVariant.Double))
+        new_fields.append(QgsField("ORIENT_DIFF", QVariant.Double))
+        new_fields.append(QgsField("STREET_DIST", QVariant.Double))
+        new_fields.append(QgsField("STREET_FID", QVariant.LongLong))
+
+        fields = QgsProcessingUtils.combineFields(fields, new_fields)
+
+        (sink, dest_id) = self.parameterAsSink(
+            parameters,
+            self.OUTPUT_LAYER,
+            context,
+            fields,
+            wkb_type,
+            source.sourceCrs(),
+        )
+        if sink is None:
+            raise QgsProcessingException(
+                self.invalidSinkError(parameters, self.OUTPUT_LAYER))
+
+        # process: the streets are exploded into segments (coordinates in the
+        # CRS of the input layer, stored in compact arrays) and indexed once,
+        # the id of each segment in the spatial index being its position in
+        # the arrays
+        street_request = QgsFeatureRequest()
+        street_request.setSubsetOfAttributes([])
+        street_request.setDestinationCrs(source.sourceCrs(), context.transformContext())
+
+        index = QgsSpatialIndex()
+        segments = array("d")
+        street_fids = array("q")
+
+        features = prefetch_features(street_source.getFeatures(street_request), feedback)
+        total = 30.0 / street_source.featureCount() if street_source.featureCount() else 0
+        for current, f in enumerate(features):
+            if feedback.isCanceled():
+                return {}
+
+            if f.hasGeometry():
+                for _, _, _, p1, p2 in geometry_utils.indexed_segments(f.geometry()):
+                    if p1 == p2:
+                        continue
+                    index.addFeature(
+                        len(street_fids),
+                        QgsRectangle(
+                            min(p1.x(), p2.x()), min(p1.y(), p2.y()),
+                            max(p1.x(), p2.x()), max(p1.y(), p2.y())
+                        )
+                    )
+                    segments.extend((p1.x(), p1.y(), p2.x(), p2.y()))
+                    street_fids.append(f.id())
+
+            feedback.setProgress(int(current * total))
+
+        if not street_fids:
+            feedback.reportError(
+                self.tr("The street layer doesn't contain any segment: no output provided")
+            )
+            return {}
+
+        features = prefetch_features(source.getFeatures(source_attributes.request()), feedback)
+        total = 70.0 / source.featureCount() if source.featureCount() else 0
+        with BufferedFeatureSink(sink, background=True) as writer:
+            for current, f in enumerate(features):
+                if feedback.isCanceled():
+                    return {}
+
+                out_feat = f
+                attrs = source_attributes.attributes(f)
+                in_geom = f.geometry()
+                if in_geom and not in_geom.isEmpty():
+                    attrs.extend(self.street_alignment_attributes(
+                        in_geom, orientation_method, index, segments, street_fids, max_distance
+                    ))
+
+                # ensure consistent count of attributes - otherwise null
+                # geometry features will have incorrect attribute length
+                # and provider may reject them
+                if len(attrs) < len(fields):
+                    attrs += [NULL] * (len(fields) - len(attrs))
+
+                out_feat.setAttributes(attrs)
+                writer.addFeature(out_feat, QgsFeatureSink.FastInsert)
+
+                feedback.setProgress(30 + int(current * total))
+
+        # rename output layer
+        global street_alignment_renamer
+
+        street_alignment_renamer = LayerRenamer(f'{source.sourceName()}-{self.tr("Street_alignment")}')
+        context.layerToLoadOnCompletionDetails(
+            dest_id).setPostProcessor(street_alignment_renamer)
+
+        return {self.OUTPUT_LAYER: dest_id}
+
+    def street_alignment_attributes(self, geom, orientation_method, index, segments, street_fids, max_distance):
+        # polygon orientation and centroid
+        if orientation_method == 1:
+            moments = geometry_utils.second_moments(geom)
+            if moments is None:
+                return []
+            x, y, orientation = moments[0], moments[1], math.degrees(moments[2])
+        else:
+            # orientation of the median segment of the minimum bounding rectangle
+            median_geom, orientation, _, _ = geometry_utils.median_segment(geom, False, self.distance_area)
+            centroid = geom.centroid()
+            if median_geom is None or orientation is None or centroid.isNull() or centroid.isEmpty():
+                return []
+            point = centroid.asPoint()
+            x, y, orientation = point.x(), point.y(), orientation % 180.0
+
+        attributes = [round_float_to_5_decimals(orientation)]
+
+        nearest = self.nearest_segment(index, segments, x, y)
+        if nearest is None or (max_distance > 0 and nearest[1] > max_distance):
+            return attributes
+
+        segment, distance = nearest
+        x0, y0, x1, y1 = segments[4 * segment:4 * segment + 4]
+        street_orientation = math.degrees(math.atan2(y1 - y0, x1 - x0)) % 180.0
+
+        attributes.extend([
+            round_float_to_5_decimals(street_orientation),
+            round_float_to_5_decimals(geometry_utils.orientation_difference(orientation, street_orientation)),
+            round_float_to_3_decimals(distance),
+            street_fids[segment],
+        ])
+        return attributes
+
+    def nearest_segment(self, index, segments, x, y):
+        """
+        Find the nearest segment of a point: the nearest candidates given by
+        the spatial index (by bounding box) are refined with exact distances,
+        then all the segments whose bounding box lies within the best distance
+        are checked, so that the result is exact.
+
+        :return: a tuple (segment position, distance), or None
+        """
+        best = None
+        for i in index.nearestNeighbor(QgsPointXY(x, y), NEAREST_CANDIDATES):
+            candidate = (segment_distance(x, y, *segments[4 * i:4 * i + 4]), i)
+            if best is None or candidate < best:
+                best = candidate
+
+        if best is None:
+            return None
+
+        distance = best[0]
+        for i in index.intersects(QgsRectangle(x - distance, y - distance, x + distance, y + distance)):
+            candidate = (segment_distance(x, y, *segments[4 * i:4 * i + 4]), i)
+            if candidate < best:
+                best = candidate
+
+        return best[1], best[0]
@@ -18,7 +18,9 @@
 """
 
 import itertools
+import json
 import math
+import random
 
 from qgis.core import (
     NULL,
@@ -35,6 +37,7 @@ from qgis.core import (
     QgsProcessingParameterEnum,
     QgsProcessingParameterFeatureSink,
     QgsProcessingParameterFeatureSource,
+    QgsProcessingParameterNumber,
     QgsProcessingUtils,
     QgsWkbTypes,
 )
@@ -43,7 +46,9 @@ from qgis.PyQt.QtCore import QVariant
 from morphal.ptm4qgis_algorithm import PTM4QgisAlgorithm
 
 from . import morphal_geometry_utils as geometry_utils
-from .utils import LayerRenamer, round_float_to_3_decimals
+from .morphal_feature_io import BufferedFeatureSink, prefetch_features
+from .morphal_inscribed_circle import largest_inscribed_circle
+from .utils import LayerRenamer, round_float_to_3_decimals, round_float_to_5_decimals
 
 
 class MorphALPolygonIndicators(PTM4QgisAlgorithm):
@@ -64,15 +69,56 @@ class MorphALPolygonIndicators(PTM4QgisAlgorithm):
     AREA_CONV_DEFECT = "AREA_CONV_DEFECT"
     PERIMETER_CONV_DEFECT = "PERIMETER_CONV_DEFECT"
     RECTANGULAR_DIFFERENCE = "RECTANGULAR_DIFFERENCE"
+    EDGE_ORIENTATION = "EDGE_ORIENTATION"
+    ENCLOSING_CIRCLE = "ENCLOSING_CIRCLE"
+    INSCRIBED_CIRCLE = "INSCRIBED_CIRCLE"
+    INSCRIBED_CIRCLE_PRECISION = "INSCRIBED_CIRCLE_PRECISION"
+    FRACTAL_DIMENSION = "FRACTAL_DIMENSION"
+    FRACTAL_MIN_LEVEL = "FRACTAL_MIN_LEVEL"
+    FRACTAL_MAX_LEVEL = "FRACTAL_MAX_LEVEL"
+    FOURIER_DESCRIPTORS = "FOURIER_DESCRIPTORS"
+    FOURIER_SAMPLES = "FOURIER_SAMPLES"
+    FOURIER_COEFFICIENTS = "FOURIER_COEFFICIENTS"
     OUTPUT_LAYER = "OUTPUT_LAYER"
 
     def help(self):
         # TODO improve help text
-        return self.tr("Compute morphological indicators for polygons")
+        return self.tr("\
+            Compute morphological indicators for polygons.\
+            \nOptionally, indicators of the orientations of the edges of each polygon can be computed,\
+            edges being weighted by their length and their orientations being folded into [0 ; 90[\
+            (perpendicular edges are considered identical): the dominant orientation (EDGE_ORIENT, in\
+            degrees from East), the normalised entropy of the orientations (ORIENT_ENTROPY, 0 for a\
+            single orientation, 1 for uniform orientations) and the orthogonality (ORTHOGONALITY, 1\
+            if all edges are parallel or perpendicular).\
+            \nOptionally, the minimum enclosing circle of each polygon can be computed (Welzl's algorithm\
+            on the vertices of its convex hull), in the layer (or project) CRS: its radius (MEC_RADIUS),\
+            the ratio between the area of the polygon and the area of the circle (MEC_RATIO) and the\
+            distance between the centre of the circle and the centroid of the polygon, divided by the\
+            radius (MEC_OFFSET).\
+            \nOptionally, the largest inscribed circle of each polygon (pole of inaccessibility) can be\
+            computed with a given precision, in the layer (or project) CRS: its radius (LIC_RADIUS),\
+            i.e. the thickness of the polygon, the elongation area / (2 x radius)² (LIC_ELONG, equal\
+            to length / width for a rectangle) and the compactness circle area / area (LIC_COMP).\
+            \nOptionally, the fractal dimension of the boundary of each polygon (FRACTAL_DIM) can be\
+            estimated by box counting, the extent of the polygon being divided into 2^k x 2^k boxes\
+            for each level k between a minimum and a maximum level.\
+            \nOptionally, Fourier descriptors of the outer boundary of each polygon can be computed\
+            (FOURIER, as a JSON array): the boundary is resampled into a given number of points equally\
+            spaced along it, and the magnitudes of the coefficients of its discrete Fourier transform\
+            (frequencies -1, 2, -2, 3, -3...) are divided by the magnitude of the first coefficient,\
+            so that descriptors are invariant by translation, rotation, scaling and starting point.\
+            They can be used to cluster polygons by shape.")
 
     def __init__(self):
         super().__init__()
         self.distance_area = None
+        self.rng = None
+        self.inscribed_circle_precision = 0.1
+        self.fractal_min_level = 2
+        self.fractal_max_level = 6
+        self.fourier_coefficients = 16
+        self.fourier_twiddles = None
         self.calc_methods = [
             self.tr("Layer CRS"),
             self.tr("Project CRS"),
@@ -193,6 +239,102 @@ class MorphALPolygonIndicators(PTM4QgisAlgorithm):
             )
         )
 
+        self.addParameter(
+            QgsProcessingParameterBoolean(
+                self.EDGE_ORIENTATION,
+                self.tr("Edge orientations (dominant orientation, entropy and orthogonality)"),
+                defaultValue=False,
+            )
+        )
+
+        self.addParameter(
+            QgsProcessingParameterBoolean(
+                self.ENCLOSING_CIRCLE,
+                self.tr("Minimum enclosing circle (radius, area ratio and centre offset)"),
+                defaultValue=False,
+            )
+        )
+
+        self.addParameter(
+            QgsProcessingParameterBoolean(
+                self.INSCRIBED_CIRCLE,
+                self.tr("Largest inscribed circle (radius, elongation and compactness)"),
+                defaultValue=False,
+            )
+        )
+
+        self.addParameter(
+            QgsProcessingParameterNumber(
+                self.INSCRIBED_CIRCLE_PRECISION,
+                self.tr("Precision of the largest inscribed circle (in layer units)"),
+                type=QgsProcessingParameterNumber.Double,
+                minValue=0.000001,
+                defaultValue=0.1,
+            )
+        )
+
+        self.addParameter(
+            QgsProcessingParameterBoolean(
+                self.FRACTAL_DIMENSION,
+                self.tr("Fractal dimension (box counting)"),
+                defaultValue=False,
+            )
+        )
+
+        self.addParameter(
+            QgsProcessingParameterNumber(
+                self.FRACTAL_MIN_LEVEL,
+                self.tr("Minimum level of the box counting (2^level boxes per side)"),
+                type=QgsProcessingParameterNumber.Integer,
+                minValue=0,
+                maxValue=12,
+                defaultValue=2,
+            )
+        )
+
+        self.addParameter(
+            QgsProcessingParameterNumber(
+                self.FRACTAL_MAX_LEVEL,
+                self.tr("Maximum level of the box counting (2^level boxes per side)"),
+                type=QgsProcessingParameterNumber.Integer,
+                minValue=1,
+                maxValue=12,
+                defaultValue=6,
+            )
+        )
+
+        self.addParameter(
+            QgsProcessingParameterBoolean(
+                self.FOURIER_DESCRIPTORS,
+                self.tr("Fourier descriptors"),
+                defaultValue=False,
+            )
+        )
+
+        self.addParameter(
+            QgsProcessingParameterNumber(
+                self.FOURIER_SAMPLES,
+                self.tr("Number of boundary points resampled for the Fourier descriptors"),
+                type=QgsProcessingParameterNumber.Integer,
+                minValue=8,
+                maxValue=4096,
+                defaultValue=64,
+            )
+        )
+
+        self.addParameter(
+            QgsProcessingParameterNumber(
+                self.FOURIER_COEFFICIENTS,
+                self.tr("Number of Fourier descriptors"),
+                type=QgsProcessingParameterNumber.Integer,
+                minValue=1,
+                maxValue=256,
+                defaultValue=16,
+            )
+        )
+
+        self.addSlimOutputParameters(self.INPUT_LAYER)
+
         self.addParameter(
             QgsProcessingParameterFeatureSink(
                 self.OUTPUT_LAYER, self.tr("Morphological indicators")
@@ -282,8 +424,60 @@ class MorphALPolygonIndicators(PTM4QgisAlgorithm):
             parameters, self.RECTANGULAR_DIFFERENCE, context
         )
 
+        edge_orientation_compute = self.parameterAsBoolean(
+            parameters, self.EDGE_ORIENTATION, context
+        )
+
+        enclosing_circle_compute = self.parameterAsBoolean(
+            parameters, self.ENCLOSING_CIRCLE, context
+        )
+
+        inscribed_circle_compute = self.parameterAsBoolean(
+            parameters, self.INSCRIBED_CIRCLE, context
+        )
+        self.inscribed_circle_precision = self.parameterAsDouble(
+            parameters, self.INSCRIBED_CIRCLE_PRECISION, context
+        )
+
+        fractal_dimension_compute = self.parameterAsBoolean(
+            parameters, self.FRACTAL_DIMENSION, context
+        )
+        self.fractal_min_level = self.parameterAsInt(
+            parameters, self.FRACTAL_MIN_LEVEL, context
+        )
+        self.fractal_max_level = self.parameterAsInt(
+            parameters, self.FRACTAL_MAX_LEVEL, context
+        )
+        if fractal_dimension_compute and self.fractal_max_level <= self.fractal_min_level:
+            feedback.reportError(
+                self.tr("The maximum level of the box counting must be greater than the minimum level")
+            )
+            return {}
+
+        fourier_compute = self.parameterAsBoolean(
+            parameters, self.FOURIER_DESCRIPTORS, context
+        )
+        fourier_samples = self.parameterAsInt(
+            parameters, self.FOURIER_SAMPLES, context
+        )
+        self.fourier_coefficients = self.parameterAsInt(
+            parameters, self.FOURIER_COEFFICIENTS, context
+        )
+        if fourier_compute and self.fourier_coefficients >= fourier_samples - 2:
+            feedback.reportError(
+                self.tr("The number of Fourier descriptors must be lower than the number of resampled points minus 2")
+            )
+            return {}
+
+        # twiddle factors computed once for all the polygons
+        self.fourier_twiddles = None
+        if fourier_compute:
+            self.fourier_twiddles = geometry_utils.fourier_twiddles(fourier_samples)
+
+        source_attributes = self.parameterAsSourceAttributes(parameters, source, context)
+
         # output
-        fields = source.fields()
+        fields = source_attributes.fields()
 
         new_fields = QgsFields()
 
@@ -323,6 +517,27 @@ class MorphALPolygonIndicators(PTM4QgisAlgorithm):
         if rectangular_diff_compute:
             new_fields.append(QgsField("RECT_DIFF", QVariant.Double))
 
+        if edge_orientation_compute:
+            new_fields.append(QgsField("EDGE_ORIENT", QVariant.Double))
+            new_fields.append(QgsField("ORIENT_ENTROPY", QVariant.Double))
+            new_fields.append(QgsField("ORTHOGONALITY", QVariant.Double))
+
+        if enclosing_circle_compute:
+            new_fields.append(QgsField("MEC_RADIUS", QVariant.Double))
+            new_fields.append(QgsField("MEC_RATIO", QVariant.Double))
+            new_fields.append(QgsField("MEC_OFFSET", QVariant.Double))
+
+        if inscribed_circle_compute:
+            new_fields.append(QgsField("LIC_RADIUS", QVariant.Double))
+            new_fields.append(QgsField("LIC_ELONG", QVariant.Double))
+            new_fields.append(QgsField("LIC_COMP", QVariant.Double))
+
+        if fractal_dimension_compute:
+            new_fields.append(QgsField("FRACTAL_DIM", QVariant.Double))
+
+        if fourier_compute:
+            new_fields.append(QgsField("FOURIER", QVariant.String))
+
         fields = QgsProcessingUtils.combineFields(fields, new_fields)
         (sink, dest_id) = self.parameterAsSink(
             parameters, self.OUTPUT_LAYER, context, fields, wkb_type, source.sourceCrs()
@@ -347,45 +562,54 @@ class MorphALPolygonIndicators(PTM4QgisAlgorithm):
                 source.sourceCrs(), context.project().crs(), context.project()
             )
 
-        features = source.getFeatures()
-        total = 100.0 / source.featureCount() if source.featureCount() else 0
-        for current, f in enumerate(features):
-            if feedback.isCanceled():
-                return {}
-
-            out_feat = f
-            attrs = f.attributes()
-            in_geom = f.geometry()
-            if in_geom:
-                if coord_transform is not None:
-                    in_geom.transform(coord_transform)
-
-                attrs.extend(self.polygon_indicators(
-                    in_geom,
-                    perimeter_compute,
-                    area_compute,
-                    schum_compute,
-                    morton_compute,
-                    alt_compacity_compute,
-                    alt_circle_compacity_compute,
-                    gravelius_compute,
-                    miller_compute,
-                    elongation_compute,
-                    area_conv_defect_compute,
-                    perimeter_conv_defect_compute,
-                    rectangular_diff_compute)
-                )
-
-            # ensure consistent count of attributes - otherwise null
-            # geometry features will have incorrect attribute length
-            # and provider may reject them
-            if len(attrs) < len(fields):
-                attrs += [NULL] * (len(fields) - len(attrs))
-
-            out_feat.setAttributes(attrs)
-            sink.addFeature(out_feat, QgsFeatureSink.FastInsert)
+        # seeded shuffling of the minimum enclosing circle, for reproducible runs
+        self.rng = random.Random(0)
 
-            feedback.setProgress(int(current * total))
+        features = prefetch_features(source.getFeatures(source_attributes.request()), feedback)
+        total = 100.0 / source.featureCount() if source.featureCount() else 0
+        with BufferedFeatureSink(sink, background=True) as writer:
+            for current, f in enumerate(features):
+                if feedback.isCanceled():
+                    return {}
+
+                out_feat = f
+                attrs = source_attributes.attributes(f)
+                in_geom = f.geometry()
+                if in_geom:
+                    if coord_transform is not None:
+                        in_geom.transform(coord_transform)
+
+                    attrs.extend(self.polygon_indicators(
+                        in_geom,
+                        perimeter_compute,
+                        area_compute,
+                        schum_compute,
+                        morton_compute,
+                        alt_compacity_compute,
+                        alt_circle_compacity_compute,
+                        gravelius_compute,
+                        miller_compute,
+                        elongation_compute,
+                        area_conv_defect_compute,
+                        perimeter_conv_defect_compute,
+                        rectangular_diff_compute,
+                        edge_orientation_compute,
+                        enclosing_circle_compute,
+                        inscribed_circle_compute,
+                        fractal_dimension_compute,
+                        fourier_compute)
+                    )
+
+                # ensure consistent count of attributes - otherwise null
+                # geometry features will have incorrect attribute length
+                # and provider may reject them
+                if len(attrs) < len(fields):
+                    attrs += [NULL] * (len(fields) - len(attrs))
+
+                out_feat.setAttributes(attrs)
+                writer.addFeature(out_feat, QgsFeatureSink.FastInsert)
+
+                feedback.setProgress(int(current * total))
 
         # rename output layer
         global morph_indicators_renamer
@@ -413,7 +637,12 @@ class MorphALPolygonIndicators(PTM4QgisAlgorithm):
             c_elongation: bool,
             c_area_conv_defect: bool,
             c_perimeter_conv_defect: bool,
-            c_rectangular_diff: bool
+            c_rectangular_diff: bool,
+            c_edge_orientation: bool = False,
+            c_enclosing_circle: bool = False,
+            c_inscribed_circle: bool = False,
+            c_fractal_dimension: bool = False,
+            c_fourier: bool = False
     ):
         indicators = []
         perimeter = self.distance_area.measurePerimeter(polygon)
@@ -501,8 +730,90 @@ class MorphALPolygonIndicators(PTM4QgisAlgorithm):
             rect_diff = round_float_to_3_decimals(rect_diff)
             indicators.append(rect_diff)
 
+        if c_edge_orientation:
+            edge_orientation = geometry_utils.edge_orientation_indicators(polygon)
+            if edge_orientation is None:
+                indicators.extend([NULL, NULL, NULL])
+            else:
+                indicators.extend([round_float_to_3_decimals(value) for value in edge_orientation])
+
+        if c_enclosing_circle:
+            indicators.extend(self.enclosing_circle_indicators(polygon))
+
+        if c_inscribed_circle:
+            indicators.extend(self.inscribed_circle_indicators(polygon))
+
+        if c_fractal_dimension:
+            fractal_dimension = geometry_utils.box_counting_dimension(
+                polygon,
+                self.fractal_min_level,
+                self.fractal_max_level
+            )
+            if fractal_dimension is None:
+                indicators.append(NULL)
+            else:
+                indicators.append(round_float_to_3_decimals(fractal_dimension))
+
+        if c_fourier:
+            descriptors = geometry_utils.fourier_descriptors(
+                polygon,
+                self.fourier_coefficients,
+                self.fourier_twiddles
+            )
+            if descriptors is None:
+                indicators.append(NULL)
+            else:
+                indicators.append(json.dumps([round_float_to_5_decimals(value) for value in descriptors]))
+
         return indicators
 
+    def enclosing_circle_indicators(self, polygon: QgsPolygon):
+        # exterior rings are enough: holes are inside
+        points = [
+            (point.x(), point.y())
+            for rings in geometry_utils.geometry_rings(polygon) if rings
+            for point in rings[0]
+        ]
+        circle = geometry_utils.minimum_enclosing_circle(points, self.rng)
+        moments = geometry_utils.second_moments(polygon)
+        if circle is None or moments is None or circle[2] <= 0:
+            return [NULL, NULL, NULL]
+
+        c_x, c_y, radius = circle
+        ratio = polygon.area() / (math.pi * radius * radius)
+        offset = math.hypot(moments[0] - c_x, moments[1] - c_y) / radius
+
+        return [
+            round_float_to_3_decimals(radius),
+            round_float_to_3_decimals(ratio),
+            round_float_to_3_decimals(offset)
+        ]
+
+    def inscribed_circle_indicators(self, polygon: QgsPolygon):
+        rings = [
+            [(point.x(), point.y()) for point in ring]
+            for rings in geometry_utils.geometry_rings(polygon)
+            for ring in rings
+        ]
+
+        # the centroid is a good first candidate for compact shapes
+        start = None
+        moments = geometry_utils.second_moments(polygon)
+        if moments is not None:
+            start = (moments[0], moments[1])
+
+        circle = largest_inscribed_circle(rings, self.inscribed_circle_precision, start)
+        area = polygon.area()
+        if circle is None or circle[2] <= 0 or area <= 0:
+            return [NULL, NULL, NULL]
+
+        radius = circle[2]
+        return [
+            round_float_to_3_decimals(radius),
+            round_float_to_3_decimals(area / (4 * radius * radius)),
+            round_float_to_3_decimals(math.pi * radius * radius / area)
+        ]
+
 
 def distance_vertices(vertice_1: QgsPoint, vertice_2: QgsPoint, distance_area: QgsDistanceArea):
     seg = geometry_utils.create_normalized_segment(vertice_1, vertice_2)
@@ -17,13 +17,23 @@
  ***************************************************************************/
 """
 
-from qgis.core import QgsProcessingAlgorithm
+from qgis.core import (
+    QgsProcessingAlgorithm,
+    QgsProcessingParameterBoolean,
+    QgsProcessingParameterDefinition,
+    QgsProcessingParameterField,
+)
 from qgis.PyQt.QtCore import QCoreApplication
 
+from morphal.core.morphal_feature_io import SourceAttributes
+
 # from processing.algs.help import shortHelp
 
 
 class PTM4QgisAlgorithm(QgsProcessingAlgorithm):
+    SLIM_OUTPUT = "SLIM_OUTPUT"
+    KEY_FIELD = "KEY_FIELD"
+
     def __init__(self):
         super().__init__()
 
@@ -44,3 +54,30 @@ class PTM4QgisAlgorithm(QgsProcessingAlgorithm):
 
     def createInstance(self):
         return type(self)()
+
+    def addSlimOutputParameters(self, parent_layer_parameter_name):
+        """
+        Add the (advanced) parameters of the slim output mode: only the source
+        feature id and an optional key field are copied to the output.
+        """
+        slim_output = QgsProcessingParameterBoolean(
+            self.SLIM_OUTPUT,
+            self.tr("Slim output (source feature id, key field and computed attributes only)"),
+            defaultValue=False,
+        )
+        slim_output.setFlags(slim_output.flags() | QgsProcessingParameterDefinition.FlagAdvanced)
+        self.addParameter(slim_output)
+
+        key_field = QgsProcessingParameterField(
+            self.KEY_FIELD,
+            self.tr("Key field kept in slim output"),
+            parentLayerParameterName=parent_layer_parameter_name,
+            optional=True,
+        )
+        key_field.setFlags(key_field.flags() | QgsProcessingParameterDefinition.FlagAdvanced)
+        self.addParameter(key_field)
+
+    def parameterAsSourceAttributes(self, parameters, source, context):
+        slim_output = self.parameterAsBoolean(parameters, self.SLIM_OUTPUT, context)
+        key_field = self.parameterAsString(parameters, self.KEY_FIELD, context)
+        return SourceAttributes(source.fields(), slim_output, key_field)
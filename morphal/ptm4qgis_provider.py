@@ -20,12 +20,19 @@
 from qgis.core import QgsProcessingProvider
 
 from morphal.core.geometry_to_medians import MorphALGeometryToMedians
+from morphal.core.morphal_adjacency import MorphALPolygonAdjacency
+from morphal.core.morphal_edge_topology import MorphALPolygonEdgeTopology
 from morphal.core.morphal_geometry_to_segments import MorphALGeometryToSegments
+from morphal.core.morphal_indicator_clustering import MorphALIndicatorClustering
+from morphal.core.morphal_orientation_alignment import MorphALOrientationAlignment
 from morphal.core.morphal_polygon_perimeter_area import MorphALPolygonPerimeterArea
 from morphal.core.morphal_rectangular_characterisation import (
     MorphALRectangularCharacterisation,
 )
 from morphal.core.morphal_segment_orientation import MorphALSegmentOrientation
+from morphal.core.morphal_shape_similarity import MorphALShapeSimilarity
+from morphal.core.morphal_spatial_autocorrelation import MorphALSpatialAutocorrelation
+from morphal.core.morphal_street_alignment import MorphALStreetAlignment
 from morphal.core.polygon_indicators import MorphALPolygonIndicators
 
 
@@ -44,6 +51,13 @@ class PTM4QgisProvider(QgsProcessingProvider):
             MorphALSegmentOrientation(),
             MorphALPolygonIndicators(),
             MorphALRectangularCharacterisation(),
+            MorphALPolygonEdgeTopology(),
+            MorphALShapeSimilarity(),
+            MorphALIndicatorClustering(),
+            MorphALPolygonAdjacency(),
+            MorphALOrientationAlignment(),
+            MorphALStreetAlignment(),
+            MorphALSpatialAutocorrelation(),
         ]
 
     def unload(self):
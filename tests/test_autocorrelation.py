@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+    MorphAL: PTM plugin for QGIS
+    --------------
+    Start date           : January 2021
+    Copyright            : (C) 2021, Eric Grosso, PTM
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+import math
+import random
+
+import pytest
+
+from morphal.core.morphal_autocorrelation import (
+    HIGH_HIGH,
+    LOW_LOW,
+    SpatialWeights,
+    local_moran,
+    moran,
+)
+
+
+def path_weights(count):
+    # observations on a line, each one being contiguous to the next one
+    return SpatialWeights.from_pairs(count, range(count - 1), range(1, count))
+
+
+def test_weights_from_pairs():
+    weights = SpatialWeights.from_pairs(4, [0, 1], [1, 2])
+    assert list(weights.indptr) == [0, 1, 3, 4, 4]
+    assert list(weights.indices) == [1, 0, 2, 1]
+    assert list(weights.weights) == [1.0, 0.5, 0.5, 1.0]
+    assert weights.islands() == 1
+
+
+def test_weights_from_rows():
+    weights = SpatialWeights.from_rows([[1, 2], [0], [0, 1]])
+    assert list(weights.indptr) == [0, 2, 3, 5]
+    assert list(weights.indices) == [1, 2, 0, 0, 1]
+    assert list(weights.lag([3.0, 6.0, 9.0])) == [7.5, 3.0, 4.5]
+    assert weights.islands() == 0
+
+
+def test_moran_hand_computed():
+    # z = [-1.5, -0.5, 0.5, 1.5], lag = [-0.5, -0.5, 0.5, 0.5]:
+    # I = n / S0 * sum(z * lag) / sum(z^2) = 4 / 4 * 2 / 5
+    observed, expected, p_value = moran([1.0, 2.0, 3.0, 4.0], path_weights(4))
+    assert observed == pytest.approx(0.4)
+    assert expected == pytest.approx(-1.0 / 3.0)
+    assert p_value is None
+
+
+def test_moran_matches_dense_formula():
+    rng = random.Random(0)
+    count = 60
+    rows = [rng.sample([j for j in range(count) if j != i], rng.randint(1, 6)) for i in range(count)]
+    values = [rng.gauss(0.0, 1.0) for _ in range(count)]
+
+    mean = sum(values) / count
+    z = [value - mean for value in values]
+    numerator = sum(z[i] * z[j] / len(row) for i, row in enumerate(rows) for j in row)
+    expected_i = count / count * numerator / sum(v * v for v in z)
+
+    observed, _, _ = moran(values, SpatialWeights.from_rows(rows))
+    assert observed == pytest.approx(expected_i)
+
+
+def test_moran_permutations():
+    weights = path_weights(50)
+    values = [float(i) for i in range(50)]
+
+    observed, _, p_value = moran(values, weights, permutations=99, seed=1)
+    assert observed > 0.9
+    assert p_value == pytest.approx(0.01)
+
+    # reproducible for a given seed
+    assert moran(values, weights, permutations=99, seed=1) == (observed, _, p_value)
+
+
+def test_moran_of_constant_values():
+    assert moran([2.0, 2.0, 2.0], path_weights(3)) is None
+    assert local_moran([2.0, 2.0, 2.0], path_weights(3)) is None
+
+
+def test_local_moran_hand_computed():
+    lisa, p_values, quadrants = local_moran([1.0, 2.0, 3.0, 4.0], path_weights(4))
+
+    # z * lag / m2 with m2 = 1.25
+    assert list(lisa) == pytest.approx([0.6, 0.2, 0.2, 0.6])
+    assert list(quadrants) == [LOW_LOW, LOW_LOW, HIGH_HIGH, HIGH_HIGH]
+    assert all(math.isnan(p_value) for p_value in p_values)
+
+    # the local statistics sum to S0 times the global one
+    assert sum(lisa) == pytest.approx(4 * moran([1.0, 2.0, 3.0, 4.0], path_weights(4))[0])
+
+
+def test_local_moran_permutations():
+    count = 40
+    # observation 0 is an island
+    weights = SpatialWeights.from_pairs(count, range(1, count - 1), range(2, count))
+    values = [float(i) for i in range(count)]
+
+    lisa, p_values, quadrants = local_moran(values, weights, permutations=199, seed=3)
+
+    assert math.isnan(p_values[0])
+    assert quadrants[0] == 0
+    assert lisa[0] == 0.0
+    assert all(1.0 / 200.0 <= p_value <= 0.5 + 1.0 / 200.0 for p_value in p_values[1:])
+    # extreme values surrounded by extreme values are significant
+    assert p_values[count - 1] < 0.05
+
+    again = local_moran(values, weights, permutations=199, seed=3)
+    assert list(again[1][1:]) == list(p_values[1:])
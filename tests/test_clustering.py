@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+    MorphAL: PTM plugin for QGIS
+    --------------
+    Start date           : January 2021
+    Copyright            : (C) 2021, Eric Grosso, PTM
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+import random
+import statistics
+
+import pytest
+
+from morphal.core.morphal_clustering import MiniBatchKMeans, RunningStatistics
+
+CENTRES = [(0.0, 0.0), (10.0, 0.0), (0.0, 10.0)]
+
+
+def blobs(count, seed=0):
+    # vectors around the centres, with their labels
+    rng = random.Random(seed)
+    vectors = []
+    labels = []
+    for _ in range(count):
+        label = rng.randrange(len(CENTRES))
+        vectors.append([value + rng.gauss(0.0, 0.5) for value in CENTRES[label]])
+        labels.append(label)
+    return vectors, labels
+
+
+def test_running_statistics():
+    rng = random.Random(0)
+    vectors = [[rng.uniform(-5.0, 5.0), 1e6 + rng.random(), 3.0] for _ in range(500)]
+
+    running = RunningStatistics(3)
+    for vector in vectors:
+        running.add(vector)
+
+    assert running.count == 500
+    for d in range(2):
+        column = [vector[d] for vector in vectors]
+        assert running.mean[d] == pytest.approx(statistics.fmean(column))
+        assert running.std()[d] == pytest.approx(statistics.pstdev(column))
+
+    # constant dimensions are only centred
+    assert running.std()[2] == 1.0
+    assert running.standardize([3.0, running.mean[1], 3.0])[1:] == pytest.approx([0.0, 0.0])
+
+
+def train(vectors, seed, batch_size=100, passes=3):
+    kmeans = MiniBatchKMeans(len(CENTRES), seed)
+    for _ in range(passes):
+        for start in range(0, len(vectors), batch_size):
+            kmeans.partial_fit(vectors[start:start + batch_size])
+    return kmeans
+
+
+def test_separated_clusters_are_found():
+    vectors, labels = blobs(3000)
+    kmeans = train(vectors, seed=0)
+
+    # each centre is close to a distinct true centre
+    matched = set()
+    for centre in kmeans.centres:
+        nearest = min(range(len(CENTRES)), key=lambda i: sum((c - t) ** 2 for c, t in zip(centre, CENTRES[i])))
+        assert centre == pytest.approx(list(CENTRES[nearest]), abs=0.2)
+        matched.add(nearest)
+    assert len(matched) == len(CENTRES)
+
+    # the assignments are consistent with the labels
+    mapping = {}
+    for vector, label in zip(vectors, labels):
+        cluster_id, distance = kmeans.predict(vector)
+        assert mapping.setdefault(cluster_id, label) == label
+        assert distance < 3.0
+
+
+def test_reproducible_for_a_seed():
+    vectors, _ = blobs(500)
+    assert train(vectors, seed=4).centres == train(vectors, seed=4).centres
+
+
+def test_less_distinct_vectors_than_clusters():
+    kmeans = MiniBatchKMeans(5, 0)
+    kmeans.partial_fit([[1.0, 1.0]] * 10 + [[2.0, 2.0]] * 10)
+    assert sorted(kmeans.centres) == [[1.0, 1.0], [2.0, 2.0]]
+    assert kmeans.predict([1.9, 2.0])[0] == kmeans.centres.index([2.0, 2.0])
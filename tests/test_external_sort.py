@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+    MorphAL: PTM plugin for QGIS
+    --------------
+    Start date           : January 2021
+    Copyright            : (C) 2021, Eric Grosso, PTM
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+import random
+
+from morphal.core.morphal_external_sort import ExternalDeduplicator
+
+
+def test_first_record_of_each_key(tmp_path):
+    rng = random.Random(1)
+    records = [((rng.randrange(20), rng.randrange(3)), i) for i in range(200)]
+
+    expected = {}
+    for key, record in records:
+        expected.setdefault(key, record)
+
+    with ExternalDeduplicator(7, str(tmp_path)) as deduplicator:
+        for key, record in records:
+            deduplicator.add(key, record)
+        assert deduplicator.run_count == 200 // 7
+
+        assert list(deduplicator.unique_records()) == sorted(expected.items())
+
+    assert not list(tmp_path.iterdir())
+
+
+def test_in_memory_only(tmp_path):
+    with ExternalDeduplicator(100, str(tmp_path)) as deduplicator:
+        for key, record in [(2, "a"), (1, "b"), (2, "c")]:
+            deduplicator.add(key, record)
+        assert deduplicator.run_count == 0
+
+        assert list(deduplicator.unique_records()) == [(1, "b"), (2, "a")]
+
+
+def test_close_during_merge(tmp_path):
+    deduplicator = ExternalDeduplicator(2, str(tmp_path))
+    for i in range(10):
+        deduplicator.add(i % 5, i)
+
+    records = deduplicator.unique_records()
+    assert next(records) == (0, 0)
+
+    # the run files opened by the merge are closed, then removed
+    deduplicator.close()
+    assert not list(tmp_path.iterdir())
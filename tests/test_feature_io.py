@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+    MorphAL: PTM plugin for QGIS
+    --------------
+    Start date           : January 2021
+    Copyright            : (C) 2021, Eric Grosso, PTM
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+import pytest
+
+pytest.importorskip("qgis.core")
+
+from qgis.core import QgsProcessingException  # noqa: E402
+
+from morphal.core.morphal_feature_io import BufferedFeatureSink  # noqa: E402
+
+
+class FakeSink:
+    """
+    Sink recording the written batches, addFeatures() returning a fixed result.
+    """
+
+    def __init__(self, result):
+        self.result = result
+        self.batches = []
+
+    def addFeatures(self, features, flags=None):  # pylint: disable=invalid-name,unused-argument
+        self.batches.append(list(features))
+        return self.result
+
+    def lastError(self):  # pylint: disable=invalid-name
+        return "write error"
+
+
+@pytest.mark.parametrize("background", [False, True])
+@pytest.mark.parametrize("result", [True, (True, [])])
+def test_batches_are_written(background, result):
+    sink = FakeSink(result)
+    with BufferedFeatureSink(sink, batch_size=2, background=background) as writer:
+        for feature in range(5):
+            writer.addFeature(feature)
+
+    assert sink.batches == [[0, 1], [2, 3], [4]]
+    assert writer.count == 5
+
+
+@pytest.mark.parametrize("background", [False, True])
+@pytest.mark.parametrize("result", [False, (False, [])])
+def test_write_failure_raises(background, result):
+    sink = FakeSink(result)
+    writer = BufferedFeatureSink(sink, batch_size=2, background=background)
+    with pytest.raises(QgsProcessingException, match="write error"):
+        for feature in range(3):
+            writer.addFeature(feature)
+        writer.close()
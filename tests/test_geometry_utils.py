@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+    MorphAL: PTM plugin for QGIS
+    --------------
+    Start date           : January 2021
+    Copyright            : (C) 2021, Eric Grosso, PTM
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+import itertools
+import math
+import random
+
+import pytest
+
+pytest.importorskip("qgis.core")
+
+from qgis.core import QgsWkbTypes  # noqa: E402
+
+from morphal.core import morphal_geometry_utils as geometry_utils  # noqa: E402
+
+
+class Point:
+    def __init__(self, x, y):
+        self._x = x
+        self._y = y
+
+    def x(self):
+        return self._x
+
+    def y(self):
+        return self._y
+
+
+class Polygon:
+    """
+    Single part polygon, with the subset of the QgsGeometry API read by the
+    indicators (rings of points through asPolygon()).
+    """
+
+    def __init__(self, *rings):
+        self.rings = [[Point(x, y) for x, y in ring] for ring in rings]
+
+    def type(self):
+        return QgsWkbTypes.PolygonGeometry
+
+    def isMultipart(self):  # pylint: disable=invalid-name
+        return False
+
+    def asPolygon(self):  # pylint: disable=invalid-name
+        return self.rings
+
+    def isNull(self):  # pylint: disable=invalid-name
+        return False
+
+    def isEmpty(self):  # pylint: disable=invalid-name
+        return not self.rings
+
+
+def test_convex_hull_points():
+    points = [(0.0, 0.0), (1.0, 1.0), (0.5, 0.5), (1.0, 0.0), (0.0, 1.0), (0.2, 0.7), (1.0, 0.0)]
+    assert geometry_utils.convex_hull_points(points) == [(0.0, 0.0), (1.0, 0.0), (1.0, 1.0), (0.0, 1.0)]
+
+
+def test_minimum_enclosing_circle_of_a_square():
+    points = [(0.0, 0.0), (1.0, 0.0), (1.0, 1.0), (0.0, 1.0), (0.5, 0.5)]
+    circle = geometry_utils.minimum_enclosing_circle(points)
+    assert circle == pytest.approx((0.5, 0.5, math.sqrt(2.0) / 2.0))
+
+
+def test_minimum_enclosing_circle_of_a_triangle():
+    # equilateral triangle of side 1: circumradius 1 / sqrt(3)
+    points = [(0.0, 0.0), (1.0, 0.0), (0.5, math.sqrt(3.0) / 2.0)]
+    circle = geometry_utils.minimum_enclosing_circle(points)
+    assert circle == pytest.approx((0.5, math.sqrt(3.0) / 6.0, 1.0 / math.sqrt(3.0)))
+
+    # obtuse triangle: circle on its longest side
+    circle = geometry_utils.minimum_enclosing_circle([(0.0, 0.0), (4.0, 0.0), (2.0, 0.5)])
+    assert circle == pytest.approx((2.0, 0.0, 2.0))
+
+
+def test_minimum_enclosing_circle_of_collinear_points():
+    circle = geometry_utils.minimum_enclosing_circle([(0.0, 0.0), (1.0, 1.0), (3.0, 3.0)])
+    assert circle == pytest.approx((1.5, 1.5, 1.5 * math.sqrt(2.0)))
+    assert geometry_utils.minimum_enclosing_circle([]) is None
+
+
+def brute_force_circle(points):
+    # smallest circle through 2 or 3 of the points containing all the points
+    candidates = [geometry_utils._circle_from_2_points(p, q) for p, q in itertools.combinations(points, 2)]
+    candidates.extend(
+        geometry_utils._circle_from_3_points(p, q, r) for p, q, r in itertools.combinations(points, 3)
+    )
+    return min(
+        (circle for circle in candidates if all(geometry_utils._in_circle(circle, point) for point in points)),
+        key=lambda circle: circle[2]
+    )
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_minimum_enclosing_circle_against_brute_force(seed):
+    rng = random.Random(seed)
+    points = [(rng.uniform(-10.0, 10.0), rng.uniform(-10.0, 10.0)) for _ in range(12)]
+
+    circle = geometry_utils.minimum_enclosing_circle(points, random.Random(seed))
+    assert all(geometry_utils._in_circle(circle, point) for point in points)
+    assert circle == pytest.approx(brute_force_circle(points))
+
+
+def koch_snowflake(iterations):
+    ring = [(0.0, 0.0), (0.5, math.sqrt(3.0) / 2.0), (1.0, 0.0), (0.0, 0.0)]
+    for _ in range(iterations):
+        refined = []
+        for (x0, y0), (x1, y1) in zip(ring, ring[1:]):
+            dx = (x1 - x0) / 3.0
+            dy = (y1 - y0) / 3.0
+            # the apex of the bump is on the left, i.e. outside of a clockwise ring
+            apex = (x0 + 1.5 * dx - dy * math.sqrt(3.0) / 2.0, y0 + 1.5 * dy + dx * math.sqrt(3.0) / 2.0)
+            refined.extend([(x0, y0), (x0 + dx, y0 + dy), apex, (x0 + 2.0 * dx, y0 + 2.0 * dy)])
+        ring = refined + [ring[-1]]
+    return ring
+
+
+def test_box_counting_dimension_of_a_square():
+    square = Polygon([(0.0, 0.0), (1.0, 0.0), (1.0, 1.0), (0.0, 1.0), (0.0, 0.0)])
+    assert geometry_utils.box_counting_dimension(square, 2, 7) == pytest.approx(1.0)
+
+
+def test_box_counting_dimension_of_a_fractal():
+    # dimension of the Koch curve: log(4) / log(3)
+    snowflake = Polygon(koch_snowflake(6))
+    dimension = geometry_utils.box_counting_dimension(snowflake, 3, 8)
+    assert dimension == pytest.approx(math.log(4.0) / math.log(3.0), abs=0.03)
+
+
+def test_box_counting_dimension_needs_two_levels():
+    square = Polygon([(0.0, 0.0), (1.0, 0.0), (1.0, 1.0), (0.0, 1.0), (0.0, 0.0)])
+    assert geometry_utils.box_counting_dimension(square, 3, 3) is None
+    flat = Polygon([(0.0, 0.0), (0.0, 0.0), (0.0, 0.0), (0.0, 0.0)])
+    assert geometry_utils.box_counting_dimension(flat, 2, 5) is None
+
+
+L_SHAPE = [(0.0, 0.0), (6.0, 0.0), (6.0, 2.0), (2.0, 2.0), (2.0, 8.0), (0.0, 8.0), (0.0, 0.0)]
+
+
+def transformed(ring, angle, scale, dx, dy):
+    cos_a = math.cos(angle)
+    sin_a = math.sin(angle)
+    return [(scale * (x * cos_a - y * sin_a) + dx, scale * (x * sin_a + y * cos_a) + dy) for x, y in ring]
+
+
+def test_fourier_descriptors_of_a_circle():
+    twiddles = geometry_utils.fourier_twiddles(128)
+    circle = [(math.cos(2.0 * math.pi * i / 360), math.sin(2.0 * math.pi * i / 360)) for i in range(360)]
+    descriptors = geometry_utils.fourier_descriptors(Polygon(circle + circle[:1]), 6, twiddles)
+    assert descriptors == pytest.approx([0.0] * 6, abs=1e-9)
+
+
+def test_fourier_descriptors_of_a_square():
+    # only the frequencies 1 + 4k remain, with magnitudes in 1 / (1 + 4k)^2
+    twiddles = geometry_utils.fourier_twiddles(128)
+    square = Polygon([(0.0, 0.0), (1.0, 0.0), (1.0, 1.0), (0.0, 1.0), (0.0, 0.0)])
+    descriptors = geometry_utils.fourier_descriptors(square, 6, twiddles)
+    # frequencies -1, 2, -2, 3, -3, 4
+    assert descriptors == pytest.approx([0.0, 0.0, 0.0, 0.0, 1.0 / 9.0, 0.0], abs=1e-3)
+
+
+def test_fourier_descriptors_are_invariant():
+    twiddles = geometry_utils.fourier_twiddles(128)
+    reference = geometry_utils.fourier_descriptors(Polygon(L_SHAPE), 8, twiddles)
+
+    moved = transformed(L_SHAPE, 0.7, 3.5, 100.0, -40.0)
+    # other starting point, in both orientations
+    shifted = moved[2:-1] + moved[:3]
+    for ring in (moved, shifted, list(reversed(shifted))):
+        descriptors = geometry_utils.fourier_descriptors(Polygon(ring), 8, twiddles)
+        # the resampling depends on the starting point
+        assert descriptors == pytest.approx(reference, abs=1e-3)
+
+
+def test_fourier_descriptors_of_degenerated_polygons():
+    twiddles = geometry_utils.fourier_twiddles(16)
+    assert geometry_utils.fourier_descriptors(Polygon([(0.0, 0.0), (1.0, 1.0), (0.0, 0.0)]), 4, twiddles) is None
+    flat = Polygon([(0.0, 0.0), (1.0, 1.0), (2.0, 2.0), (0.0, 0.0)])
+    assert geometry_utils.fourier_descriptors(flat, 4, twiddles) is None
+
+
+def test_second_moments_of_a_rotated_rectangle():
+    # rectangle 4 x 2: variances 4^2 / 12 and 2^2 / 12 along its axes
+    rectangle = [(-2.0, -1.0), (2.0, -1.0), (2.0, 1.0), (-2.0, 1.0), (-2.0, -1.0)]
+    for angle in (0.0, math.pi / 6.0, 2.0 * math.pi / 3.0):
+        ring = transformed(rectangle, angle, 1.0, 10.0, 20.0)
+        for oriented in (ring, list(reversed(ring))):
+            moments = geometry_utils.second_moments(Polygon(oriented))
+            assert moments == pytest.approx((10.0, 20.0, angle, 4.0 / 3.0, 1.0 / 3.0))
+
+
+def test_second_moments_with_a_hole():
+    outer = [(0.0, 0.0), (10.0, 0.0), (10.0, 10.0), (0.0, 10.0), (0.0, 0.0)]
+    hole = [(4.0, 4.0), (4.0, 6.0), (6.0, 6.0), (6.0, 4.0), (4.0, 4.0)]
+    variance = (10.0 ** 4 - 2.0 ** 4) / 12.0 / (10.0 ** 2 - 2.0 ** 2)
+
+    for ring in (hole, list(reversed(hole))):
+        c_x, c_y, _, major, minor = geometry_utils.second_moments(Polygon(outer, ring))
+        assert (c_x, c_y, major, minor) == pytest.approx((5.0, 5.0, variance, variance))
+
+
+def test_second_moments_of_an_off_centre_hole():
+    # the centroid moves away from the hole
+    outer = [(0.0, 0.0), (4.0, 0.0), (4.0, 4.0), (0.0, 4.0), (0.0, 0.0)]
+    hole = [(0.0, 0.0), (0.0, 2.0), (2.0, 2.0), (2.0, 0.0), (0.0, 0.0)]
+    c_x, c_y, angle, _, _ = geometry_utils.second_moments(Polygon(outer, hole))
+    # L-shape of 3 unit squares of side 2, centred at (1, 3), (3, 3) and (3, 1)
+    assert (c_x, c_y) == pytest.approx((7.0 / 3.0, 7.0 / 3.0))
+    assert angle == pytest.approx(3.0 * math.pi / 4.0)
+
+
+def test_second_moments_of_degenerated_polygons():
+    assert geometry_utils.second_moments(Polygon()) is None
+    assert geometry_utils.second_moments(Polygon([(0.0, 0.0), (1.0, 1.0), (2.0, 2.0), (0.0, 0.0)])) is None
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+    MorphAL: PTM plugin for QGIS
+    --------------
+    Start date           : January 2021
+    Copyright            : (C) 2021, Eric Grosso, PTM
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+import math
+
+import pytest
+
+from morphal.core.morphal_inscribed_circle import (
+    RingSegmentIndex,
+    largest_inscribed_circle,
+    segment_distance,
+)
+
+SQUARE = [(0.0, 0.0), (1.0, 0.0), (1.0, 1.0), (0.0, 1.0), (0.0, 0.0)]
+
+# square of side 10 with a square hole of side 2 at its centre
+OUTER = [(0.0, 0.0), (10.0, 0.0), (10.0, 10.0), (0.0, 10.0), (0.0, 0.0)]
+HOLE = [(4.0, 4.0), (4.0, 6.0), (6.0, 6.0), (6.0, 4.0), (4.0, 4.0)]
+
+L_SHAPE = [(0.0, 0.0), (6.0, 0.0), (6.0, 2.0), (2.0, 2.0), (2.0, 8.0), (0.0, 8.0), (0.0, 0.0)]
+
+
+def brute_force(rings, steps=200):
+    # best signed distance on a regular grid of points, by brute force
+    segments = [ring[i] + ring[i + 1] for ring in rings for i in range(len(ring) - 1)]
+    xs = [x for ring in rings for x, _ in ring]
+    ys = [y for ring in rings for _, y in ring]
+
+    def inside(x, y):
+        crossings = 0
+        for x0, y0, x1, y1 in segments:
+            if (y0 > y) != (y1 > y) and x < x0 + (y - y0) * (x1 - x0) / (y1 - y0):
+                crossings += 1
+        return crossings % 2 == 1
+
+    best = 0.0
+    for i in range(steps + 1):
+        x = min(xs) + (max(xs) - min(xs)) * i / steps
+        for j in range(steps + 1):
+            y = min(ys) + (max(ys) - min(ys)) * j / steps
+            if inside(x, y):
+                best = max(best, min(segment_distance(x, y, *segment) for segment in segments))
+    return best
+
+
+def test_segment_distance():
+    assert segment_distance(0.5, 1.0, 0.0, 0.0, 1.0, 0.0) == 1.0
+    assert segment_distance(4.0, 4.0, 0.0, 0.0, 1.0, 0.0) == 5.0
+    assert segment_distance(-3.0, 4.0, 0.0, 0.0, 1.0, 0.0) == 5.0
+    assert segment_distance(3.0, 4.0, 0.0, 0.0, 0.0, 0.0) == 5.0
+
+
+def test_signed_distance():
+    index = RingSegmentIndex([OUTER, HOLE])
+    assert index.signed_distance(1.0, 2.0) == pytest.approx(1.0)
+    assert index.signed_distance(5.0, 5.0) == pytest.approx(-1.0)
+    assert index.signed_distance(12.0, 5.0) == pytest.approx(-2.0)
+
+
+def test_square():
+    x, y, radius = largest_inscribed_circle([SQUARE], 1e-6)
+    assert (x, y, radius) == pytest.approx((0.5, 0.5, 0.5), abs=1e-5)
+
+
+def test_rectangle():
+    rectangle = [(0.0, 0.0), (4.0, 0.0), (4.0, 2.0), (0.0, 2.0), (0.0, 0.0)]
+    # the precision is bounded by a ten-thousandth of the size of the polygon
+    x, y, radius = largest_inscribed_circle([rectangle], 1e-9)
+    assert radius == pytest.approx(1.0, abs=2e-4)
+    assert y == pytest.approx(1.0, abs=1e-2)
+    assert 1.0 - 1e-2 <= x <= 3.0 + 1e-2
+
+
+@pytest.mark.parametrize("rings", [[OUTER, HOLE], [L_SHAPE]])
+def test_against_brute_force(rings):
+    precision = 1e-3
+    x, y, radius = largest_inscribed_circle(rings, precision)
+
+    # the circle is inside the polygon, and at least as large as the best grid point
+    assert RingSegmentIndex(rings).signed_distance(x, y) == pytest.approx(radius)
+    assert radius >= brute_force(rings) - precision
+
+
+def test_hole_is_avoided():
+    x, y, radius = largest_inscribed_circle([OUTER, HOLE], 1e-6)
+    # circle in a corner, tangent to two sides and to the corner of the hole
+    assert radius == pytest.approx(4.0 * (2.0 - math.sqrt(2.0)), abs=1e-3)
+    assert math.hypot(x - 5.0, y - 5.0) > math.sqrt(2.0)
+
+
+def test_degenerated_polygons():
+    assert largest_inscribed_circle([], 1e-3) is None
+    assert largest_inscribed_circle([[(0.0, 0.0), (1.0, 0.0), (2.0, 0.0), (0.0, 0.0)]], 1e-3) is None
@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+    MorphAL: PTM plugin for QGIS
+    --------------
+    Start date           : January 2021
+    Copyright            : (C) 2021, Eric Grosso, PTM
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+import math
+import pickle
+import random
+import struct
+
+import pytest
+
+from morphal.core.morphal_kdtree import KDTREE_MAGIC, KDTree
+
+
+def random_points(count, dimension, seed=0):
+    rng = random.Random(seed)
+    return [[rng.uniform(-100.0, 100.0) for _ in range(dimension)] for _ in range(count)]
+
+
+def brute_force(points, ids, point, k, exclude_id=None):
+    distances = sorted(
+        (math.dist(p, point), fid) for p, fid in zip(points, ids) if fid != exclude_id
+    )
+    return distances[:k]
+
+
+def assert_same_neighbours(result, expected):
+    assert [fid for _, fid in result] == [fid for _, fid in expected]
+    assert [distance for distance, _ in result] == pytest.approx([distance for distance, _ in expected])
+
+
+@pytest.mark.parametrize("dimension", [1, 2, 5])
+@pytest.mark.parametrize("leaf_size", [1, 16])
+def test_query_matches_brute_force(dimension, leaf_size):
+    points = random_points(500, dimension)
+    ids = [10 * i + 3 for i in range(len(points))]
+    tree = KDTree(points, ids, leaf_size=leaf_size)
+
+    for query in random_points(50, dimension, seed=1):
+        for k in (1, 7):
+            assert_same_neighbours(tree.query(query, k), brute_force(points, ids, query, k))
+
+
+def test_query_excludes_an_id():
+    points = random_points(200, 3)
+    ids = list(range(len(points)))
+    tree = KDTree(points, ids)
+
+    for fid in (0, 57, 199):
+        result = tree.query(points[fid], 5, exclude_id=fid)
+        assert_same_neighbours(result, brute_force(points, ids, points[fid], 5, exclude_id=fid))
+
+
+def test_more_neighbours_than_points():
+    tree = KDTree([[0.0, 0.0], [3.0, 4.0]], [1, 2])
+    assert tree.query([0.0, 0.0], 5) == [(0.0, 1), (5.0, 2)]
+
+
+def test_duplicate_points():
+    tree = KDTree([[1.0, 1.0]] * 40 + [[2.0, 1.0]], list(range(41)), leaf_size=4)
+    result = tree.query([1.0, 1.0], 41)
+    assert [distance for distance, _ in result] == [0.0] * 40 + [1.0]
+    assert sorted(fid for _, fid in result) == list(range(41))
+
+
+def test_empty_tree():
+    tree = KDTree([], [])
+    assert len(tree) == 0
+    assert tree.query([0.0], 3) == []
+
+
+def test_save_and_load(tmp_path):
+    points = random_points(300, 4)
+    ids = list(range(1000, 1300))
+    metadata = {"fields": ["A", "B"], "mean": None, "std": None}
+    tree = KDTree(points, ids, leaf_size=8, metadata=metadata)
+
+    path = str(tmp_path / "index.kdtree")
+    tree.save(path)
+    loaded = KDTree.load(path)
+
+    assert loaded.metadata == metadata
+    assert loaded.dimension == 4
+    assert len(loaded) == 300
+    for query in random_points(20, 4, seed=2):
+        assert loaded.query(query, 6) == tree.query(query, 6)
+
+
+def save_bytes(tmp_path):
+    path = str(tmp_path / "index.kdtree")
+    KDTree(random_points(50, 2), list(range(50)), leaf_size=4).save(path)
+    with open(path, "rb") as index_file:
+        return index_file.read()
+
+
+def load_bytes(tmp_path, data):
+    path = str(tmp_path / "modified.kdtree")
+    with open(path, "wb") as index_file:
+        index_file.write(data)
+    return KDTree.load(path)
+
+
+def test_load_rejects_invalid_files(tmp_path):
+    data = save_bytes(tmp_path)
+    header_size = struct.unpack("<Q", data[len(KDTREE_MAGIC):len(KDTREE_MAGIC) + 8])[0]
+    arrays_start = len(KDTREE_MAGIC) + 8 + header_size
+
+    invalid_files = [
+        b"",
+        b"not an index" + data,
+        data[:-1],
+        data + b"\0",
+        data[:arrays_start - 1],
+        pickle.dumps({"metadata": {}}),
+        # NaN as the first coordinate
+        data[:arrays_start] + struct.pack("d", math.nan) + data[arrays_start + 8:],
+    ]
+    for invalid in invalid_files:
+        with pytest.raises(ValueError):
+            load_bytes(tmp_path, invalid)
+
+
+def test_load_rejects_random_corruptions(tmp_path):
+    data = save_bytes(tmp_path)
+    rng = random.Random(3)
+    for _ in range(200):
+        corrupted = bytearray(data)
+        corrupted[rng.randrange(len(corrupted))] ^= 1 << rng.randrange(8)
+        try:
+            tree = load_bytes(tmp_path, bytes(corrupted))
+        except ValueError:
+            continue
+        # a corruption of the coordinates only can not be detected, but
+        # queries must still work
+        tree.query([0.0, 0.0], 3)
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+    MorphAL: PTM plugin for QGIS
+    --------------
+    Start date           : January 2021
+    Copyright            : (C) 2021, Eric Grosso, PTM
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+import random
+
+import pytest
+
+from morphal.core.morphal_noding import node_segments, segment_intersection
+
+
+def test_crossing_segments():
+    splits = node_segments([0.0, 0.0, 2.0, 2.0, 0.0, 2.0, 2.0, 0.0])
+    assert splits == {0: [(1.0, 1.0)], 1: [(1.0, 1.0)]}
+
+
+def test_crossing_segments_share_their_split_point():
+    rng = random.Random(0)
+    crossings = 0
+    for _ in range(2000):
+        coords = [rng.uniform(-10.0, 10.0) for _ in range(8)]
+        splits = node_segments(coords)
+        if len(splits) == 2:
+            crossings += 1
+            assert splits[0] == splits[1]
+
+    assert crossings > 100
+
+
+def test_t_junction_keeps_the_extremity():
+    # the extremity of the second segment lies on the first one
+    splits = node_segments([0.0, 0.0, 3.0, 0.0, 1.1, 0.0, 1.1, 5.0])
+    assert splits == {0: [(1.1, 0.0)]}
+
+
+def test_collinear_overlap():
+    splits = node_segments([0.0, 0.0, 4.0, 0.0, 1.0, 0.0, 6.0, 0.0])
+    assert splits == {0: [(1.0, 0.0)], 1: [(4.0, 0.0)]}
+
+
+def test_split_points_are_sorted_along_the_segment():
+    coords = [
+        0.0, 0.0, 10.0, 0.0,
+        7.0, -1.0, 7.0, 1.0,
+        2.0, -1.0, 2.0, 1.0,
+        5.0, -1.0, 5.0, 1.0,
+    ]
+    splits = node_segments(coords, cell_size=1.0)
+    assert splits[0] == [(2.0, 0.0), (5.0, 0.0), (7.0, 0.0)]
+    assert splits[1] == [(7.0, 0.0)]
+
+
+def test_each_pair_is_handled_once_across_cells():
+    # long segments sharing many cells of a fine grid
+    splits = node_segments([0.0, 0.0, 10.0, 10.0, 0.0, 10.0, 10.0, 0.0], cell_size=0.5)
+    assert splits == {0: [(5.0, 5.0)], 1: [(5.0, 5.0)]}
+
+
+@pytest.mark.parametrize("coords", [
+    (0.0, 0.0, 1.0, 0.0, 0.0, 1.0, 1.0, 1.0),
+    (0.0, 0.0, 1.0, 1.0, 2.0, 2.0, 3.0, 3.0),
+    (0.0, 0.0, 1.0, 0.0, 2.0, -1.0, 2.0, 1.0),
+])
+def test_disjoint_segments(coords):
+    assert segment_intersection(*coords) is None
+
+
+def test_shared_extremity_is_not_split():
+    result = segment_intersection(0.0, 0.0, 1.0, 1.0, 1.0, 1.0, 2.0, 0.0)
+    assert result == ((1.0, 1.0), [], [])